@@ -8,6 +8,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 from pathlib import Path
+import os
 import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'hoosfit.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +81,37 @@ TEMPLATES = [
     },
 ]
 
+# Per-request SQL/template timing (Server-Timing header + slow request log)
+HOOSFIT_PERFORMANCE = os.environ.get('HOOSFIT_PERFORMANCE') == '1'
+HOOSFIT_SLOW_REQUEST_MS = int(os.environ.get('HOOSFIT_SLOW_REQUEST_MS', 500))
+
+if HOOSFIT_PERFORMANCE:
+    MIDDLEWARE.insert(0, 'hoosfit.middleware.PerformanceMiddleware')
+    TEMPLATES[0]['BACKEND'] = 'hoosfit.middleware.TimedDjangoTemplates'
+
+# Async profile/leaderboard/awards/workouts pages (hoosfit/async_views.py),
+# switched on by the ASGI entry point, exerciseapp/asgi.py
+HOOSFIT_ASYNC_VIEWS = os.environ.get('HOOSFIT_ASYNC_VIEWS') == '1'
+
+# Per-user cache of lists and page fragments (hoosfit/cache.py). Works on any
+# cache backend; the default locmem one is per process, so give several
+# workers a shared CACHES backend to get hits across them.
+HOOSFIT_CACHE_TIMEOUT = int(os.environ.get('HOOSFIT_CACHE_TIMEOUT', 3600))
+
+# Deferred post-workout work (hoosfit/jobs.py) is done by `manage.py run_jobs`.
+# Without a worker running, HOOSFIT_JOBS_EAGER=1 does it inside the request.
+HOOSFIT_JOBS_EAGER = os.environ.get('HOOSFIT_JOBS_EAGER') == '1'
+
+# Uploads to the import view are refused above HOOSFIT_IMPORT_MAX_BYTES. The
+# rest are saved to the default file storage (MEDIA_ROOT) and imported by
+# the run_jobs worker, so the web and worker processes need to share it.
+HOOSFIT_IMPORT_MAX_BYTES = int(os.environ.get('HOOSFIT_IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', BASE_DIR / 'media')
+
+# `manage.py archive_exercises` packs logged sets older than this many days
+# (whole months of them) into ExerciseArchive, one row per exercise per month.
+HOOSFIT_ARCHIVE_AFTER_DAYS = int(os.environ.get('HOOSFIT_ARCHIVE_AFTER_DAYS', 365))
+
 WSGI_APPLICATION = 'exerciseapp.wsgi.application'
 
 
@@ -96,8 +129,42 @@ DATABASES = {
     }
 }
 
+# Read replicas (hoosfit/routers.py): one database URL per replica in
+# HOOSFIT_REPLICA_URLS, comma separated. GET/HEAD requests read from them;
+# a client that writes reads from the primary for HOOSFIT_REPLICA_LAG seconds.
+# HOOSFIT_LOCAL_REPLICA=1 stands two SQLite files in for primary and replica
+# (copy the primary over with `manage.py sync_replica`).
+REPLICA_URLS = [url for url in os.environ.get('HOOSFIT_REPLICA_URLS', '').split(',') if url]
+if REPLICA_URLS:
+    import dj_database_url  # installed with django-heroku
+    for n, url in enumerate(REPLICA_URLS, start=1):
+        DATABASES['replica{0}'.format(n)] = dj_database_url.parse(url, conn_max_age=600)
+if os.environ.get('HOOSFIT_LOCAL_REPLICA') == '1':
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'},
+        'replica1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'replica.sqlite3'},
+    }
+HOOSFIT_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+HOOSFIT_REPLICA_LAG = int(os.environ.get('HOOSFIT_REPLICA_LAG', 5))
+DATABASE_ROUTERS = ['hoosfit.routers.ReplicaRouter']
+
 if 'test' in sys.argv:
-    DATABASES['default'] = {'ENGINE' : 'django.db.backends.sqlite3'}
+    DATABASES = {
+        'default': {'ENGINE' : 'django.db.backends.sqlite3'},
+        'replica1': {'ENGINE': 'django.db.backends.sqlite3'},
+    }
+    HOOSFIT_READ_REPLICAS = []  # ReplicaTest switches it on, and replicates by hand
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'hoosfit': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -136,6 +203,21 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes content-hashed copies of every file plus gzip and,
+# with Brotli installed, brotli variants; WhiteNoise serves them from the
+# WSGI app, picking the encoding the browser accepts, and marks hashed
+# files cacheable for ten years. Without WhiteNoise (e.g. a bare checkout)
+# Django's own storage and serving are used.
+try:
+    import whitenoise  # noqa: F401
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                      'whitenoise.middleware.WhiteNoiseMiddleware')
+    if 'test' not in sys.argv:  # tests run without a collectstatic manifest
+        STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+except ImportError:
+    pass
 
 AUTHENTICATION_BACKENDS = (
  'django.contrib.auth.backends.ModelBackend',
@@ -167,6 +249,6 @@ SOCIALACCOUNT_EMAIL_REQUIRED = True
 try:
     # Configure Django App for Heroku.
     import django_heroku
-    django_heroku.settings(locals())
+    django_heroku.settings(locals(), staticfiles=False)  # static files are set up above
 except ImportError:
     found = False
@@ -13,11 +13,20 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
-from hoosfit.views import home, profile, create_exercise, create_workout, ExerciseCreate, ExerciseView, WorkoutCreate, AwardView, WorkoutView, log_workout, WorkoutSummary, WorkoutListView, LeaderboardView
+from hoosfit.views import home, profile, activity, export_history, import_upload, import_status, create_exercise, exercise_search, create_workout, ExerciseCreate, ExerciseView, WorkoutCreate, AwardView, WorkoutView, log_workout, WorkoutSummary, WorkoutListView, LeaderboardView, my_rank, log_sessions
+
+if settings.HOOSFIT_ASYNC_VIEWS:
+    from hoosfit import async_views
+    profile_view, leaderboard_view = async_views.profile, async_views.leaderboard
+    award_view, workout_list_view = async_views.awards, async_views.workouts
+else:
+    profile_view, leaderboard_view = profile, LeaderboardView.as_view()
+    award_view, workout_list_view = AwardView.as_view(), WorkoutListView.as_view()
 
 app_name = 'exerciseapp'
 urlpatterns = [
@@ -25,16 +34,23 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('profiles/home/', home),
-    path('profiles/<str:user_id>/', profile, name='homepage'),
+    path('profiles/<str:user_id>/', profile_view, name='homepage'),
+    path('profiles/<str:user_id>/activity/', activity, name='activity'),
+    path('profiles/<str:user_id>/export/<slug:kind>.<slug:fmt>', export_history, name='export'),
+    path('profiles/<str:user_id>/import/', import_upload, name='import'),
+    path('profiles/<str:user_id>/import/<int:job_id>/', import_status, name='importstatus'),
     path('profiles/<str:user_id>/exercise/', ExerciseCreate.as_view(), name='exercisecreate'),
     path('profiles/<str:user_id>/exercise/submit/', create_exercise, name='exercisesubmit'),
+    path('profiles/<str:user_id>/exercise/search/', exercise_search, name='exercisesearch'),
     path('profiles/<str:user_id>/exercise/view/', ExerciseView.as_view(), name='exerciseview'),
     path('profiles/<str:user_id>/workout/', WorkoutCreate.as_view(), name='workoutcreate'),
-    path('profiles/<str:user_id>/workout/view/', WorkoutListView.as_view(), name='workoutview'),
+    path('profiles/<str:user_id>/workout/view/', workout_list_view, name='workoutview'),
     path('profiles/<str:user_id>/workout/submit/', create_workout, name='workoutsubmit'),
     path('profiles/<str:user_id>/workout/<int:pk>/', WorkoutView.as_view(), name='workoutstart'),
     path('profiles/<str:user_id>/workout/<int:pk>/submit/', log_workout, name='workoutend'),
     path('profiles/<str:user_id>/workout/<int:pk>/summary/', WorkoutSummary.as_view(), name='workoutsummary'),
-    path('profiles/<str:user_id>/awards/', AwardView.as_view(), name='awardview'),
-    path('leaderboard', LeaderboardView.as_view(), name='leaderboard')
+    path('profiles/<str:user_id>/awards/', award_view, name='awardview'),
+    path('leaderboard', leaderboard_view, name='leaderboard'),
+    path('leaderboard/me/', my_rank, name='leaderboardrank'),
+    path('api/sessions/', log_sessions, name='logsessions'),
 ]
@@ -0,0 +1,10 @@
+# Read by gunicorn from the working directory. WSGI with sync workers by
+# default; HOOSFIT_ASGI=1 serves exerciseapp/asgi.py (and with it the async
+# read views) from uvicorn workers instead.
+import os
+
+if os.environ.get('HOOSFIT_ASGI') == '1':
+    wsgi_app = 'exerciseapp.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'exerciseapp.wsgi:application'
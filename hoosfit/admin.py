@@ -1,9 +1,140 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-# Register your models here.
-from .models import Exercise, Workout, Award, Profile
+from .models import CatalogExercise, Exercise, ExerciseArchive, Workout, Award, Profile, DailyTotal, PointsEvent, Job
+from .services import delete_history, recompute_user_stats
 
-admin.site.register(Exercise)
-admin.site.register(Workout)
-admin.site.register(Award)
-admin.site.register(Profile)
\ No newline at end of file
+
+# The log tables grow with every workout, so their changelists are built to
+# cost the same at a million rows as at a hundred: no COUNT(*) of the whole
+# table, users joined in rather than loaded per row, a raw id box instead of
+# a dropdown of every user, and only filters, search and sorting that an
+# index answers. Their bulk actions work on the selected rows' users with a
+# few set-based statements per chunk of users.
+
+ACTION_CHUNK = 200  # users per transaction
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Takes the row count of a whole table from the planner's statistics on
+    postgres rather than a COUNT(*), and stops counting a filtered one at
+    COUNT_LIMIT rows; past that only the first pages are offered
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > self.COUNT_LIMIT:  # -1 or small: never analyzed, or cheap to count
+                return int(row[0])
+        return queryset[:self.COUNT_LIMIT].count()
+
+
+def users_of(queryset):
+    return list(queryset.values_list('user_id', flat=True).distinct().order_by('user_id'))
+
+
+@admin.action(description="Recompute points, streaks and awards of the selected rows' users")
+def recompute_stats(modeladmin, request, queryset):
+    user_ids = users_of(queryset)
+    for start in range(0, len(user_ids), ACTION_CHUNK):
+        recompute_user_stats(user_ids[start:start + ACTION_CHUNK])
+    modeladmin.message_user(request, 'Recomputed the stats of {0} users'.format(len(user_ids)), messages.SUCCESS)
+
+
+@admin.action(description="Delete the whole history of the selected rows' users", permissions=['delete'])
+def delete_user_history(modeladmin, request, queryset):
+    user_ids = users_of(queryset)
+    deleted = 0
+    for start in range(0, len(user_ids), ACTION_CHUNK):
+        deleted += delete_history(user_ids[start:start + ACTION_CHUNK])
+    modeladmin.message_user(request, 'Deleted {0} rows of history of {1} users'.format(deleted, len(user_ids)), messages.SUCCESS)
+
+
+class UserRowsAdmin(admin.ModelAdmin):
+    # a table with a row or more per user
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # that's a COUNT(*) of the whole table
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)  # exact, so the unique index on username answers it
+    ordering = ('-id',)
+    actions = [recompute_stats, delete_user_history]
+
+    def get_actions(self, request):
+        # the default delete collects and signals every selected row, and
+        # lists them all on its confirmation page
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+@admin.register(Exercise)
+class ExerciseAdmin(UserRowsAdmin):
+    list_display = ('exercise_name', 'user', 'date', 'reps')
+    date_hierarchy = 'date'  # exercise_date_idx
+    sortable_by = ('date',)
+
+
+@admin.register(Award)
+class AwardAdmin(UserRowsAdmin):
+    list_display = ('award_name', 'user', 'kind', 'best_reps', 'date')
+    date_hierarchy = 'date'  # award_date_idx
+    sortable_by = ('date',)
+
+
+@admin.register(ExerciseArchive)
+class ExerciseArchiveAdmin(UserRowsAdmin):
+    list_display = ('exercise_name', 'user', 'month', 'total', 'best')
+    sortable_by = ()
+
+
+@admin.register(DailyTotal)
+class DailyTotalAdmin(UserRowsAdmin):
+    list_display = ('exercise_name', 'user', 'date', 'reps')
+    sortable_by = ()
+
+
+@admin.register(PointsEvent)
+class PointsEventAdmin(UserRowsAdmin):
+    list_display = ('user', 'points', 'date')
+    sortable_by = ()
+
+
+@admin.register(Profile)
+class ProfileAdmin(UserRowsAdmin):
+    list_display = ('user', 'points', 'streak_number', 'previous_workout')
+    sortable_by = ('points',)  # profile_points_idx
+
+
+@admin.register(CatalogExercise)
+class CatalogExerciseAdmin(admin.ModelAdmin):
+    list_display = ('exercise_name', 'user')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('=user__username',)
+
+
+@admin.register(Workout)
+class WorkoutAdmin(admin.ModelAdmin):
+    list_display = ('workout_name', 'user', 'date')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'exercises')  # not a select of every user's catalog
+    search_fields = ('=user__username',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = ('kind', 'key', 'status', 'attempts', 'run_after', 'updated')
+    list_filter = ('status',)  # job_due_idx
+    ordering = ('-id',)
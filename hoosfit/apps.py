@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class HoosfitConfig(AppConfig):
     name = 'hoosfit'
+
+    def ready(self):
+        from .jobs import load_handlers
+        load_handlers()
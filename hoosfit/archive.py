@@ -0,0 +1,112 @@
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .cache import invalidate
+from .models import Exercise, ExerciseArchive, delete_quietly
+
+
+# Cold storage for the exercise log. Sets older than HOOSFIT_ARCHIVE_AFTER_DAYS
+# are packed into one ExerciseArchive row per user, exercise and month, so
+# Exercise only holds recent history. The rollups (DailyTotal, PeriodTotal,
+# Award, Profile.points) are left alone; whatever rebuilds from the raw log
+# (exports, recompute_user_stats, rebuild_daily_totals, reconcile_points)
+# reads the live and archived log together, through the helpers below or
+# services.points_snapshot.
+
+
+def archive_cutoff(today=None, days=None):
+    """
+    The first day kept in Exercise: the start of the month the archive age
+    falls in, so months are archived whole
+    """
+    days = settings.HOOSFIT_ARCHIVE_AFTER_DAYS if days is None else days
+    return ((today or timezone.localdate()) - datetime.timedelta(days=days)).replace(day=1)
+
+
+def unpack(archive):
+    """
+    [(date, reps)] of an archived month, in log order
+    """
+    return [(archive.month.replace(day=day), reps) for day, reps in archive.sets]
+
+
+def pack(archive, sets):
+    """
+    Stores [(date, reps)] of one month on archive, with its total and best
+    """
+    sets = sorted(sets, key=lambda s: s[0])  # stable, so a day's sets keep their log order
+    archive.sets = [[date.day, reps] for date, reps in sets]
+    archive.total = sum(reps for _, reps in sets)
+    archive.best = max(reps for _, reps in sets)
+    archive.best_date = next(date for date, reps in sets if reps == archive.best)
+
+
+@transaction.atomic
+def archive_exercises(user_ids, before):
+    """
+    Moves the given users' sets logged before `before` into their monthly
+    archive rows, merging into rows an earlier run wrote (e.g. when old
+    history was imported since). What was read is deleted by id in the same
+    transaction, so a chunk is archived whole or not at all and running it
+    again just carries on. Returns (sets moved, archive rows written).
+    """
+    rows = list(Exercise.objects.filter(user_id__in=user_ids, date__lt=before)
+                .order_by('user_id', 'exercise_name', 'date', 'id')
+                .values_list('id', 'user_id', 'exercise_name', 'date', 'reps'))
+    if not rows:
+        return 0, 0
+    months = {}
+    for _, user_id, name, date, reps in rows:
+        months.setdefault((user_id, name, date.replace(day=1)), []).append((date, reps))
+
+    existing = {(archive.user_id, archive.exercise_name, archive.month): archive
+                for archive in ExerciseArchive.objects.select_for_update()
+                .filter(user_id__in=user_ids, month__gte=min(month for _, _, month in months), month__lt=before)}
+    new, changed = [], []
+    for (user_id, name, month), sets in months.items():
+        archive = existing.get((user_id, name, month))
+        if archive is None:
+            archive = ExerciseArchive(user_id=user_id, exercise_name=name, month=month)
+            new.append(archive)
+        else:
+            sets = unpack(archive) + sets
+            changed.append(archive)
+        pack(archive, sets)
+    ExerciseArchive.objects.bulk_create(new, batch_size=1000)
+    ExerciseArchive.objects.bulk_update(changed, ['sets', 'total', 'best', 'best_date'], batch_size=1000)
+
+    # the per-row post_delete signals would only invalidate the same caches
+    # thousands of times over
+    delete_quietly(Exercise, 'id', [row[0] for row in rows])
+    for user_id in {row[1] for row in rows}:
+        invalidate(user_id)
+    return len(rows), len(new) + len(changed)
+
+
+def logged_daily_totals(user_ids):
+    """
+    {(user id, date, exercise name): reps} over the live and archived log
+    """
+    totals = {}
+    for row in (Exercise.objects.filter(user_id__in=user_ids).values('user_id', 'date', 'exercise_name')
+                .annotate(logged=Sum('reps')).order_by().iterator()):
+        totals[row['user_id'], row['date'], row['exercise_name']] = row['logged']
+    for archive in ExerciseArchive.objects.filter(user_id__in=user_ids).iterator(chunk_size=1000):
+        for date, reps in unpack(archive):
+            key = (archive.user_id, date, archive.exercise_name)
+            totals[key] = totals.get(key, 0) + reps
+    return totals
+
+
+def archived_bests(user_ids):
+    """
+    {(user id, exercise name): (most reps in a set, first day done)} in the archive
+    """
+    bests = {}
+    for user_id, name, best, date in (ExerciseArchive.objects.filter(user_id__in=user_ids)
+                                      .order_by('user_id', 'exercise_name', '-best', 'best_date')
+                                      .values_list('user_id', 'exercise_name', 'best', 'best_date').iterator()):
+        bests.setdefault((user_id, name), (best, date))
+    return bests
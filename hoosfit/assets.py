@@ -0,0 +1,41 @@
+import base64
+import hashlib
+from django.templatetags.static import static
+
+
+# Third-party front end libraries, committed under hoosfit/static/hoosfit/vendor
+# and served from our own static files, where collectstatic fingerprints and
+# compresses them like our own. `manage.py vendor_assets` fetches a new one
+# from its upstream url and checks it against the pinned hash.
+
+VENDOR_DIR = 'hoosfit/vendor/'
+
+# name: (upstream url, subresource integrity of the committed file)
+VENDOR = {
+    'bootstrap-4.5.0.min.css': (
+        'https://stackpath.bootstrapcdn.com/bootstrap/4.5.0/css/bootstrap.min.css',
+        'sha384-9aIt2nRpC12Uk9gS9baDl411NQApFmC26EwAOH8WgZl5MYYxFfc+NcPb1dKGj7Sk'),
+    'bootstrap-4.5.0.min.js': (
+        'https://stackpath.bootstrapcdn.com/bootstrap/4.5.0/js/bootstrap.min.js',
+        'sha384-OgVRvuATP1z7JjHLkuOU7Xw704+h835Lr+6QL9UvYjZE3Ipu6Tp75j7Bh/kR0JKI'),
+    'jquery-3.5.1.slim.min.js': (
+        'https://code.jquery.com/jquery-3.5.1.slim.min.js',
+        'sha384-DfXdz2htPH0lsSSs5nCTpuj/zy4C+OGpamoFVy38MVBnE+IbbVYUew+OrCXaRkfj'),
+    'popper-1.16.0.min.js': (
+        'https://cdn.jsdelivr.net/npm/popper.js@1.16.0/dist/umd/popper.min.js',
+        'sha384-Q6E9RHvbIyZFJoft+2mJbHaEWldlvI9IOYy5n3zV9zzTtmI3UksdQRVvoxMfooAo'),
+    'chart-3.7.1.min.js': (
+        'https://cdn.jsdelivr.net/npm/chart.js@3.7.1/dist/chart.min.js',
+        'sha384-ObK8pmRarZRkylTjLSe/5nwgSkTNDoMMcK4tPkPKezRBA/2D25YR3tXRoge9/SXh'),
+}
+
+
+def integrity(content):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+
+
+def vendor_url(name):
+    """
+    Returns (url, integrity) of our fingerprinted copy
+    """
+    return static(VENDOR_DIR + name), VENDOR[name][1]
@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import random
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections, connection
+from django.shortcuts import render
+from .cache import cached_queryset
+from .models import Workout, Award, Profile, LeaderboardSnapshot
+from .ranking import rows_after, standings
+from .views import (motivations, leaderboard_cursor, leaderboard_window, leaderboard_page, leaderboard_links,
+                    LeaderboardView)
+
+
+# Async versions of the read-heavy pages, served instead of the sync ones when
+# HOOSFIT_ASYNC_VIEWS is on (exerciseapp/asgi.py turns it on). Django 3.2 has
+# no async ORM, so every query runs in a worker thread. The pages that need a
+# single read just hand it to sync_to_async; only a leaderboard cursor page
+# has independent queries, and those get a thread each and run at the same time.
+
+def parallel():
+    # SQLite connections can't see each other's uncommitted (test) data, so
+    # there everything stays on the one connection of the request thread
+    return connection.vendor != 'sqlite'
+
+
+def off_loop(query):
+    def run():
+        try:
+            return query()
+        finally:
+            close_old_connections()  # worker threads don't get request_finished
+    return run
+
+
+async def gather(*queries):
+    """
+    Evaluates the given callables concurrently, each with its own connection
+    """
+    if not parallel():
+        return [await sync_to_async(query)() for query in queries]
+    return await asyncio.gather(*(sync_to_async(off_loop(query), thread_sensitive=False)() for query in queries))
+
+
+def login_required(view):
+    """
+    django.contrib.auth's login_required for async views. The session user
+    is loaded off the event loop and handed to the view.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+        if user is None:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+async def render_async(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@login_required
+async def profile(request, user, user_id):
+    user.profile = await sync_to_async(Profile.objects.get)(user=user)
+    return await render_async(request, 'hoosfit/profile.html', {'quote': random.choice(motivations)})
+
+
+async def leaderboard(request):
+    cursor = leaderboard_cursor(request)
+    window, start = leaderboard_window(request)
+    n = LeaderboardView.page_size + 1
+    rows = await sync_to_async(standings)(window, start)  # a closed period asks whether it's snapshotted
+    if cursor and rows.model is not LeaderboardSnapshot:
+        # both halves of ranking.page_after at once, rather than the second only when the first runs short
+        points, id_, rank = cursor
+        ties, below = rows_after(points, id_, n, rows)
+        ties, below = await gather(lambda: list(ties), lambda: list(below))
+        page = (ties + below)[:n]
+        for row in page:
+            rank += 1
+            row.rank = rank
+    else:
+        page = await sync_to_async(leaderboard_page)(window, start, cursor, n)
+    context = leaderboard_links(window, start, cursor, page[:n - 1], len(page) == n)
+    context['profiles'] = page[:n - 1]
+    return await render_async(request, LeaderboardView.template_name, context)
+
+
+@login_required
+async def awards(request, user, user_id):
+    award_list = await sync_to_async(cached_queryset)(
+        user.id, 'awards', Award.objects.filter(user=user).order_by('kind', 'exercise_name', 'level'))
+    return await render_async(request, 'hoosfit/view_awards.html', {'awards': award_list})
+
+
+@login_required
+async def workouts(request, user, user_id):
+    # the same cache entry as WorkoutListView, so either view fills it for the other
+    workout_list = await sync_to_async(cached_queryset)(
+        user.id, 'workouts', Workout.objects.filter(user=user).prefetch_related('exercises'))
+    return await render_async(request, 'hoosfit/view_workouts.html', {'workout_list': workout_list})
@@ -0,0 +1,230 @@
+import datetime
+import operator
+from collections import namedtuple
+from functools import reduce
+from itertools import groupby
+from django.db.models import F, Q, Case, When, Value, Max, Sum, OuterRef, Subquery, PositiveIntegerField
+from .archive import archived_bests
+from .cache import invalidate
+from .models import Award, DailyTotal, Exercise
+from .ranking import period_start
+
+
+# The award engine. Every rule reads from the same aggregate queries, the
+# users' personal bests off the exercise log and its archive and one ordered walk over their
+# daily totals. It works out the full set of awards those users have earned,
+# then writes only the difference, with one bulk insert and one update. New
+# sessions go through evaluate_sessions instead, which only reads around the
+# days and exercises they touch. Change a rule or its levels here and run
+# recompute_awards to apply it to everyone.
+
+VOLUME_LEVELS = [100, 500, 1000, 5000, 10000]  # total reps of one exercise
+STREAK_LEVELS = [7, 30, 100, 365]  # consecutive days with a workout
+RECORDS = {'best', 'week'}  # raised in place rather than earned per level
+
+Earned = namedtuple('Earned', 'user_id kind exercise_name level value date')
+
+
+def award_name(kind, exercise_name, level):
+    if kind == 'best':
+        return 'Personal Best: ' + exercise_name
+    if kind == 'week':
+        return 'Weekly Record: ' + exercise_name
+    if kind == 'volume':
+        return '{0} {1}'.format(level, exercise_name)
+    return '{0} Day Streak'.format(level)
+
+
+def personal_bests(user_ids):
+    # the most reps in one set of each exercise, and the first day it was done,
+    # over the live log and the archive
+    archived = archived_bests(user_ids)
+    best_date = (Exercise.objects.filter(user_id=OuterRef('user_id'), exercise_name=OuterRef('exercise_name'))
+                 .order_by('-reps', 'date').values('date')[:1])
+    for row in (Exercise.objects.filter(user_id__in=user_ids).values('user_id', 'exercise_name').order_by()
+                .annotate(best=Max('reps'), best_date=Subquery(best_date)).iterator()):
+        best, date = row['best'], row['best_date']
+        old = archived.pop((row['user_id'], row['exercise_name']), None)
+        if old is not None and (old[0], -old[1].toordinal()) > (best, -date.toordinal()):
+            best, date = old
+        yield Earned(row['user_id'], 'best', row['exercise_name'], 0, best, date)
+    for (user_id, name), (best, date) in archived.items():
+        yield Earned(user_id, 'best', name, 0, best, date)
+
+
+def volume_milestones(user_id, name, days):
+    # days is [(date, reps)] of one exercise, oldest first
+    total, levels = 0, iter(VOLUME_LEVELS)
+    level = next(levels)
+    for date, reps in days:
+        total += reps
+        while level is not None and total >= level:
+            yield Earned(user_id, 'volume', name, level, level, date)
+            level = next(levels, None)
+
+
+def weekly_record(user_id, name, days):
+    # the biggest week of one exercise, once there's an earlier week to beat
+    weeks = {}
+    for date, reps in days:
+        start = period_start('week', date)
+        weeks[start] = weeks.get(start, 0) + reps
+    if len(weeks) > 1:
+        start, total = max(weeks.items(), key=lambda week: (week[1], -week[0].toordinal()))
+        yield Earned(user_id, 'week', name, 0, total, start)
+
+
+def streak_milestones(user_id, dates):
+    # dates is every day the user worked out, oldest first
+    run, previous, reached = 0, None, set()
+    for date in dates:
+        run = run + 1 if previous is not None and (date - previous).days == 1 else 1
+        previous = date
+        for level in STREAK_LEVELS:
+            if run == level and level not in reached:
+                reached.add(level)
+                yield Earned(user_id, 'streak', '', level, level, date)
+
+
+def from_daily_totals(user_ids):
+    """
+    Runs the rules that need the day-by-day history over one ordered pass
+    through the users' daily totals
+    """
+    rows = (DailyTotal.objects.filter(user_id__in=user_ids).order_by('user_id', 'exercise_name', 'date')
+            .values_list('user_id', 'exercise_name', 'date', 'reps').iterator(chunk_size=5000))
+    key, days, dates = None, [], {}
+    for user_id, name, date, reps in rows:
+        if (user_id, name) != key:
+            if key is not None:
+                yield from volume_milestones(*key, days)
+                yield from weekly_record(*key, days)
+            key, days = (user_id, name), []
+        days.append((date, reps))
+        dates.setdefault(user_id, set()).add(date)
+    if key is not None:
+        yield from volume_milestones(*key, days)
+        yield from weekly_record(*key, days)
+    for user_id, worked_out in dates.items():
+        yield from streak_milestones(user_id, sorted(worked_out))
+
+
+def evaluate(user_ids):
+    """
+    Every award the given users have earned, from their whole history
+    """
+    return list(personal_bests(user_ids)) + list(from_daily_totals(user_ids))
+
+
+def evaluate_awards(user_ids, exact=False):
+    """
+    Brings the given users' awards up to date with what they've earned: new
+    awards are inserted and records that were beaten raised. exact (for a
+    full recompute) also lowers records and deletes awards no longer earned,
+    e.g. after a rule change; without it concurrent evaluations can't undo
+    each other. Returns (created, updated, deleted).
+    """
+    return save(user_ids, evaluate(user_ids), stored(Award.objects.filter(user_id__in=user_ids)), exact)
+
+
+def evaluate_sessions(user_id, totals):
+    """
+    evaluate_awards for one user after the sessions {(day, exercise name):
+    reps} were added to their log and daily totals, reading only what those
+    can have changed: their sets against the bests on record, their weeks
+    against the weekly records, totals and streaks past the next level not
+    yet earned. Only exercises that gain a milestone or have no weekly
+    record yet get the full walk of their daily totals. Returns (created,
+    updated, deleted).
+    """
+    names = {name for _, name in totals}
+    days = {day for day, _ in totals}
+    existing = stored(Award.objects.filter(Q(exercise_name__in=names) | Q(kind='streak'), user_id=user_id))
+    earned = []
+
+    sets = {}
+    for name, date, best in (Exercise.objects.filter(user_id=user_id, exercise_name__in=names, date__in=days)
+                             .values('exercise_name', 'date').annotate(best=Max('reps')).order_by()
+                             .values_list('exercise_name', 'date', 'best')):
+        if name not in sets or (best, -date.toordinal()) > (sets[name][0], -sets[name][1].toordinal()):
+            sets[name] = (best, date)
+    for name, (best, date) in sets.items():
+        record = existing.get((user_id, 'best', name, 0))
+        if record is None or best > record['best_reps']:
+            earned.append(Earned(user_id, 'best', name, 0, best, date))
+
+    walk = {name for name in names if (user_id, 'week', name, 0) not in existing}
+    for name, total in (DailyTotal.objects.filter(user_id=user_id, exercise_name__in=names - walk)
+                        .values('exercise_name').annotate(total=Sum('reps')).order_by()
+                        .values_list('exercise_name', 'total')):
+        level = next_level(VOLUME_LEVELS, existing, user_id, 'volume', name)
+        if level is not None and total >= level:
+            walk.add(name)
+    starts = {period_start('week', day) for day in days}
+    weeks = {}
+    for name, date, reps in (DailyTotal.objects.filter(user_id=user_id, exercise_name__in=names - walk,
+                                                       date__gte=min(starts), date__lt=max(starts) + datetime.timedelta(days=7))
+                             .values_list('exercise_name', 'date', 'reps')):
+        start = period_start('week', date)
+        if start in starts:
+            weeks[name, start] = weeks.get((name, start), 0) + reps
+    for (name, start), total in weeks.items():
+        if total > existing[user_id, 'week', name, 0]['best_reps']:
+            earned.append(Earned(user_id, 'week', name, 0, total, start))
+    if walk:
+        rows = (DailyTotal.objects.filter(user_id=user_id, exercise_name__in=walk).order_by('exercise_name', 'date')
+                .values_list('exercise_name', 'date', 'reps'))
+        for name, group in groupby(rows, key=operator.itemgetter(0)):
+            history = [(date, reps) for _, date, reps in group]
+            earned += volume_milestones(user_id, name, history)
+            earned += weekly_record(user_id, name, history)
+
+    level = max((level for level in STREAK_LEVELS if (user_id, 'streak', '', level) not in existing), default=None)
+    if level is not None:
+        # a run reaching a level it hadn't reached before goes through one of
+        # the days, so the part of it that counts lies within level days of them
+        dates = (DailyTotal.objects.filter(user_id=user_id, date__gte=min(days) - datetime.timedelta(days=level),
+                                           date__lte=max(days) + datetime.timedelta(days=level))
+                 .values_list('date', flat=True).distinct().order_by('date'))
+        earned += [e for e in streak_milestones(user_id, list(dates)) if (user_id, 'streak', '', e.level) not in existing]
+    return save([user_id], earned, existing, exact=False)
+
+
+def next_level(levels, existing, user_id, kind, name):
+    return next((level for level in levels if (user_id, kind, name, level) not in existing), None)
+
+
+def stored(awards):
+    return {(a['user_id'], a['kind'], a['exercise_name'], a['level']): a
+            for a in awards.values('id', 'user_id', 'kind', 'exercise_name', 'level', 'best_reps', 'date')}
+
+
+def save(user_ids, earned, existing, exact):
+    # writes the difference between what was earned and the awards on
+    # record: one bulk insert, one update and, if exact, one delete
+    earned = {(e.user_id, e.kind, e.exercise_name, e.level): e for e in earned}
+    new = [Award(user_id=e.user_id, kind=e.kind, exercise_name=e.exercise_name, level=e.level,
+                 award_name=award_name(e.kind, e.exercise_name, e.level), best_reps=e.value, date=e.date)
+           for key, e in earned.items() if key not in existing]
+    Award.objects.bulk_create(new, ignore_conflicts=True, batch_size=1000)
+
+    changed = [(existing[key]['id'], e) for key, e in earned.items()
+               if key in existing and (existing[key]['best_reps'], existing[key]['date']) != (e.value, e.date)
+               and (exact or e.value > existing[key]['best_reps'])]
+    updated = 0
+    if changed:
+        # one conditional update; without exact a row is only ever raised
+        condition = reduce(operator.or_, [Q(id=id_) if exact else Q(id=id_, best_reps__lt=e.value) for id_, e in changed])
+        updated = Award.objects.filter(condition).update(
+            best_reps=Case(*[When(id=id_, then=Value(e.value)) for id_, e in changed],
+                           default=F('best_reps'), output_field=PositiveIntegerField()),
+            date=Case(*[When(id=id_, then=Value(e.date)) for id_, e in changed], default=F('date')),
+        )
+
+    deleted = 0
+    if exact:
+        stale = [a['id'] for key, a in existing.items() if key not in earned]
+        deleted = Award.objects.filter(id__in=stale).delete()[0] if stale else 0
+    for user_id in user_ids:
+        invalidate(user_id)
+    return len(new), updated, deleted
@@ -0,0 +1,180 @@
+import datetime
+import http.client
+import random
+import threading
+import time
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Sum, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import CatalogExercise, Exercise, Workout, Award, Profile, DailyTotal, normalize_name
+from .services import current_streak
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """
+    Runs the block against a throwaway test database so benchmarks never
+    touch real data. Every other database alias (the read replicas) points
+    at it too, so requests the router sends to a replica read the seeded rows.
+    """
+    old_name = connection.settings_dict['NAME']
+    others = {alias: dict(connections[alias].settings_dict) for alias in connections if alias != DEFAULT_DB_ALIAS}
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    # in place: each thread's connections are built from these same dicts
+    for alias in others:
+        connections[alias].close()
+        connections[alias].settings_dict.update(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in others.items():
+            connections[alias].close()
+            connections[alias].settings_dict.clear()
+            connections[alias].settings_dict.update(settings_dict)
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def timed(fn, *args, **kwargs):
+    """
+    Returns (milliseconds, result) for one call
+    """
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def hammer(host, port, paths, concurrency, seconds, headers=None):
+    """
+    Keeps concurrency keep-alive connections busy requesting paths round robin
+    for seconds. Returns (latencies in ms, status code counts).
+    """
+    deadline = time.perf_counter() + seconds
+    samples, statuses, lock = [], {}, threading.Lock()
+
+    def client(offset):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine, codes, n = [], {}, offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', paths[n % len(paths)], headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                code = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                code = 'error'
+            mine.append((time.perf_counter() - start) * 1000)
+            codes[code] = codes.get(code, 0) + 1
+            n += 1
+        conn.close()
+        with lock:
+            samples.extend(mine)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, statuses
+
+
+def seed_profiles(count, points, batch_size=5000, prefix='bench', password='!'):
+    """
+    Bulk creates count users with profiles, points(i) giving each one's points.
+    password is stored as is, so pass an already hashed one for usable logins.
+    """
+    start = User.objects.count()
+    for offset in range(0, count, batch_size):
+        users = User.objects.bulk_create([
+            User(username='{0}{1}'.format(prefix, start + i), password=password)
+            for i in range(offset, min(count, offset + batch_size))
+        ])
+        if not users or users[0].pk is None:  # backends that don't return ids from bulk inserts
+            users = User.objects.filter(username__in=[u.username for u in users])
+        Profile.objects.bulk_create([
+            Profile(user=user, points=points(start + offset + i)) for i, user in enumerate(users)
+        ])
+
+
+EXERCISE_NAMES = ['Push Up', 'Squat', 'Lunge', 'Sit Up', 'Burpee', 'Pull Up', 'Plank', 'Dip', 'Crunch', 'Jumping Jack']
+
+
+def seed_population(users, catalog_size=5, days=365, workout_chance=0.5, seed=0, batch_size=5000, log=None, password='!'):
+    """
+    Fills the database with a synthetic population: users with profiles, a
+    catalog and a few workouts each, days worth of logged reps and the
+    matching daily totals, personal bests, points and streaks
+    """
+    rng = random.Random(seed)
+    catalog_size = min(catalog_size, len(EXERCISE_NAMES))
+    first_user = User.objects.count()
+    seed_profiles(users, lambda i: 0, batch_size=batch_size, password=password)
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True)[first_user:])
+    if not user_ids:
+        return []
+    today = timezone.localdate()
+    CatalogExercise.objects.bulk_create([
+        CatalogExercise(user_id=user_id, exercise_name=name, normalized_name=normalize_name(name))
+        for user_id in user_ids for name in EXERCISE_NAMES[:catalog_size]
+    ], batch_size=batch_size)
+    batch, logged = [], {}
+    for n, user_id in enumerate(user_ids, start=1):
+        for day in range(days):
+            if rng.random() < workout_chance:
+                date = today - datetime.timedelta(days=day)
+                logged.setdefault(user_id, []).append(date)  # newest first
+                for name in rng.sample(EXERCISE_NAMES[:catalog_size], rng.randint(1, catalog_size)):
+                    batch.append(Exercise(user_id=user_id, exercise_name=name, reps=rng.randint(1, 100), date=date))
+        if len(batch) >= batch_size:
+            Exercise.objects.bulk_create(batch, batch_size=batch_size)
+            batch = []
+        if log and n % 100 == 0:
+            log('seeded {0}/{1} users'.format(n, len(user_ids)))
+    Exercise.objects.bulk_create(batch, batch_size=batch_size)
+    logs = Exercise.objects.filter(user_id__gte=user_ids[0])
+    DailyTotal.objects.bulk_create([
+        DailyTotal(user_id=row['user_id'], date=row['date'], exercise_name=row['exercise_name'], reps=row['total'])
+        for row in logs.values('user_id', 'date', 'exercise_name').annotate(total=Sum('reps')).order_by().iterator()
+    ], batch_size=batch_size)
+    Award.objects.bulk_create([
+        Award(user_id=row['user_id'], exercise_name=row['exercise_name'], best_reps=row['best'],
+              award_name='Personal Best: ' + row['exercise_name'])
+        for row in logs.values('user_id', 'exercise_name').annotate(best=Max('reps')).order_by().iterator()
+    ], batch_size=batch_size)
+    points = DailyTotal.objects.filter(user_id=OuterRef('user_id')).values('user_id').annotate(total=Sum('reps')).values('total')
+    Profile.objects.filter(user_id__gte=user_ids[0]).update(points=Coalesce(Subquery(points), 0))
+    # as recompute_user_stats would leave them
+    profiles = [profile for profile in Profile.objects.filter(user_id__gte=user_ids[0]).only('id', 'user_id')
+                if profile.user_id in logged]
+    for profile in profiles:
+        profile.streak_number = current_streak(logged[profile.user_id])
+        profile.previous_workout = logged[profile.user_id][0]
+    Profile.objects.bulk_update(profiles, ['streak_number', 'previous_workout'], batch_size=batch_size)
+    Workout.objects.bulk_create([
+        Workout(user_id=user_id, workout_name='Workout {0}'.format(n)) for user_id in user_ids for n in range(3)
+    ], batch_size=batch_size)
+    Link = Workout.exercises.through
+    catalog = {}
+    for id_, user_id in CatalogExercise.objects.filter(user_id__gte=user_ids[0]).values_list('id', 'user_id'):
+        catalog.setdefault(user_id, []).append(id_)
+    Link.objects.bulk_create([
+        Link(workout_id=workout_id, catalogexercise_id=exercise_id)
+        for workout_id, user_id in Workout.objects.filter(user_id__gte=user_ids[0]).values_list('id', 'user_id').iterator()
+        for exercise_id in catalog.get(user_id, [])
+    ], batch_size=batch_size)
+    return user_ids
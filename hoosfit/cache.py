@@ -0,0 +1,113 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .routers import primary
+
+
+# Per-user cache. Every entry's key carries the user's current version, so
+# invalidating a user is one increment and the old entries simply age out.
+# Invalidation is driven by the model signals in models.py, plus explicit
+# calls from the bulk paths in services.py that don't send signals. Data
+# shared by everyone, like the leaderboards, goes under a fixed key such as
+# 'leaderboard' in place of a user id.
+
+MISSING = object()
+NAMES = set()
+
+
+def timeout():
+    return getattr(settings, 'HOOSFIT_CACHE_TIMEOUT', 3600)
+
+
+def version_key(user_id):
+    return 'hoosfit:version:{0}'.format(user_id)
+
+
+def get_version(user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock rather than 1, so a version that was evicted
+        # can't come back at a value old entries were stored under
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(user_id):
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def invalidate(user_id):
+    """
+    Drops everything cached for the user. It's done again once the current
+    transaction commits, in case another request cached the old data in
+    between.
+    """
+    if user_id is None:
+        return
+    bump(user_id)
+    transaction.on_commit(lambda: bump(user_id))
+
+
+def count(name, outcome):
+    key = 'hoosfit:stats:{0}:{1}'.format(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cached(user_id, name, compute, variant=''):
+    """
+    Returns compute() for this user, from the cache while nothing of theirs
+    changed. variant tells apart entries of one name, e.g. query parameters;
+    hits and misses are counted per name.
+    """
+    NAMES.add(name)
+    key = 'hoosfit:{0}:{1}:{2}:{3}'.format(user_id, get_version(user_id), name, variant)
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        count(name, 'hit')
+        return value
+    count(name, 'miss')
+    # filled from the primary: an entry computed from a lagging replica after
+    # the last invalidate would keep serving the stale rows until the next one
+    with primary():
+        value = compute()
+    cache.set(key, value, timeout())
+    return value
+
+
+def cached_queryset(user_id, name, queryset):
+    """
+    Like cached, for a queryset: it's cached evaluated, so len(), count()
+    and iterating it don't touch the database
+    """
+    def evaluate():
+        len(queryset)
+        return queryset
+    return cached(user_id, name, evaluate)
+
+
+def stats(names=None):
+    """
+    {name: {'hit': n, 'miss': n}} across every process sharing the cache
+    """
+    names = sorted(names or NAMES)
+    keys = {'hoosfit:stats:{0}:{1}'.format(name, outcome): (name, outcome) for name in names for outcome in ('hit', 'miss')}
+    found = cache.get_many(list(keys))
+    result = {name: {'hit': 0, 'miss': 0} for name in names}
+    for key, (name, outcome) in keys.items():
+        result[name][outcome] = found.get(key, 0)
+    return result
+
+
+def reset_stats(names=None):
+    cache.delete_many(['hoosfit:stats:{0}:{1}'.format(name, outcome)
+                       for name in (names or NAMES) for outcome in ('hit', 'miss')])
@@ -0,0 +1,95 @@
+import csv
+import json
+from .archive import unpack
+from .models import Exercise, ExerciseArchive, Workout, Award
+
+
+CHUNK_SIZE = 2000
+
+
+def exercise_row(exercise):
+    return {'date': exercise.date.isoformat(), 'exercise_name': exercise.exercise_name, 'reps': exercise.reps}
+
+
+def archived_exercise_rows(archive):
+    return [{'date': date.isoformat(), 'exercise_name': archive.exercise_name, 'reps': reps}
+            for date, reps in unpack(archive)]
+
+
+def workout_row(workout):
+    return {'date': workout.date.isoformat(), 'workout_name': workout.workout_name,
+            'exercises': [exercise.exercise_name for exercise in workout.exercises.all()]}
+
+
+def award_row(award):
+    return {'award_name': award.award_name, 'exercise_name': award.exercise_name,
+            'best_reps': award.best_reps, 'date': award.date.isoformat()}
+
+
+# kind: (queryset, columns, row)
+EXPORTS = {
+    'exercises': (lambda: Exercise.objects.all(), ['date', 'exercise_name', 'reps'], exercise_row),
+    'workouts': (lambda: Workout.objects.prefetch_related('exercises'), ['date', 'workout_name', 'exercises'], workout_row),
+    'awards': (lambda: Award.objects.all(), ['award_name', 'exercise_name', 'best_reps', 'date'], award_row),
+}
+# kind: (archive queryset, rows of one archived object), read before the live rows
+ARCHIVED = {
+    'exercises': (lambda: ExerciseArchive.objects.all(), archived_exercise_rows),
+}
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def chunked(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Walks a queryset in primary key order one chunk at a time, so only a
+    chunk is ever held in memory and no cursor stays open between chunks
+    """
+    last = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        chunk = list(chunk[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1].pk
+
+
+class Echo:
+    # csv.writer only needs something with write()
+    def write(self, value):
+        return value
+
+
+def export_rows(kind, user=None, chunk_size=CHUNK_SIZE):
+    """
+    Returns (columns, lazy rows) for one export kind, for one user or
+    everybody, archived history first
+    """
+    queryset, columns, row = EXPORTS[kind]
+    sources = [(queryset(), lambda obj: [row(obj)])]
+    if kind in ARCHIVED:
+        archived, archived_rows = ARCHIVED[kind]
+        sources.insert(0, (archived(), archived_rows))
+    if user is not None:
+        rows = (r for queryset, rows_of in sources
+                for obj in chunked(queryset.filter(user=user), chunk_size) for r in rows_of(obj))
+        return columns, rows
+    rows = (dict(r, username=obj.user.username if obj.user else '') for queryset, rows_of in sources
+            for obj in chunked(queryset.select_related('user'), chunk_size) for r in rows_of(obj))
+    return ['username'] + columns, rows
+
+
+def render_lines(fmt, columns, rows):
+    """
+    Turns export rows into CSV or JSON lines, one string at a time
+    """
+    if fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(row) + '\n'
+        return
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([';'.join(row[c]) if isinstance(row[c], list) else row[c] for c in columns])
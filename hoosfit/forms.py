@@ -1,11 +1,11 @@
 from django.forms import ModelForm, ModelMultipleChoiceField, CharField, CheckboxSelectMultiple
 import datetime
-from .models import Exercise, Workout
+from .models import CatalogExercise, Workout
 
 class CreateNewExercise(ModelForm):
     class Meta:
-        model = Exercise
-        exclude = ['user', 'reps', 'date']
+        model = CatalogExercise
+        exclude = ['user']
 
 class CreateNewWorkout(ModelForm):
     class Meta:
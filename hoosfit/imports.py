@@ -0,0 +1,188 @@
+import csv
+import datetime
+import io
+import itertools
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .jobs import job, renew_lease
+from .models import Exercise
+from .services import canonical_names_by_user, rebuild_daily_totals, recompute_user_stats
+
+
+BATCH_SIZE = 5000
+MAX_REPS = 100000
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.errors = []
+        self.dropped_errors = 0  # counted by an earlier run but not kept
+        self.user_ids = set()
+        self.seconds = 0.0
+
+    @classmethod
+    def resume(cls, progress):
+        """
+        The result of an interrupted import, from its progress()
+        """
+        result = cls()
+        result.rows, result.imported, result.errors = progress['rows'], progress['imported'], progress['errors']
+        result.dropped_errors = progress['error_count'] - len(result.errors)
+        result.user_ids = set(progress['user_ids'])
+        return result
+
+    @property
+    def error_count(self):
+        return self.dropped_errors + len(self.errors)
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def progress(self, max_errors=20):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'errors': self.errors[:max_errors],
+            'error_count': self.error_count,
+            'user_ids': sorted(self.user_ids),
+        }
+
+    def as_dict(self, max_errors=20):
+        return {
+            'rows': self.rows,
+            'imported': self.imported,
+            'errors': self.errors[:max_errors],
+            'error_count': self.error_count,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def read_rows(fileobj, fmt):
+    """
+    Stream-parses an uploaded CSV or JSONL file into dicts, one line at a time
+    """
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+    if fmt == 'jsonl':
+        for line in fileobj:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield {'_error': 'not valid JSON'}
+    else:
+        yield from csv.DictReader(fileobj)
+
+
+def clean_row(row, today):
+    """
+    Returns (date, exercise name, reps, username) or raises ValueError saying what's wrong
+    """
+    if not isinstance(row, dict) or '_error' in row:
+        raise ValueError(row.get('_error', 'not an object') if isinstance(row, dict) else 'not an object')
+    try:
+        date = datetime.date.fromisoformat(str(row.get('date', '')).strip())
+    except ValueError:
+        raise ValueError('date must be YYYY-MM-DD')
+    if date > today:
+        raise ValueError('date is in the future')
+    name = str(row.get('exercise_name') or '').strip()
+    if not name or len(name) > 50:
+        raise ValueError('exercise_name must be 1-50 characters')
+    try:
+        reps = int(row.get('reps'))
+    except (TypeError, ValueError):
+        raise ValueError('reps must be a whole number')
+    if not 0 <= reps <= MAX_REPS:
+        raise ValueError('reps must be between 0 and {0}'.format(MAX_REPS))
+    return date, name, reps, str(row.get('username') or '').strip()
+
+
+def import_batch(batch, first_line, user, result, progress=None):
+    today = timezone.localdate()
+    cleaned = []
+    for line, row in enumerate(batch, start=first_line):
+        try:
+            cleaned.append((line,) + clean_row(row, today))
+        except ValueError as exc:
+            result.errors.append({'line': line, 'error': str(exc)})
+    if user is None:
+        users = dict(User.objects.filter(username__in={row[4] for row in cleaned}).values_list('username', 'id'))
+    rows = []
+    for line, date, name, reps, username in cleaned:
+        user_id = user.id if user is not None else users.get(username)
+        if user_id is None:
+            result.errors.append({'line': line, 'error': 'unknown username {0!r}'.format(username)})
+            continue
+        rows.append((user_id, date, name, reps))
+    # logged the way each user's catalog spells them, as record_sessions does
+    names = {}
+    for user_id, _, name, _ in rows:
+        names.setdefault(user_id, set()).add(name)
+    names = canonical_names_by_user(names)
+    exercises = [Exercise(user_id=user_id, exercise_name=names[user_id][name], reps=reps, date=date)
+                 for user_id, date, name, reps in rows]
+    result.user_ids.update(names)
+    with transaction.atomic():
+        Exercise.objects.bulk_create(exercises, batch_size=1000)
+        result.imported += len(exercises)
+        if progress:
+            progress(result)  # commits with the batch
+
+
+def import_history(fileobj, fmt, user=None, batch_size=BATCH_SIZE, progress=None, resume=None):
+    """
+    Imports logged reps from a CSV/JSONL file (columns date, exercise_name,
+    reps and, when no user is given, username). Rows are validated and
+    inserted a batch at a time, each batch in its own transaction, inside
+    which progress(result) is called; invalid rows are skipped and reported.
+    Given the result.progress() of an interrupted import of the same file,
+    it skips the rows that one got through and adds to its counts. Once
+    everything is in, each affected user's daily totals, points, streak and
+    personal bests are recomputed in one go.
+    """
+    result = ImportResult.resume(resume) if resume else ImportResult()
+    start = time.perf_counter()
+    batch, first_line = [], (2 if fmt == 'csv' else 1) + result.rows  # csv line 1 is the header
+    for row in itertools.islice(read_rows(fileobj, fmt), result.rows, None):
+        batch.append(row)
+        result.rows += 1
+        if len(batch) == batch_size:
+            import_batch(batch, first_line, user, result, progress)
+            first_line += len(batch)
+            batch = []
+    import_batch(batch, first_line, user, result, progress)
+    user_ids = sorted(result.user_ids)
+    for offset in range(0, len(user_ids), 500):
+        chunk = user_ids[offset:offset + 500]
+        rebuild_daily_totals(chunk)
+        recompute_user_stats(chunk)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+@job('import_history', atomic=False)
+def import_saved_upload(path, fmt, user_id, progress=None):
+    """
+    Imports a file the import view saved to the default storage into the
+    user's history, and deletes it afterwards. Every batch commits together
+    with the job's progress and a renewed lease, so no rows stay locked for
+    the whole file and a retry carries on after the last batch that made it.
+    The job's result is the import's summary.
+    """
+    if progress is not None and not default_storage.exists(path):
+        # an earlier run got to the end and deleted the file, but wasn't marked done
+        return ImportResult.resume(progress).as_dict()
+    with default_storage.open(path, 'rb') as fileobj:
+        result = import_history(fileobj, fmt, user=User.objects.get(id=user_id), batch_size=BATCH_SIZE,
+                                progress=lambda result: renew_lease(progress=result.progress()), resume=progress)
+    default_storage.delete(path)
+    return result.as_dict()
@@ -0,0 +1,196 @@
+import contextlib
+import datetime
+import logging
+import threading
+import traceback
+from importlib import import_module
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+
+# A small job queue kept in the database, so it needs no broker. enqueue()
+# writes the job in the caller's transaction: it exists exactly when the
+# work that asked for it was committed. The run_jobs command claims due
+# jobs and runs each one in a transaction together with marking it done,
+# so a job's writes land once even if the worker dies halfway; a claimed
+# job whose worker vanished is picked up again when its lease runs out.
+# Failures are retried with backoff up to MAX_ATTEMPTS times, and a run that
+# outlived its lease counts as an attempt too. A handler that can take longer
+# than LEASE calls renew_lease() as it goes. One that shouldn't hold a
+# single transaction that long is registered with atomic=False: it commits
+# its own work a step at a time, recording how far it got with each step,
+# and a retry carries on from there.
+
+logger = logging.getLogger('hoosfit.jobs')
+
+HANDLERS = {}
+OWN_TRANSACTIONS = set()  # kinds registered with atomic=False
+HANDLER_MODULES = ['hoosfit.imports', 'hoosfit.services']
+MAX_ATTEMPTS = 5
+LEASE = datetime.timedelta(minutes=5)
+
+running = threading.local()
+
+
+def job(kind, atomic=True):
+    """
+    Registers the decorated function as the handler for jobs of this kind;
+    it's called with the job's payload as keyword arguments, and what it
+    returns (if anything, JSON serializable) is kept as the job's result.
+    With atomic=False it doesn't run in the job's transaction but commits
+    its work in steps, passing its progress to renew_lease() with each one.
+    """
+    def register(handler):
+        HANDLERS[kind] = handler
+        if not atomic:
+            OWN_TRANSACTIONS.add(kind)
+        return handler
+    return register
+
+
+def load_handlers():
+    """
+    Imports the modules that register handlers, so that every process (web,
+    worker, shell) knows every job kind whatever it imported itself; called
+    when the app is ready
+    """
+    for module in HANDLER_MODULES:
+        import_module(module)
+
+
+def eager():
+    return getattr(settings, 'HOOSFIT_JOBS_EAGER', False)
+
+
+def enqueue(kind, key=None, **payload):
+    """
+    Queues a job, or with HOOSFIT_JOBS_EAGER runs it right away. A job with
+    a key is only ever queued once, later enqueues with that key do nothing.
+    Returns the job, or None when the key was already taken.
+    """
+    if kind not in HANDLERS:
+        raise ValueError('no handler for job kind {0!r}'.format(kind))
+    new = Job(kind=kind, key=key, payload=payload)
+    if key is None:
+        new.save()
+    else:
+        try:
+            with transaction.atomic():  # a savepoint, so a taken key leaves the caller's transaction usable
+                new.save()
+        except IntegrityError:
+            return None
+    if eager():
+        run(new)
+    return new
+
+
+def claim(limit, now=None):
+    """
+    Takes up to limit due jobs, oldest first, and marks them running under a
+    lease. Concurrent workers skip each other's rows rather than wait on them.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        jobs = list(Job.objects.select_for_update(skip_locked=True)
+                    .filter(status__in=['queued', 'running'], run_after__lte=now)
+                    .order_by('run_after', 'id')[:limit])
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(
+            status='running', run_after=now + LEASE, updated=now)
+    for claimed in jobs:
+        claimed.status, claimed.run_after = 'running', now + LEASE
+    return jobs
+
+
+class LeaseLost(Exception):
+    pass
+
+
+def run(job):
+    """
+    Runs one job. Its writes and it being marked done commit together (unless
+    its handler commits its own); on an exception they roll back and the job
+    is queued again after a backoff, or marked failed once it has used up its
+    attempts. Returns True on success.
+    """
+    outer, running.job = getattr(running, 'job', None), job
+    lease = job.run_after
+    own_transactions = job.kind in OWN_TRANSACTIONS
+    try:
+        with contextlib.nullcontext() if own_transactions else transaction.atomic():
+            result = HANDLERS[job.kind](**job.payload)
+            # run_after is the lease: if it changed, another worker took the
+            # job over after ours ran out, and only one of them may commit
+            if not Job.objects.filter(id=job.id, status=job.status, run_after=job.run_after).update(
+                    status='done', attempts=F('attempts') + 1, last_error='', result=result, updated=timezone.now()):
+                raise LeaseLost()
+        return True
+    except LeaseLost:
+        # still an attempt: a job that always outlives its lease would
+        # otherwise be taken over forever without ever failing
+        logger.warning('job %s #%s was taken over by another worker, dropped', job.kind, job.id)
+        Job.objects.filter(id=job.id).update(attempts=F('attempts') + 1, updated=timezone.now())
+        Job.objects.filter(id=job.id, status__in=['queued', 'running'], attempts__gte=MAX_ATTEMPTS).update(
+            status='failed', last_error='outlived its lease {0} times'.format(MAX_ATTEMPTS), updated=timezone.now())
+        return False
+    except Exception:
+        if eager():
+            raise
+        if not own_transactions:
+            job.run_after = lease  # any renewal rolled back with the rest
+        attempts = job.attempts + 1
+        error = traceback.format_exc()
+        logger.warning('job %s #%s failed (attempt %s of %s)', job.kind, job.id, attempts, MAX_ATTEMPTS, exc_info=True)
+        Job.objects.filter(id=job.id, run_after=job.run_after).update(
+            status='failed' if attempts >= MAX_ATTEMPTS else 'queued',
+            attempts=attempts,
+            run_after=timezone.now() + datetime.timedelta(seconds=2 ** attempts),
+            last_error=error,
+            updated=timezone.now(),
+        )
+        return False
+    finally:
+        running.job = outer
+
+
+def renew_lease(**progress):
+    """
+    Extends the lease of the job being run by LEASE from now; does nothing
+    outside a job. Keyword arguments are merged into the job's payload, so
+    a handler that commits as it goes can save how far it got in the same
+    transaction and is handed that back when the job is retried. In a job's
+    own transaction the write also locks its row until the run commits, so
+    claim() skips it even though the new lease isn't visible to other
+    workers yet. Raises LeaseLost if the job was already taken over.
+    """
+    job = getattr(running, 'job', None)
+    if job is None:
+        return
+    now = timezone.now()
+    payload = dict(job.payload, **progress)
+    if not Job.objects.filter(id=job.id, status=job.status, run_after=job.run_after).update(
+            run_after=now + LEASE, payload=payload, updated=now):
+        raise LeaseLost()
+    job.run_after, job.payload = now + LEASE, payload
+
+
+def run_due(limit=100):
+    """
+    Claims and runs up to limit due jobs; returns (succeeded, failed)
+    """
+    succeeded = failed = 0
+    for claimed in claim(limit):
+        if run(claimed):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def prune(older_than):
+    """
+    Deletes done jobs last touched before older_than; their keys can be used again afterwards
+    """
+    return Job.objects.filter(status='done', updated__lt=older_than).delete()[0]
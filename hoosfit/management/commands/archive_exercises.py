@@ -0,0 +1,35 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from hoosfit.archive import archive_cutoff, archive_exercises
+
+
+class Command(BaseCommand):
+    help = ('Moves logged sets older than HOOSFIT_ARCHIVE_AFTER_DAYS, whole months of them, into ExerciseArchive, '
+            'a chunk of users per transaction. Interrupting it loses nothing; run it again (or pass --after-user '
+            'with the last id it reported) to carry on.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='only archive these users (default: everyone)')
+        parser.add_argument('--days', type=int, help='archive age in days (default: HOOSFIT_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='users archived per transaction')
+        parser.add_argument('--after-user', type=int, default=0, help='skip users up to this id')
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(days=options['days'])
+        users = User.objects.filter(id__gt=options['after_user']).order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        moved = written = 0
+        started = time.monotonic()
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            sets, rows = archive_exercises(chunk, before)
+            moved, written = moved + sets, written + rows
+            self.stdout.write('{0}/{1} users (up to id {2}), {3} sets into {4} archive rows, {5:.0f} sets/s'.format(
+                start + len(chunk), len(user_ids), chunk[-1], moved, written, moved / max(time.monotonic() - started, 1e-9)))
+        seconds = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS('Archived {0} sets logged before {1} into {2} archive rows in {3:.2f} s ({4:.0f} sets/s)'.format(
+            moved, before, written, seconds, moved / max(seconds, 1e-9))))
@@ -0,0 +1,129 @@
+import datetime
+import json
+import django
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.client import MULTIPART_CONTENT
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+from exerciseapp import urls
+from hoosfit.bench import scratch_database, seed_population, timed, percentile
+from hoosfit.models import CatalogExercise, Workout
+
+
+# how to drive the routes that aren't a plain GET
+POSTS = {
+    'exercisesubmit': lambda n, catalog: {'exercise_name': 'Bench Exercise {0}'.format(n)},
+    'workoutsubmit': lambda n, catalog: {'workout_name': 'Bench Workout', 'exercises': [e.id for e in catalog]},
+    'workoutend': lambda n, catalog: {e.exercise_name: n % 100 + 1 for e in catalog},
+    'import': lambda n, catalog: {'file': SimpleUploadedFile('history.csv', ''.join(
+        ['date,exercise_name,reps\n'] + ['2020-01-{0:02d},{1},{2}\n'.format(d, e.exercise_name, n % 100 + 1)
+                                          for d in range(1, 29) for e in catalog]).encode())},
+    # JSON bodies are posted as application/json
+    'logsessions': lambda n, catalog: json.dumps({'sessions': [
+        {'date': str(timezone.localdate() - datetime.timedelta(days=d)), 'reps': {e.exercise_name: n % 100 + 1 for e in catalog}}
+        for d in range(3)]}),
+}
+SKIP = {'admin/', 'accounts/'}
+
+
+def consume(response):
+    # streaming responses only do their work while being read
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+class Command(BaseCommand):
+    help = ('Seeds a scratch database, drives every route in exerciseapp/urls.py through the test client '
+            'and reports p50/p95/p99 latency and query counts, optionally against a saved baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--requests', type=int, default=50, help='requests per route')
+        parser.add_argument('--routes', default='', help='comma separated route names to run (default: all)')
+        parser.add_argument('--output', help='write results to this JSON file')
+        parser.add_argument('--baseline', help='compare against results from an earlier --output')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown before flagging (0.2 = 20%%)')
+
+    def routes(self, only):
+        for pattern in urls.urlpatterns:
+            if isinstance(pattern, URLPattern) and str(pattern.pattern) not in SKIP:
+                name = pattern.name or '/' + str(pattern.pattern)
+                if not only or name in only:
+                    yield name, str(pattern.pattern)
+
+    def run_route(self, client, name, route, user, workout, catalog, count):
+        path = '/' + (route.replace('<str:user_id>', user.username).replace('<int:pk>', str(workout.id))
+                      .replace('<slug:kind>', 'exercises').replace('<slug:fmt>', 'csv'))
+        samples, queries, status = [], 0, None
+        for n in range(count):
+            if name in POSTS:
+                body = POSTS[name](n, catalog)
+                content_type = 'application/json' if isinstance(body, str) else MULTIPART_CONTENT
+                send = lambda: client.post(path, body, content_type=content_type)
+            else:
+                send = lambda: consume(client.get(path))
+            with CaptureQueriesContext(connection) as captured:
+                ms, response = timed(send)
+            samples.append(ms)
+            queries = max(queries, len(captured))
+            status = response.status_code
+        return {
+            'p50': round(percentile(samples, 50), 3),
+            'p95': round(percentile(samples, 95), 3),
+            'p99': round(percentile(samples, 99), 3),
+            'queries': queries,
+            'status': status,
+        }
+
+    def handle(self, *args, **options):
+        only = set(filter(None, options['routes'].split(',')))
+        results = {
+            'meta': {
+                'users': options['users'],
+                'days': options['days'],
+                'requests': options['requests'],
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'run_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            },
+            'routes': {},
+        }
+        with scratch_database():
+            self.stdout.write('seeding {0} users x {1} days...'.format(options['users'], options['days']))
+            user_ids = seed_population(options['users'], days=options['days'])
+            user = User.objects.get(id=user_ids[0])
+            workout = Workout.objects.filter(user=user).first()
+            catalog = list(CatalogExercise.objects.filter(user=user))
+            client = Client()
+            client.force_login(user)
+            for name, route in self.routes(only):
+                result = self.run_route(client, name, route, user, workout, catalog, options['requests'])
+                results['routes'][name] = result
+                self.stdout.write('{0:<20} p50 {p50:>8.2f} ms  p95 {p95:>8.2f} ms  p99 {p99:>8.2f} ms  {queries:>3} queries  [{status}]'.format(
+                    name, **result))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['routes']
+            regressions = []
+            for name, result in results['routes'].items():
+                before = baseline.get(name)
+                if before is None:
+                    continue
+                if result['queries'] > before['queries']:
+                    regressions.append('{0}: {1} queries (was {2})'.format(name, result['queries'], before['queries']))
+                if result['p95'] > before['p95'] * (1 + options['tolerance']):
+                    regressions.append('{0}: p95 {1:.2f} ms (was {2:.2f} ms)'.format(name, result['p95'], before['p95']))
+            if regressions:
+                raise CommandError('Regressions against {0}:\n  {1}'.format(options['baseline'], '\n  '.join(regressions)))
+            self.stdout.write(self.style.SUCCESS('No regressions against {0}'.format(options['baseline'])))
@@ -0,0 +1,106 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from hoosfit.bench import hammer, percentile
+from hoosfit.models import Profile
+
+
+MODES = {
+    'wsgi': {'HOOSFIT_ASGI': '0'},
+    'asgi': {'HOOSFIT_ASGI': '1'},
+}
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    help = ('Serves the configured database with gunicorn twice, sync WSGI workers and then uvicorn ASGI workers '
+            '(see gunicorn.conf.py), and compares throughput and latency of the read pages under concurrent '
+            'connections. Seed data first, e.g. with seed_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username to browse as (default: the one with most points)')
+        parser.add_argument('--concurrency', type=int, default=32, help='open connections')
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers per mode')
+        parser.add_argument('--threads', type=int, default=1, help='threads per sync WSGI worker')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--modes', default='wsgi,asgi')
+        parser.add_argument('--output', help='write results to this JSON file')
+
+    def session_cookie(self, user):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return '{0}={1}'.format(settings.SESSION_COOKIE_NAME, session.session_key)
+
+    def serve(self, mode, options):
+        env = dict(os.environ, **MODES[mode])
+        args = [sys.executable, '-m', 'gunicorn', '--bind', '127.0.0.1:{0}'.format(options['port']),
+                '--workers', str(options['workers']), '--log-level', 'warning']
+        if mode == 'wsgi':
+            args += ['--threads', str(options['threads'])]
+        server = subprocess.Popen(args, env=env, cwd=settings.BASE_DIR)
+        if not wait_for(options['port']):
+            server.terminate()
+            raise CommandError('gunicorn did not start for {0}'.format(mode))
+        return server
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.get(username=options['user'])
+        else:
+            profile = Profile.objects.select_related('user').order_by('-points', 'id').first()
+            if profile is None:
+                raise CommandError('No users to browse as; run seed_data first')
+            user = profile.user
+        headers = {'Cookie': self.session_cookie(user)}
+        paths = [
+            reverse('homepage', kwargs={'user_id': user.username}),
+            reverse('leaderboard'),
+            reverse('awardview', kwargs={'user_id': user.username}),
+            reverse('workoutview', kwargs={'user_id': user.username}),
+        ]
+        results = {}
+        for mode in options['modes'].split(','):
+            server = self.serve(mode, options)
+            try:
+                hammer('127.0.0.1', options['port'], paths, 2, 1, headers)  # warm up
+                samples, statuses = hammer('127.0.0.1', options['port'], paths, options['concurrency'],
+                                           options['seconds'], headers)
+            finally:
+                server.terminate()
+                server.wait()
+            results[mode] = {
+                'requests_per_second': round(len(samples) / options['seconds'], 1),
+                'p50': round(percentile(samples, 50), 2),
+                'p95': round(percentile(samples, 95), 2),
+                'p99': round(percentile(samples, 99), 2),
+                'statuses': {str(code): count for code, count in statuses.items()},
+            }
+            self.stdout.write('{0}: {requests_per_second:>8.1f} req/s  p50 {p50:>8.2f} ms  p95 {p95:>8.2f} ms  '
+                              'p99 {p99:>8.2f} ms  {statuses}'.format(mode, **results[mode]))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'concurrency': options['concurrency'], 'workers': options['workers'],
+                           'database': settings.DATABASES['default']['ENGINE'], 'results': results}, f, indent=2)
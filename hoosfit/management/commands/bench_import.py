@@ -0,0 +1,42 @@
+import datetime
+import io
+import random
+from django.core.management.base import BaseCommand
+from hoosfit.bench import scratch_database, seed_profiles, EXERCISE_NAMES
+from hoosfit.imports import BATCH_SIZE, import_history
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def synthetic_history(usernames, rows, seed=0):
+    """
+    A CSV file of rows random log entries over the last two years
+    """
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    out = io.StringIO()
+    out.write('username,date,exercise_name,reps\n')
+    for _ in range(rows):
+        out.write('{0},{1},{2},{3}\n'.format(rng.choice(usernames), today - datetime.timedelta(days=rng.randrange(730)),
+                                             rng.choice(EXERCISE_NAMES), rng.randint(1, 100)))
+    out.seek(0)
+    return out
+
+
+class Command(BaseCommand):
+    help = 'Imports a synthetic history file into a scratch database and reports rows/sec for a few batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-sizes', default='500,{0}'.format(BATCH_SIZE))
+
+    def handle(self, *args, **options):
+        for batch_size in [int(size) for size in options['batch_sizes'].split(',')]:
+            with scratch_database():
+                seed_profiles(options['users'], lambda i: 0)
+                usernames = list(User.objects.values_list('username', flat=True))
+                history = synthetic_history(usernames, options['rows'])
+                result = import_history(history, 'csv', batch_size=batch_size)
+            self.stdout.write('batch {0:>6}: {1} rows in {2:.2f} s, {3:>8.0f} rows/s, {4} errors'.format(
+                batch_size, result.rows, result.seconds, result.rows_per_second, len(result.errors)))
@@ -0,0 +1,71 @@
+import datetime
+import statistics
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from hoosfit.bench import scratch_database, seed_population, timed
+from hoosfit.models import CatalogExercise, Exercise, Award, Profile, DailyTotal
+
+
+def hot_queries(user_id):
+    today = timezone.localdate()
+    week_ago = today - datetime.timedelta(days=7)
+    return {
+        'exercise log by user and date': Exercise.objects.filter(user_id=user_id, date__gte=week_ago),
+        'exercise log by user and name': Exercise.objects.filter(user_id=user_id, exercise_name='Push Up'),
+        'catalog duplicate check': CatalogExercise.objects.filter(user_id=user_id, normalized_name='push up'),
+        'catalog autocomplete': CatalogExercise.objects.filter(user_id=user_id, normalized_name__startswith='pu')
+                                                       .order_by('normalized_name')[:10],
+        'personal best lookup': Award.objects.filter(user_id=user_id, kind='best', exercise_name='Push Up'),
+        'leaderboard first page': Profile.objects.order_by('-points', 'id')[:26],
+        'daily totals by user and date': DailyTotal.objects.filter(user_id=user_id, date__gte=week_ago),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Seeds a scratch database and compares query plans and latencies of the hot lookups with and without the hoosfit indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--repeat', type=int, default=50, help='timed runs per query')
+
+    def measure(self, user_ids):
+        results = {}
+        for n, user_id in enumerate(user_ids):
+            for label, queryset in hot_queries(user_id).items():
+                if n == 0:
+                    results[label] = {'plan': queryset.explain(), 'samples': []}
+                results[label]['samples'].append(timed(list, queryset)[0])
+        return results
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write('seeding {0} users x {1} days...'.format(options['users'], options['days']))
+            user_ids = seed_population(options['users'], days=options['days'])
+            sample = user_ids[::max(1, len(user_ids) // options['repeat'])][:options['repeat']]
+            after = self.measure(sample)
+            # every model a hot query reads, so each row compares the same
+            # table with and without its indexes. The catalog, award and daily
+            # total lookups are answered by the index behind a unique
+            # constraint. sqlite drops one by rebuilding the table from _meta,
+            # so they're taken off it first, as a migration would.
+            models = [CatalogExercise, Exercise, Award, Profile, DailyTotal]
+            with connection.schema_editor() as editor:
+                for model in models:
+                    indexes, constraints = model._meta.indexes, model._meta.constraints
+                    model._meta.indexes, model._meta.constraints = [], []
+                    try:
+                        for index in indexes:
+                            editor.remove_index(model, index)
+                        for constraint in constraints:
+                            editor.remove_constraint(model, constraint)
+                    finally:
+                        model._meta.indexes, model._meta.constraints = indexes, constraints
+            before = self.measure(sample)
+        for label in after:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write('  without indexes: median {0:.3f} ms\n    {1}'.format(
+                statistics.median(before[label]['samples']), before[label]['plan'].replace('\n', '\n    ')))
+            self.stdout.write('  with indexes:    median {0:.3f} ms\n    {1}'.format(
+                statistics.median(after[label]['samples']), after[label]['plan'].replace('\n', '\n    ')))
@@ -0,0 +1,68 @@
+import datetime
+import random
+import statistics
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from hoosfit.bench import scratch_database, timed, seed_profiles
+from hoosfit.cache import invalidate
+from hoosfit.models import PeriodTotal
+from hoosfit.ranking import period_start
+from hoosfit.views import leaderboard_page
+
+
+class Command(BaseCommand):
+    help = ('Times the weekly and monthly leaderboards (first page uncached, and a page deep in the ranking) '
+            'as the weeks of stored history grow')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--weeks', default='1,26,104', help='comma separated weeks of history')
+        parser.add_argument('--lookups', type=int, default=50)
+        parser.add_argument('--max-ratio', type=float, default=None,
+                            help='fail if the longest history is this many times slower than the shortest')
+
+    def seed_weeks(self, user_ids, weeks, rng):
+        today = timezone.localdate()
+        rows = []
+        for week in weeks:
+            start = period_start('week', today) - datetime.timedelta(weeks=week)
+            rows += [PeriodTotal(user_id=user_id, period='week', start=start, points=rng.randrange(1000))
+                     for user_id in user_ids]
+            if week == 0 or start.day <= 7:  # the current month, then one per month
+                rows += [PeriodTotal(user_id=user_id, period='month', start=period_start('month', start),
+                                     points=rng.randrange(4000)) for user_id in user_ids]
+        PeriodTotal.objects.bulk_create(rows, batch_size=5000, ignore_conflicts=True)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['weeks'].split(','))
+        rng = random.Random(0)
+        medians = []
+        with scratch_database():
+            seed_profiles(options['users'], lambda i: 0)
+            user_ids = list(User.objects.values_list('id', flat=True))
+            seeded = 0
+            for weeks in sizes:
+                self.seed_weeks(user_ids, range(seeded, weeks), rng)
+                seeded = weeks
+                samples = []
+                for n in range(options['lookups']):
+                    window = ('week', 'month')[n % 2]
+                    invalidate('leaderboard')
+                    first = leaderboard_page(window, None, None, 26)
+                    deep = first[-1]
+                    with CaptureQueriesContext(connection) as queries:
+                        ms, _ = timed(lambda: (leaderboard_page(window, None, None, 26),
+                                               leaderboard_page(window, None, (deep.points, deep.id, deep.rank), 26)))
+                    invalidate('leaderboard')
+                    samples.append(ms)
+                median = statistics.median(samples)
+                medians.append(median)
+                self.stdout.write('{0:>4} weeks ({1:>8} period rows): median {2:.2f} ms, {3} queries'.format(
+                    weeks, PeriodTotal.objects.count(), median, len(queries)))
+        ratio = medians[-1] / medians[0] if medians[0] else 0
+        self.stdout.write('longest/shortest history median ratio: {0:.2f}'.format(ratio))
+        if options['max_ratio'] is not None and ratio > options['max_ratio']:
+            raise CommandError('windowed leaderboard slowed down {0:.2f}x (limit {1})'.format(ratio, options['max_ratio']))
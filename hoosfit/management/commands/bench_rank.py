@@ -0,0 +1,43 @@
+import random
+import statistics
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from hoosfit.bench import scratch_database, timed, seed_profiles
+from hoosfit.models import Profile
+from hoosfit.ranking import rank_of, neighbours
+
+
+class Command(BaseCommand):
+    help = 'Times the "my rank and neighbours" lookup as the number of profiles grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='comma separated profile counts')
+        parser.add_argument('--lookups', type=int, default=200, help='lookups timed per size')
+        parser.add_argument('--neighbours', type=int, default=3)
+        parser.add_argument('--max-ratio', type=float, default=None,
+                            help='fail if the largest size is this many times slower than the smallest')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(0)
+        medians = []
+        with scratch_database():
+            seeded = 0
+            for size in sizes:
+                seed_profiles(size - seeded, lambda i: rng.randrange(0, size * 10))
+                seeded = size
+                profiles = list(Profile.objects.order_by('?')[:options['lookups']])
+                samples = []
+                for profile in profiles:
+                    with CaptureQueriesContext(connection) as queries:
+                        ms, _ = timed(lambda: (rank_of(profile), neighbours(profile, options['neighbours'])))
+                    samples.append(ms)
+                median = statistics.median(samples)
+                medians.append(median)
+                self.stdout.write('{0:>8} profiles: median {1:.2f} ms, max {2:.2f} ms, {3} queries'.format(
+                    size, median, max(samples), len(queries)))
+        ratio = medians[-1] / medians[0] if medians[0] else 0
+        self.stdout.write('largest/smallest median ratio: {0:.2f}'.format(ratio))
+        if options['max_ratio'] is not None and ratio > options['max_ratio']:
+            raise CommandError('rank lookup slowed down {0:.2f}x (limit {1})'.format(ratio, options['max_ratio']))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from hoosfit.cache import stats, reset_stats
+
+
+# everything views.py and the templates cache; NAMES in hoosfit.cache only
+# knows the ones this process has used
+CACHED = ['activity', 'awards', 'catalog', 'workouts', 'fragment:awards', 'fragment:catalog', 'fragment:workouts']
+
+
+class Command(BaseCommand):
+    help = 'Shows hit/miss counts of the per-user cache, summed over every process sharing the cache backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='zero the counters afterwards')
+
+    def handle(self, *args, **options):
+        counts = stats(CACHED)
+        for name, count in counts.items():
+            total = count['hit'] + count['miss']
+            self.stdout.write('{0:<20} {1:>8} hits {2:>8} misses  {3:>6.1%} hit rate'.format(
+                name, count['hit'], count['miss'], count['hit'] / total if total else 0))
+        if options['reset']:
+            reset_stats(CACHED)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from hoosfit.services import compact_points
+
+
+class Command(BaseCommand):
+    help = 'Folds the points ledger into Profile.points; run it every few minutes (e.g. from a scheduler)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='events folded per transaction')
+
+    def handle(self, *args, **options):
+        folded = compact_points(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS('Folded {0} points events'.format(folded)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from hoosfit.exports import EXPORTS, FORMATS, export_rows, render_lines
+
+
+class Command(BaseCommand):
+    help = "Exports every user's exercise log, workouts or awards in one streaming pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--output', help='file to write to (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        columns, rows = export_rows(options['kind'], chunk_size=options['chunk_size'])
+        lines = render_lines(options['format'], columns, rows)
+        if options['output']:
+            with open(options['output'], 'w', newline='') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
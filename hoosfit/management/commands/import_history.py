@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from hoosfit.imports import BATCH_SIZE, import_history
+
+
+class Command(BaseCommand):
+    help = ('Imports historical exercise logs from a CSV or JSONL file (date, exercise_name, reps and a '
+            'username column unless --user is given), then recomputes totals, points, streaks and personal bests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+        parser.add_argument('--user', help='import every row for this username')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def progress(self, result):
+        self.stdout.write('{0} rows read, {1} imported, {2} errors'.format(result.rows, result.imported, len(result.errors)))
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('No user called {0!r}'.format(options['user']))
+        with open(options['path'], newline='', encoding='utf-8') as f:
+            result = import_history(f, fmt, user=user, batch_size=options['batch_size'], progress=self.progress)
+        for error in result.errors[:20]:
+            self.stderr.write('line {line}: {error}'.format(**error))
+        if len(result.errors) > 20:
+            self.stderr.write('... and {0} more errors'.format(len(result.errors) - 20))
+        self.stdout.write(self.style.SUCCESS('Imported {0} of {1} rows in {2:.2f} s ({3:.0f} rows/s)'.format(
+            result.imported, result.rows, result.seconds, result.rows_per_second)))
@@ -0,0 +1,111 @@
+import gzip
+import json
+import re
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import URLPattern
+from exerciseapp import urls
+from hoosfit.bench import scratch_database, seed_population
+from hoosfit.models import Workout
+
+try:
+    import brotli
+except ImportError:  # brotli sizes are left out
+    brotli = None
+
+
+ASSET = re.compile(r'<(?:link[^>]*\shref|script[^>]*\ssrc)="([^"]+)"')
+# page routes worth weighing; the landing page ('') is weighed logged out
+PAGES = ['', 'homepage', 'exercisecreate', 'exerciseview', 'workoutcreate', 'workoutview', 'workoutstart',
+         'workoutsummary', 'awardview', 'leaderboard']
+
+
+def sizes(content):
+    """
+    {'raw': bytes, 'gzip': bytes, 'br': bytes} for content as it would go over the wire
+    """
+    result = {'raw': len(content), 'gzip': len(gzip.compress(content, 9))}
+    if brotli is not None:
+        result['br'] = len(brotli.compress(content))
+    return result
+
+
+def static_file(url):
+    """
+    The file behind a local static URL, collected or not, or None
+    """
+    name = url[len(settings.STATIC_URL):].split('?')[0]
+    path = finders.find(name)
+    if path is None and settings.STATIC_ROOT and staticfiles_storage.exists(name):
+        path = staticfiles_storage.path(name)
+    return path
+
+
+class Command(BaseCommand):
+    help = ('Renders every page template against a scratch database and reports its weight: the HTML, '
+            'the CSS/JS it pulls in (raw, gzip and brotli bytes), and the bytes of a first and a repeat visit')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='write results to this JSON file')
+
+    def weigh(self, client, path):
+        response = client.get(path)
+        html = response.content
+        template = response.templates[0].name if response.templates else '?'
+        assets, external = {}, []
+        for url in dict.fromkeys(ASSET.findall(html.decode())):
+            if not url.startswith(settings.STATIC_URL):
+                external.append(url)
+                continue
+            found = static_file(url)
+            if found:
+                with open(found, 'rb') as f:
+                    assets[url] = sizes(f.read())
+        encoding = 'br' if brotli is not None else 'gzip'
+        html_sizes = sizes(html)
+        asset_bytes = sum(size[encoding] for size in assets.values())
+        return template, {
+            'html': html_sizes,
+            'assets': {url: size for url, size in assets.items()},
+            'external': external,
+            # fingerprinted assets are cached for good, so a repeat visit only fetches the HTML
+            'first_visit': html_sizes[encoding] + asset_bytes,
+            'repeat_visit': html_sizes[encoding],
+            'encoding': encoding,
+        }
+
+    def handle(self, *args, **options):
+        try:
+            setup_test_environment()  # so responses say which template they rendered
+            teardown = True
+        except RuntimeError:  # already set up, e.g. under the test runner
+            teardown = False
+        results = {}
+        try:
+            with scratch_database():
+                user = User.objects.get(id=seed_population(1, days=30)[0])
+                workout = Workout.objects.filter(user=user).first()
+                client = Client()
+                client.force_login(user)
+                for pattern in urls.urlpatterns:
+                    name = pattern.name or str(pattern.pattern) if isinstance(pattern, URLPattern) else None
+                    if name not in PAGES:
+                        continue
+                    path = '/' + str(pattern.pattern).replace('<str:user_id>', user.username).replace('<int:pk>', str(workout.id))
+                    template, result = self.weigh(client if name else Client(), path)
+                    results[template] = result
+                    self.stdout.write('{0:<32} html {1:>7} B  assets {2:>2} local, {3} external  '
+                                      'first visit {4:>8} B  repeat {5:>7} B ({6})'.format(
+                                          template, result['html']['raw'], len(result['assets']), len(result['external']),
+                                          result['first_visit'], result['repeat_visit'], result['encoding']))
+        finally:
+            if teardown:
+                teardown_test_environment()
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
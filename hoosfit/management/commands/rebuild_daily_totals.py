@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from hoosfit.services import rebuild_daily_totals
+
+
+class Command(BaseCommand):
+    help = 'Backfills or rebuilds the DailyTotal rollup from logged exercises, a chunk of users at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='only rebuild these users (default: everyone)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='users rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        rows = 0
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            rows += rebuild_daily_totals(chunk)
+            self.stdout.write('{0}/{1} users, {2} daily totals'.format(start + len(chunk), len(user_ids), rows))
+        self.stdout.write(self.style.SUCCESS('Rebuilt {0} daily totals for {1} users'.format(rows, len(user_ids))))
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from hoosfit.awards import evaluate_awards
+
+
+class Command(BaseCommand):
+    help = ('Re-evaluates every award rule for every user (or the given ones) from their history, a chunk of '
+            'users per transaction: awards newly earned are added, records corrected and awards no longer earned '
+            'removed. Run it after changing the rules in hoosfit/awards.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='only these users (default: everyone)')
+        parser.add_argument('--chunk-size', type=int, default=200, help='users evaluated per transaction')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        totals = [0, 0, 0]
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            with transaction.atomic():
+                counts = evaluate_awards(chunk, exact=True)
+            totals = [total + count for total, count in zip(totals, counts)]
+            self.stdout.write('{0}/{1} users, {2} added, {3} updated, {4} removed'.format(
+                start + len(chunk), len(user_ids), *totals))
+        self.stdout.write(self.style.SUCCESS('Re-evaluated awards of {0} users: {1} added, {2} updated, {3} removed'.format(
+            len(user_ids), *totals)))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from hoosfit.models import Profile
+from hoosfit.services import points_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Checks every profile's points plus its pending ledger events against the sum of its logged reps, archived ones included, "
+            "and with --fix corrects the profiles that disagree")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        mismatched, checked, last = [], 0, 0
+        while True:
+            with transaction.atomic():
+                profiles = list(Profile.objects.select_related('user').filter(user_id__gt=last)
+                                .order_by('user_id')[:options['chunk_size']])
+                if not profiles:
+                    break
+                user_ids = [profile.user_id for profile in profiles]
+                # points, log and ledger from one snapshot, and the fix applied
+                # as a delta: logs and compactions landing meanwhile move
+                # points and pending together, which a delta leaves alone
+                points, logged, events = points_snapshot(user_ids)
+                pending = {}
+                for user_id, event_points in events.values():
+                    pending[user_id] = pending.get(user_id, 0) + event_points
+                for profile in profiles:
+                    expected = logged.get(profile.user_id) or 0
+                    actual = points.get(profile.user_id, 0) + pending.get(profile.user_id, 0)
+                    if actual != expected:
+                        mismatched.append((profile, actual, expected))
+                        if options['fix']:
+                            Profile.objects.filter(pk=profile.pk).update(points=F('points') + (expected - actual))
+                checked += len(profiles)
+                last = user_ids[-1]
+        for profile, actual, expected in mismatched[:50]:
+            self.stdout.write('{0}: {1} points, {2} logged'.format(profile.user.username, actual, expected))
+        if mismatched and not options['fix']:
+            raise CommandError('{0} of {1} profiles disagree with their logs (rerun with --fix)'.format(len(mismatched), checked))
+        self.stdout.write(self.style.SUCCESS('{0} profiles checked, {1} {2}'.format(
+            checked, len(mismatched), 'fixed' if options['fix'] else 'mismatched')))
@@ -0,0 +1,53 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from hoosfit import jobs
+from hoosfit.services import compact_points, snapshot_leaderboards
+
+
+class Command(BaseCommand):
+    help = ('Works through the job queue: runs due jobs, retries failed ones with backoff, '
+            'folds the points ledger every --compact-every seconds, freezes the leaderboards of weeks and months '
+            'that have closed every --snapshot-every seconds and prunes old finished jobs')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='run what is due now and exit')
+        parser.add_argument('--batch', type=int, default=100, help='jobs claimed at a time')
+        parser.add_argument('--sleep', type=float, default=1.0, help='seconds to wait when nothing is due')
+        parser.add_argument('--compact-every', type=float, default=60.0,
+                            help='seconds between compact_points runs, 0 to leave it to a scheduler')
+        parser.add_argument('--snapshot-every', type=float, default=3600.0,
+                            help='seconds between snapshot_leaderboards runs, 0 to leave it to a scheduler')
+        parser.add_argument('--keep-days', type=int, default=7, help='finished jobs are kept this long')
+
+    def housekeep(self, name, step, *args):
+        # logged like a failing job and tried again next time round, so one
+        # database error here doesn't stop the worker running jobs
+        try:
+            step(*args)
+        except Exception:
+            jobs.logger.warning('%s failed', name, exc_info=True)
+
+    def handle(self, *args, **options):
+        next_compaction = next_snapshot = next_prune = time.monotonic()
+        while True:
+            succeeded, failed = jobs.run_due(options['batch'])
+            if succeeded or failed:
+                self.stdout.write('{0} jobs done, {1} failed'.format(succeeded, failed))
+            snapshot_due = options['snapshot_every'] and time.monotonic() >= next_snapshot
+            # also right before a snapshot, so it freezes every point logged in time
+            if snapshot_due or (options['compact_every'] and time.monotonic() >= next_compaction):
+                self.housekeep('compact_points', compact_points)
+                next_compaction = time.monotonic() + options['compact_every']
+            if snapshot_due:
+                # periods that closed since the last run; the ones done already are skipped
+                self.housekeep('snapshot_leaderboards', snapshot_leaderboards)
+                next_snapshot = time.monotonic() + options['snapshot_every']
+            if time.monotonic() >= next_prune:
+                self.housekeep('prune', jobs.prune, timezone.now() - datetime.timedelta(days=options['keep_days']))
+                next_prune = time.monotonic() + 3600
+            if options['once'] and not succeeded + failed:
+                return
+            if not succeeded + failed:
+                time.sleep(options['sleep'])
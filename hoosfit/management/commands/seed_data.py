@@ -0,0 +1,24 @@
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from hoosfit.bench import seed_population
+
+
+class Command(BaseCommand):
+    help = 'Seeds the configured database with a synthetic population for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--catalog', type=int, default=5, help='catalog exercises per user')
+        parser.add_argument('--days', type=int, default=365, help='days of logged history per user')
+        parser.add_argument('--workout-chance', type=float, default=0.5, help='chance a user worked out on a given day')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--password', default=None, help='give every seeded user this password (default: unusable)')
+
+    def handle(self, *args, **options):
+        password = make_password(options['password']) if options['password'] else '!'
+        user_ids = seed_population(
+            options['users'], catalog_size=options['catalog'], days=options['days'],
+            workout_chance=options['workout_chance'], seed=options['seed'], password=password,
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS('Seeded {0} users'.format(len(user_ids))))
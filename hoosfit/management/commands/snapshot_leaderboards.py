@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from hoosfit.services import compact_points, snapshot_leaderboards
+
+
+class Command(BaseCommand):
+    help = ('Freezes the top of every closed week and month into LeaderboardSnapshot; '
+            'run_jobs does it every hour, this is for a scheduler or a backfill')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100, help='ranks kept per period')
+        parser.add_argument('--prune', action='store_true', help='delete the per-user totals of snapshotted periods')
+
+    def handle(self, *args, **options):
+        compact_points()  # so late events of the period that just closed make it in
+        count = snapshot_leaderboards(size=options['size'], prune=options['prune'])
+        self.stdout.write(self.style.SUCCESS('Snapshotted {0} periods'.format(count)))
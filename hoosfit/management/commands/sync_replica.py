@@ -0,0 +1,24 @@
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Copies the SQLite primary over the SQLite replicas (HOOSFIT_LOCAL_REPLICA=1), '
+            'standing in for replication when trying replica routing locally')
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite' or not settings.HOOSFIT_READ_REPLICAS:
+            raise CommandError('sync_replica needs a SQLite primary and at least one replica, see HOOSFIT_LOCAL_REPLICA')
+        primary.ensure_connection()
+        for alias in settings.HOOSFIT_READ_REPLICAS:
+            name = connections[alias].settings_dict['NAME']
+            connections[alias].close()
+            target = sqlite3.connect(str(name))
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS('Copied {0} to {1} ({2})'.format(primary.settings_dict['NAME'], alias, name)))
@@ -0,0 +1,27 @@
+import urllib.request
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from hoosfit.assets import VENDOR, VENDOR_DIR, integrity
+
+
+class Command(BaseCommand):
+    help = ('Downloads the third-party CSS/JS in hoosfit/assets.py into hoosfit/static/hoosfit/vendor, '
+            'checking each against its pinned integrity hash. Commit the files; collectstatic does the rest.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='download files that are already there again')
+
+    def handle(self, *args, **options):
+        target = Path(__file__).resolve().parents[2] / 'static' / VENDOR_DIR
+        target.mkdir(parents=True, exist_ok=True)
+        for name, (url, sri) in VENDOR.items():
+            path = target / name
+            if path.exists() and not options['force']:
+                self.stdout.write('{0}: already vendored'.format(name))
+                continue
+            with urllib.request.urlopen(url, timeout=30) as response:
+                content = response.read()
+            if integrity(content) != sri:
+                raise CommandError('{0}: {1} does not match its pinned integrity hash'.format(name, url))
+            path.write_bytes(content)
+            self.stdout.write(self.style.SUCCESS('{0}: {1} bytes from {2}'.format(name, len(content), url)))
@@ -0,0 +1,145 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+
+logger = logging.getLogger('hoosfit.performance')
+
+
+class RequestTimings:
+    """
+    What one request spent on SQL and template rendering, in milliseconds
+    """
+    def __init__(self):
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.statements = Counter()
+        self.lock = threading.Lock()  # async views run queries on several threads at once
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.sql_ms += (time.perf_counter() - start) * 1000
+                self.queries += 1
+                self.statements[sql] += 1
+
+
+# The request being timed. sync_to_async runs code in a copy of the caller's
+# context, so queries async views send to worker threads are counted too.
+current_timings = contextvars.ContextVar('hoosfit_timings', default=None)
+
+
+def record_sql(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_sql(execute, sql, params, many, context)
+
+
+def time_connection(connection, **kwargs):
+    # connections are per thread, so every one of them gets the wrapper,
+    # whichever thread opens it
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+
+class PerformanceMiddleware:
+    """
+    Adds a Server-Timing header (SQL, templates, whole view) to every response
+    and logs a structured line for requests slower than HOOSFIT_SLOW_REQUEST_MS.
+
+    Enable with HOOSFIT_PERFORMANCE=1, which also swaps in TimedDjangoTemplates
+    so template time can be told apart. SQL run lazily while a template renders
+    is counted in both.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'HOOSFIT_SLOW_REQUEST_MS', 500)
+        connection_created.connect(time_connection)
+        for connection in connections.all():  # already open on this thread
+            time_connection(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)  # so the handler awaits it, like MiddlewareMixin
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings, start, token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings, start, token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    def begin(self, request):
+        timings = request.timings = RequestTimings()
+        for connection in connections.all():
+            time_connection(connection)
+        return timings, time.perf_counter(), current_timings.set(timings)
+
+    def finish(self, request, response, timings, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        response['Server-Timing'] = 'db;dur={0:.1f};desc="{1} queries", tpl;dur={2:.1f}, view;dur={3:.1f}'.format(
+            timings.sql_ms, timings.queries, timings.template_ms, total_ms)
+        if total_ms >= self.slow_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'view_ms': round(total_ms, 1),
+                'sql_ms': round(timings.sql_ms, 1),
+                'template_ms': round(timings.template_ms, 1),
+                'queries': timings.queries,
+                'top_sql': [{'sql': sql, 'count': count} for sql, count in timings.statements.most_common(5)],
+            }))
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings = getattr(request, 'timings', None)
+            if timings is not None:
+                timings.template_ms += (time.perf_counter() - start) * 1000
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The stock Django template backend, but it reports render time to PerformanceMiddleware
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
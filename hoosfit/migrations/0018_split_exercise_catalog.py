@@ -0,0 +1,98 @@
+import datetime
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CATALOG_DATE = datetime.date(2000, 1, 1)
+
+
+def move_catalog(apps, schema_editor):
+    """
+    Copies every sentinel-dated Exercise row into CatalogExercise under the same
+    id, repoints workouts at the copies and then drops the originals
+    """
+    Exercise = apps.get_model('hoosfit', 'Exercise')
+    CatalogExercise = apps.get_model('hoosfit', 'CatalogExercise')
+    Workout = apps.get_model('hoosfit', 'Workout')
+    db = schema_editor.connection.alias
+
+    catalog = Exercise.objects.using(db).filter(date=CATALOG_DATE).values_list('id', 'user_id', 'exercise_name')
+    batch = []
+    for id_, user_id, name in catalog.iterator(chunk_size=2000):
+        batch.append(CatalogExercise(id=id_, user_id=user_id, exercise_name=name))
+        if len(batch) == 2000:
+            CatalogExercise.objects.using(db).bulk_create(batch)
+            batch = []
+    CatalogExercise.objects.using(db).bulk_create(batch)
+
+    OldLink = Workout.exercises.through
+    NewLink = Workout.catalog_exercises.through
+    links = OldLink.objects.using(db).filter(exercise__date=CATALOG_DATE).values_list('workout_id', 'exercise_id')
+    batch = []
+    for workout_id, exercise_id in links.iterator(chunk_size=2000):
+        batch.append(NewLink(workout_id=workout_id, catalogexercise_id=exercise_id))
+        if len(batch) == 2000:
+            NewLink.objects.using(db).bulk_create(batch)
+            batch = []
+    NewLink.objects.using(db).bulk_create(batch)
+
+    Exercise.objects.using(db).filter(date=CATALOG_DATE).delete()
+
+    # the copies kept their ids, so move the sequence past them
+    with schema_editor.connection.cursor() as cursor:
+        for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), [CatalogExercise]):
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hoosfit', '0017_dailytotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogExercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exercise_name', models.CharField(max_length=50)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='catalog', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='catalog_exercises',
+            field=models.ManyToManyField(related_name='+', to='hoosfit.CatalogExercise'),
+        ),
+        migrations.RunPython(move_catalog),
+        migrations.RemoveField(
+            model_name='workout',
+            name='exercises',
+        ),
+        migrations.RenameField(
+            model_name='workout',
+            old_name='catalog_exercises',
+            new_name='exercises',
+        ),
+        migrations.AlterField(
+            model_name='workout',
+            name='exercises',
+            field=models.ManyToManyField(to='hoosfit.CatalogExercise'),
+        ),
+        migrations.AlterField(
+            model_name='exercise',
+            name='date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+        migrations.AddIndex(
+            model_name='catalogexercise',
+            index=models.Index(fields=['user', 'exercise_name'], name='catalog_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'date'], name='exercise_user_date_idx'),
+        ),
+    ]
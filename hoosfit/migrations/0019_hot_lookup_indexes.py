@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:59
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+def dedupe_awards(apps, schema_editor):
+    """
+    Keeps only the best award per (user, exercise) so the unique constraint can be added
+    """
+    Award = apps.get_model('hoosfit', 'Award')
+    db = schema_editor.connection.alias
+    dupes = (Award.objects.using(db)
+             .values('user_id', 'exercise_name')
+             .annotate(n=models.Count('id'))
+             .filter(n__gt=1)
+             .order_by())
+    for dupe in dupes.iterator():
+        awards = Award.objects.using(db).filter(user_id=dupe['user_id'], exercise_name=dupe['exercise_name'])
+        keep = awards.order_by('-best_reps', 'date', 'id').values_list('id', flat=True)[0]
+        awards.exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoosfit', '0018_split_exercise_catalog'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='catalogexercise',
+            name='catalog_user_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='catalogexercise',
+            index=models.Index(django.db.models.expressions.F('user'), django.db.models.functions.text.Lower('exercise_name'), name='catalog_user_lower_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exercise',
+            index=models.Index(fields=['user', 'exercise_name'], name='exercise_user_name_idx'),
+        ),
+        migrations.RunPython(dedupe_awards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='award',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise_name'), name='award_user_exercise_unique'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:09
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoosfit', '0019_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='award',
+            name='date',
+            field=models.DateField(default=datetime.date.today),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:17
+
+from django.db import migrations, models
+import django.utils.timezone
+import hoosfit.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoosfit', '0020_award_date_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='award',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='exercise',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='previous_workout',
+            field=models.DateField(default=hoosfit.models.yesterday),
+        ),
+    ]
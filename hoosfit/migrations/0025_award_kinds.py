@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoosfit', '0024_job_queue'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='award',
+            name='award_user_exercise_unique',
+        ),
+        migrations.AddField(
+            model_name='award',
+            name='kind',
+            field=models.CharField(choices=[('best', 'Personal Best'), ('volume', 'Volume Milestone'), ('streak', 'Streak Milestone'), ('week', 'Weekly Record')], default='best', max_length=6),
+        ),
+        migrations.AddField(
+            model_name='award',
+            name='level',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='award',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'exercise_name', 'level'), name='award_unique'),
+        ),
+    ]
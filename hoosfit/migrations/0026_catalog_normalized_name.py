@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def normalize_catalog(apps, schema_editor):
+    """
+    Fills in normalized_name and merges catalog entries that only differed by
+    case or spacing into the oldest one, so the unique constraint can be added
+    """
+    CatalogExercise = apps.get_model('hoosfit', 'CatalogExercise')
+    Link = apps.get_model('hoosfit', 'Workout').exercises.through
+    db = schema_editor.connection.alias
+
+    keep, merged, batch = {}, {}, []
+    for exercise in CatalogExercise.objects.using(db).order_by('id').iterator(chunk_size=2000):
+        exercise.normalized_name = ' '.join(exercise.exercise_name.casefold().split())  # models.normalize_name
+        key = (exercise.user_id, exercise.normalized_name)
+        if key in keep:
+            merged[exercise.id] = keep[key]
+            continue
+        keep[key] = exercise.id
+        batch.append(exercise)
+        if len(batch) == 2000:
+            CatalogExercise.objects.using(db).bulk_update(batch, ['normalized_name'])
+            batch = []
+    CatalogExercise.objects.using(db).bulk_update(batch, ['normalized_name'])
+
+    if merged:
+        links = Link.objects.using(db).filter(catalogexercise_id__in=list(merged)).values_list('workout_id', 'catalogexercise_id')
+        Link.objects.using(db).bulk_create([Link(workout_id=workout_id, catalogexercise_id=merged[exercise_id])
+                                            for workout_id, exercise_id in links], ignore_conflicts=True)
+        CatalogExercise.objects.using(db).filter(id__in=list(merged)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hoosfit', '0025_award_kinds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogexercise',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(normalize_catalog, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='catalogexercise',
+            name='catalog_user_lower_name_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='catalogexercise',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='catalog_user_name_unique', opclasses=['int4_ops', 'varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('hoosfit', '0026_catalog_normalized_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exercise_name', models.CharField(max_length=50)),
+                ('month', models.DateField()),
+                ('sets', models.JSONField(default=list)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('best', models.PositiveIntegerField(default=0)),
+                ('best_date', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercise_archive', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='exercisearchive',
+            constraint=models.UniqueConstraint(fields=('user', 'exercise_name', 'month'), name='archive_unique'),
+        ),
+    ]
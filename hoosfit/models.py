@@ -1,50 +1,264 @@
-from django.db import models
+from django.db import connections, models, router
 import datetime
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from .cache import invalidate
+
+DELETE_BATCH = 1000  # values per DELETE in delete_quietly
+
+def normalize_name(name):
+    # case-folded with runs of whitespace collapsed, so " push  UP" and "Push Up" are one exercise
+    return ' '.join(name.casefold().split())
+
+class CatalogExercise (models.Model):
+    # an exercise in the user's personal library, which workouts are built from
+    user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='catalog')
+    exercise_name = models.CharField(max_length=50)
+    normalized_name = models.CharField(max_length=100, editable=False)  # normalize_name(exercise_name), set on save
+
+    class Meta:
+        constraints = [
+            # duplicate checks, name lookups and the autocomplete prefix search all
+            # walk this index; the pattern opclass lets postgres use it for LIKE 'x%'
+            models.UniqueConstraint(fields=['user', 'normalized_name'], name='catalog_user_name_unique',
+                                    opclasses=['int4_ops', 'varchar_pattern_ops']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.exercise_name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.exercise_name
 
 class Exercise (models.Model):
+    # one logged set of reps
     user = models.ForeignKey(User, null=True, on_delete=models.CASCADE) 
     exercise_name = models.CharField(max_length=50)
-    date = models.DateField(default=datetime.date(2000,1,1))
+    date = models.DateField(default=timezone.localdate)
     reps = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='exercise_user_date_idx'),
+            models.Index(fields=['user', 'exercise_name'], name='exercise_user_name_idx'),
+            models.Index(fields=['date'], name='exercise_date_idx'),  # the admin's date hierarchy
+        ]
+
     def __str__(self):
         return self.exercise_name
 
+class ExerciseArchive (models.Model):
+    # a user's logged sets of one exercise in one month, moved out of Exercise
+    # by archive_exercises once they're old (hoosfit/archive.py). sets is
+    # [[day of month, reps], ...] in log order; total and best keep what
+    # recomputing points and personal bests needs without unpacking it
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exercise_archive')
+    exercise_name = models.CharField(max_length=50)
+    month = models.DateField()  # the first of the month
+    sets = models.JSONField(default=list)
+    total = models.PositiveIntegerField(default=0)
+    best = models.PositiveIntegerField(default=0)
+    best_date = models.DateField()  # first day of the month best was done
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise_name', 'month'], name='archive_unique'),
+        ]
+
+    def __str__(self):
+        return '{0} {1:%Y-%m}: {2} sets'.format(self.exercise_name, self.month, len(self.sets))
+
 class Workout (models.Model):
     user = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='workouts')
     workout_name = models.CharField(max_length=50)
-    exercises = models.ManyToManyField(Exercise)
+    exercises = models.ManyToManyField(CatalogExercise)
     date = models.DateField(auto_now=True)
 
     def __str__(self):
         return self.workout_name
 
 class Award (models.Model):
+    # one row per award earned, evaluated by the rules in awards.py. Records
+    # (personal best, weekly record) have level 0 and are raised in place;
+    # milestones get a row per level reached. best_reps is the value that
+    # earned it: reps for records and volume, days for streaks.
+    KINDS = [('best', 'Personal Best'), ('volume', 'Volume Milestone'), ('streak', 'Streak Milestone'),
+             ('week', 'Weekly Record')]
+
     user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=6, choices=KINDS, default='best')
     exercise_name = models.CharField(max_length=50, default="")
+    level = models.PositiveIntegerField(default=0)
     award_name = models.CharField(max_length=75)
     best_reps = models.PositiveIntegerField(default=0)
-    date = models.DateField(auto_now=True)
+    date = models.DateField(default=timezone.localdate)  # when it was earned
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'exercise_name', 'level'], name='award_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='award_date_idx'),  # the admin's date hierarchy
+        ]
 
     def __str__(self):
         return self.award_name
 
+class DailyTotal (models.Model):
+    # rollup of a user's logged reps per exercise per day, kept up to date by log_workout
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_totals')
+    date = models.DateField()
+    exercise_name = models.CharField(max_length=50)
+    reps = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'exercise_name'], name='dailytotal_unique'),
+        ]
+
+    def __str__(self):
+        return '{0} {1}: {2}'.format(self.date, self.exercise_name, self.reps)
+
+class PointsEvent (models.Model):
+    # append-only ledger of points earned, written at log time so logging never
+    # touches Profile.points; compact_points folds it in periodically
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_events')
+    points = models.PositiveIntegerField()
+    date = models.DateField(default=timezone.localdate)
+
+    def __str__(self):
+        return '{0} {1}: {2}'.format(self.user_id, self.date, self.points)
+
+class PeriodTotal (models.Model):
+    # points earned per user per week/month, kept up to date by compact_points;
+    # the weekly and monthly leaderboards are range walks over period_ranking_idx
+    PERIODS = [('week', 'Week'), ('month', 'Month')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='period_totals')
+    period = models.CharField(max_length=5, choices=PERIODS)
+    start = models.DateField()
+    points = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'period', 'start'], name='periodtotal_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'start', '-points', 'id'], name='period_ranking_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} {1} {2}: {3}'.format(self.user_id, self.period, self.start, self.points)
+
+class LeaderboardSnapshot (models.Model):
+    # the final top of a closed week/month, frozen by snapshot_leaderboards
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    period = models.CharField(max_length=5, choices=PeriodTotal.PERIODS)
+    start = models.DateField()
+    rank = models.PositiveIntegerField()
+    points = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'start', 'rank'], name='snapshot_rank_unique'),
+        ]
+
+    def __str__(self):
+        return '{0} {1} #{2}'.format(self.period, self.start, self.rank)
+
+class Job (models.Model):
+    # a unit of deferred work for the run_jobs worker (hoosfit/jobs.py). Jobs
+    # with a key are enqueued at most once; run_after is when a queued job is
+    # due, or when a running one's lease runs out and it may be picked up again
+    STATUSES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    key = models.CharField(max_length=100, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=7, choices=STATUSES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)  # what the handler returned, once done
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_due_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} #{1} ({2})'.format(self.kind, self.id, self.status)
+
+def yesterday():
+    return timezone.localdate() - datetime.timedelta(days=1)
+
 class Profile (models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, default=0)
     streak_number = models.PositiveIntegerField(default=0)
-    previous_workout = models.DateField(default=datetime.date.today() - datetime.timedelta(days=1)) # yesterdayyyy all our troubles seemed so faar awayyy
+    previous_workout = models.DateField(default=yesterday) # yesterdayyyy all our troubles seemed so faar awayyy
     points = models.PositiveIntegerField(default=0) 
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-points', 'id'], name='profile_points_idx'),  # leaderboard order
+        ]
     
     def __str__(self):
         return self.user.username
 
+    @property
+    def current_streak(self):
+        # streak_number is only written when a workout is logged, so a streak
+        # that has lapsed since then reads as 0 instead of being reset
+        return self.streak_number if self.previous_workout >= yesterday() else 0
+
 @receiver(post_save, sender=User)
 def update_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
         instance.profile.save()
 
+@receiver(post_save, sender=CatalogExercise)
+@receiver(post_save, sender=Exercise)
+@receiver(post_save, sender=Workout)
+@receiver(post_save, sender=Award)
+@receiver(post_delete, sender=CatalogExercise)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_delete, sender=Workout)
+@receiver(post_delete, sender=Award)
+def invalidate_user_cache(sender, instance, **kwargs):
+    invalidate(instance.user_id)
+
+@receiver(m2m_changed, sender=Workout.exercises.through)
+def invalidate_workout_cache(sender, instance, action, **kwargs):
+    # instance is the workout or, when changed from the other side, the catalog exercise
+    if action.startswith('post_'):
+        invalidate(instance.user_id)
 
+def delete_quietly(model, field, values):
+    """
+    Deletes model's rows whose field is one of values with a plain DELETE
+    ... WHERE field IN (...), DELETE_BATCH values at a time, without loading
+    them or sending their post_delete signals, for bulk deletes that
+    invalidate the caches themselves. Returns the number of rows deleted.
+    """
+    # QuerySet.delete() loads and signals every row once a receiver above is
+    # connected. A plain DELETE skips cascades too, so only use this on
+    # tables no foreign key points to
+    values = list(values)
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(values), DELETE_BATCH):
+            batch = values[start:start + DELETE_BATCH]
+            cursor.execute('DELETE FROM {0} WHERE {1} IN ({2})'.format(
+                quote(model._meta.db_table), quote(model._meta.get_field(field).column),
+                ', '.join(['%s'] * len(batch))), batch)
+            deleted += cursor.rowcount
+    return deleted
@@ -0,0 +1,77 @@
+import datetime
+from django.utils import timezone
+from .models import Profile, PeriodTotal, LeaderboardSnapshot
+
+
+# leaderboard order is (-points, id), so ties go to whoever signed up first.
+# Each lookup below is split into a strict-points part and a tie part so that
+# every query is a single range walk on profile_points_idx (OR-ing the two
+# makes the planner merge and sort the whole range).
+
+def rank_of(profile):
+    return (Profile.objects.filter(points__gt=profile.points).count()
+            + Profile.objects.filter(points=profile.points, id__lt=profile.id).count() + 1)
+
+
+def neighbours(profile, n):
+    """
+    Returns the n profiles directly above and below this one, closest last/first
+    """
+    if n <= 0:
+        return [], []
+    profiles = Profile.objects.select_related('user')
+    above = list(profiles.filter(points=profile.points, id__lt=profile.id).order_by('-id')[:n])
+    if len(above) < n:
+        above += profiles.filter(points__gt=profile.points).order_by('points', '-id')[:n - len(above)]
+    return above[::-1], page_after(profile.points, profile.id, n)
+
+
+def rows_after(points, id_, n, rows=None):
+    """
+    The two querysets, each of up to n rows, that the profiles (or rows of
+    another standings) after (points, id_) are read from: those tied on
+    points with a higher id, then those with fewer points, both in
+    leaderboard order
+    """
+    rows = Profile.objects.select_related('user') if rows is None else rows
+    return (rows.filter(points=points, id__gt=id_).order_by('id')[:n],
+            rows.filter(points__lt=points).order_by('-points', 'id')[:n])
+
+
+def page_after(points, id_, n, rows=None):
+    """
+    Returns the n profiles (or rows of another standings) that come after
+    (points, id_) in leaderboard order
+    """
+    ties, below = rows_after(points, id_, n, rows)
+    page = list(ties)
+    if len(page) < n:
+        page += below[:n - len(page)]
+    return page
+
+
+WINDOWS = ['all', 'week', 'month']
+
+
+def period_start(period, day):
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def standings(window, start=None):
+    """
+    The rows a leaderboard window ranks, each with user, points and id:
+    profiles for all time, PeriodTotal rows for the current week/month and
+    the frozen LeaderboardSnapshot (which has its own rank) for closed ones,
+    or their PeriodTotal rows until the snapshot is taken
+    """
+    if window == 'all':
+        return Profile.objects.select_related('user')
+    current = period_start(window, timezone.localdate())
+    start = period_start(window, start) if start else current
+    if start < current:
+        snapshot = LeaderboardSnapshot.objects.select_related('user').filter(period=window, start=start)
+        if snapshot.exists():
+            return snapshot
+    return PeriodTotal.objects.select_related('user').filter(period=window, start=start)
@@ -0,0 +1,118 @@
+import contextlib
+import contextvars
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Read replica routing. Only GET/HEAD requests read from a replica, and only
+# until something in the request writes; everything else (POSTs, management
+# commands, the test client outside a request) stays on the primary, so code
+# that reads back what it just wrote never sees replication lag. A client that
+# wrote is also kept on the primary for HOOSFIT_REPLICA_LAG seconds after, via
+# a cookie, so the page it's redirected to shows its own writes.
+
+PIN_COOKIE = 'hoosfit_primary'
+
+
+class ReadState:
+    def __init__(self, replica):
+        self.replica = replica  # allowed to read from a replica at all
+        self.wrote = False
+        self.primary_blocks = 0
+
+
+state = contextvars.ContextVar('hoosfit_read_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'HOOSFIT_READ_REPLICAS', [])
+
+
+@contextlib.contextmanager
+def primary():
+    """
+    Reads from the primary inside the block
+    """
+    current = state.get()
+    if current is None:
+        yield
+        return
+    current.primary_blocks += 1
+    try:
+        yield
+    finally:
+        current.primary_blocks -= 1
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        current = state.get()
+        aliases = replicas()
+        if not aliases or current is None or not current.replica or current.wrote or current.primary_blocks:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        # the rest of the request reads its own writes
+        current = state.get()
+        if current is not None:
+            current.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+
+def pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaMiddleware:
+    """
+    Lets GET/HEAD requests read from the replicas unless the client wrote
+    recently, and marks a client that writes so it reads from the primary for
+    the next HOOSFIT_REPLICA_LAG seconds. Runs sync or async, whichever the
+    handler below it is, so it never forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lag = getattr(settings, 'HOOSFIT_REPLICA_LAG', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)  # so the handler awaits it, like MiddlewareMixin
+
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        current = ReadState(request.method in ('GET', 'HEAD') and not pinned(request))
+        token = state.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            state.reset(token)
+        return self.pin(current, response)
+
+    async def __acall__(self, request):
+        # sync_to_async runs the ORM in a copy of this context, so the
+        # router sees (and marks) the same ReadState
+        current = ReadState(request.method in ('GET', 'HEAD') and not pinned(request))
+        token = state.set(current)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state.reset(token)
+        return self.pin(current, response)
+
+    def pin(self, current, response):
+        if current.wrote and replicas():
+            response.set_cookie(PIN_COOKIE, '{0:.0f}'.format(time.time() + self.lag), max_age=self.lag, samesite='Lax')
+        return response
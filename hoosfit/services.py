@@ -0,0 +1,406 @@
+import datetime
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import F, Case, When, Value, Sum, IntegerField, PositiveIntegerField
+from django.db.models.functions import TruncWeek, TruncMonth
+from .models import CatalogExercise, Exercise, ExerciseArchive, Award, Profile, DailyTotal, PointsEvent, PeriodTotal, LeaderboardSnapshot, Job, delete_quietly, normalize_name
+from .archive import logged_daily_totals
+from .awards import evaluate_awards, evaluate_sessions
+from .cache import invalidate
+from .jobs import enqueue, job
+from .ranking import period_start
+
+
+def parse_reps(data):
+    """
+    Pulls {exercise name: reps} out of a submitted workout form, skipping
+    anything that isn't a rep count (csrf token, etc.)
+    """
+    reps = {}
+    for name, value in data.items():
+        try:
+            count = int(value)
+        except (TypeError, ValueError):
+            continue
+        if count >= 0:
+            reps[name] = count
+    return reps
+
+
+def canonical_names(user, names):
+    """
+    Maps each name to how the user's catalog spells the exercise it
+    normalizes to, with one lookup on catalog_user_name_unique. Names not in
+    the catalog keep their spelling, whitespace collapsed.
+    """
+    return canonical_names_by_user({user.id: names})[user.id]
+
+
+def canonical_names_by_user(names):
+    """
+    canonical_names for {user id: names} of many users, with a single lookup
+    """
+    normalized = {user_id: {name: normalize_name(name) for name in user_names} for user_id, user_names in names.items()}
+    keys = {key for user_names in normalized.values() for key in user_names.values()}
+    known = {(user_id, key): name for user_id, key, name in (
+        CatalogExercise.objects.filter(user_id__in=list(normalized), normalized_name__in=keys)
+        .values_list('user_id', 'normalized_name', 'exercise_name'))} if keys else {}
+    return {user_id: {name: known.get((user_id, key), ' '.join(name.split())) for name, key in user_names.items()}
+            for user_id, user_names in normalized.items()}
+
+
+MAX_SESSIONS = 50
+
+
+def parse_sessions(data, today=None):
+    """
+    Validates a JSON session upload, {"sessions": [{"date": "YYYY-MM-DD",
+    "reps": {exercise name: reps}}, ...]}, into [(date, reps)] oldest first.
+    date is optional and defaults to today. Raises ValueError on bad input.
+    """
+    today = today or timezone.localdate()
+    sessions = data.get('sessions') if isinstance(data, dict) else None
+    if not isinstance(sessions, list) or not 0 < len(sessions) <= MAX_SESSIONS:
+        raise ValueError('sessions must be a list of 1 to {0} sessions'.format(MAX_SESSIONS))
+    parsed = []
+    for n, session in enumerate(sessions):
+        if not isinstance(session, dict) or not isinstance(session.get('reps'), dict) or not session['reps']:
+            raise ValueError('session {0}: reps must be a non-empty object'.format(n))
+        try:
+            day = datetime.date.fromisoformat(session['date']) if session.get('date') else today
+        except (TypeError, ValueError):
+            raise ValueError('session {0}: date must be YYYY-MM-DD'.format(n))
+        if day > today:
+            raise ValueError('session {0}: date is in the future'.format(n))
+        reps = {}
+        for name, count in session['reps'].items():
+            if not 0 < len(name) <= 50 or type(count) is not int or count < 0:
+                raise ValueError('session {0}: {1!r} needs a whole, non-negative rep count'.format(n, name))
+            reps[name] = count
+        parsed.append((day, reps))
+    return sorted(parsed, key=lambda session: session[0])
+
+
+def record_workout(user, reps, day=None):
+    """
+    Records one workout submission, on day (default today). Returns
+    {exercise name: (reps, day)} for the personal bests it set.
+    """
+    return record_sessions(user, [(day or timezone.localdate(), reps)])
+
+
+@transaction.atomic
+def record_sessions(user, sessions):
+    """
+    Records any number of (day, reps) sessions as a single unit of work with
+    a fixed number of statements however many sessions there are: the
+    catalog lookup, the ledger insert, the streak update, the log insert, a
+    read of the personal bests on record and queueing apply_sessions for the
+    rest. Sessions logged after the fact leave a later streak alone.
+    Returns {exercise name: (reps, day)} for the personal bests these
+    sessions beat.
+    """
+    sessions = sorted((session for session in sessions if session[1]), key=lambda session: session[0])
+    if not sessions:
+        return {}
+    # names come straight from form fields and JSON keys; log them the way
+    # the catalog spells them so "push up" and "Push Up" are one exercise
+    names = canonical_names(user, {name for _, reps in sessions for name in reps})
+    merged = []
+    for day, reps in sessions:
+        canonical = {}
+        for name, count in reps.items():
+            canonical[names[name]] = canonical.get(names[name], 0) + count
+        merged.append((day, canonical))
+    sessions = merged
+    last = sessions[-1][0]
+    run = current_streak(sorted({day for day, _ in sessions}, reverse=True))
+    before_run = last - datetime.timedelta(days=run)
+
+    # points go into the ledger rather than onto the profile row, so
+    # concurrent submissions never wait on each other for it
+    PointsEvent.objects.bulk_create([
+        PointsEvent(user=user, points=sum(reps.values()), date=day) for day, reps in sessions
+    ])
+
+    # the profile row is only written (and locked) on the first log of a day.
+    # A streak that ended on a day of the uploaded run is extended past it.
+    Profile.objects.filter(user=user, previous_workout__lt=last).update(
+        streak_number=Case(
+            *[When(previous_workout=before_run + datetime.timedelta(days=k), then=F('streak_number') + run - k)
+              for k in range(run)],
+            When(previous_workout__lt=before_run, then=Value(run)),
+            default=F('streak_number'),
+        ),
+        previous_workout=last,
+    )
+
+    Exercise.objects.bulk_create([
+        Exercise(user=user, exercise_name=name, reps=count, date=day)
+        for day, reps in sessions for name, count in reps.items()
+    ])
+
+    totals, bests = {}, {}
+    for day, reps in sessions:
+        for name, count in reps.items():
+            totals[day, name] = totals.get((day, name), 0) + count
+            if name not in bests or count > bests[name][0]:
+                bests[name] = (count, day)
+
+    # the daily rollup and the personal best upsert are left to the job
+    # queue; which bests these sessions beat is told from the ones on record
+    previous = dict(Award.objects.filter(user=user, kind='best', exercise_name__in=bests).values_list('exercise_name', 'best_reps'))
+    enqueue('apply_sessions', user_id=user.id,
+            totals=[[day.isoformat(), name, count] for (day, name), count in totals.items()])
+    invalidate(user.id)  # none of the above sends signals
+    return {name: best for name, best in bests.items() if name not in previous or best[0] > previous[name]}
+
+
+@job('apply_sessions')
+def apply_sessions(user_id, totals):
+    """
+    The deferred half of record_sessions: adds the sessions into the daily
+    rollup and evaluates the awards they can have earned. totals is [[day,
+    exercise name, reps]], days as YYYY-MM-DD.
+    """
+    totals = {(datetime.date.fromisoformat(day), name): count for day, name, count in totals}
+    add_daily_totals(user_id, totals)
+    evaluate_sessions(user_id, totals)
+
+
+def add_daily_totals(user_id, totals):
+    """
+    Adds {(day, exercise name): reps} into the user's DailyTotal rows: one
+    insert to make sure the rows exist, then a single atomic increment
+    across all of them
+    """
+    DailyTotal.objects.bulk_create(
+        [DailyTotal(user_id=user_id, date=day, exercise_name=name) for day, name in totals],
+        ignore_conflicts=True,
+    )
+    DailyTotal.objects.filter(user_id=user_id, date__in={day for day, _ in totals},
+                              exercise_name__in={name for _, name in totals}).update(
+        reps=F('reps') + Case(
+            *[When(date=day, exercise_name=name, then=Value(count)) for (day, name), count in totals.items()],
+            default=Value(0),
+        ),
+    )
+
+
+@transaction.atomic
+def rebuild_daily_totals(user_ids):
+    """
+    Recomputes the DailyTotal rows of the given users from their logged
+    exercises, archived ones included
+    """
+    DailyTotal.objects.filter(user_id__in=user_ids).delete()
+    rows = [DailyTotal(user_id=user_id, date=date, exercise_name=name, reps=reps)
+            for (user_id, date, name), reps in logged_daily_totals(user_ids).items()]
+    DailyTotal.objects.bulk_create(rows, batch_size=1000)
+    for user_id in user_ids:
+        invalidate(user_id)
+    return len(rows)
+
+
+def current_streak(dates):
+    """
+    Length of the run of consecutive days ending at the first of dates (newest first)
+    """
+    streak, expected = 0, None
+    for date in dates:
+        if expected is not None and date != expected:
+            break
+        streak += 1
+        expected = date - datetime.timedelta(days=1)
+    return streak
+
+
+@transaction.atomic
+def recompute_user_stats(user_ids):
+    """
+    Recomputes points, streak and awards of the given users from their
+    whole exercise log (archive included) and daily totals, e.g. after a
+    bulk import. Logging and compacting carry on meanwhile: the log and the
+    ledger are read in one snapshot, exactly the events in it are deleted
+    (their reps are in the log read) and the points of those a compaction
+    folded in since are taken back off, so whatever lands after the
+    snapshot is left pending or folded, and counted once.
+    """
+    snapshot, points, events = points_snapshot(user_ids)
+    # locked in id order, the order compact_points locks them in
+    kept = set(PointsEvent.objects.select_for_update().filter(id__in=list(events)).order_by('id')
+               .values_list('id', flat=True))
+    PointsEvent.objects.filter(id__in=list(kept)).delete()
+    folded = {}
+    for id_, (user_id, event_points) in events.items():
+        if id_ not in kept:
+            folded[user_id] = folded.get(user_id, 0) + event_points
+    dates = {}
+    for user_id, date in (DailyTotal.objects.filter(user_id__in=user_ids)
+                          .values_list('user_id', 'date').distinct().order_by('user_id', '-date').iterator()):
+        dates.setdefault(user_id, []).append(date)
+    profiles = list(Profile.objects.select_for_update().filter(user_id__in=user_ids))
+    for profile in profiles:
+        history = dates.get(profile.user_id, [])
+        # profile.points, read under the lock, has what was folded since the
+        # snapshot on top of snapshot[user id]
+        profile.points += ((points.get(profile.user_id) or 0) - snapshot.get(profile.user_id, 0)
+                           - folded.get(profile.user_id, 0))
+        profile.streak_number = current_streak(history)
+        if history:
+            profile.previous_workout = history[0]
+    Profile.objects.bulk_update(profiles, ['points', 'streak_number', 'previous_workout'])
+    rebuild_period_totals(user_ids)
+
+    evaluate_awards(user_ids, exact=True)
+    for user_id in user_ids:
+        invalidate(user_id)
+
+
+@transaction.atomic
+def delete_history(user_ids):
+    """
+    Deletes everything the given users have logged, archived or earned, one
+    DELETE per table, along with their queued rollup jobs, and zeroes their
+    points and streaks. Their catalog and workouts stay. Returns the number
+    of rows deleted.
+    """
+    deleted = 0
+    for model in (ExerciseArchive, DailyTotal, PointsEvent, PeriodTotal):
+        deleted += model.objects.filter(user_id__in=user_ids).delete()[0]
+    for model in (Exercise, Award):
+        # their post_delete signals would only invalidate the same caches
+        # over and over
+        deleted += delete_quietly(model, 'user', user_ids)
+    Job.objects.filter(kind='apply_sessions', status__in=['queued', 'running'], payload__user_id__in=user_ids).delete()
+    Profile.objects.filter(user_id__in=user_ids).update(points=0, streak_number=0)
+    for user_id in user_ids:
+        invalidate(user_id)
+    invalidate('leaderboard')
+    return deleted
+
+
+def pending_points(user_ids):
+    """
+    {user id: points} in the ledger not yet folded into Profile.points
+    """
+    return dict(PointsEvent.objects.filter(user_id__in=user_ids).values('user_id')
+                .annotate(total=Sum('points')).values_list('user_id', 'total').order_by())
+
+
+def points_snapshot(user_ids):
+    """
+    ({user id: Profile.points}, {user id: reps ever logged}, {points event
+    id: (user id, points)}) read in one statement, so under READ COMMITTED
+    all three come from the same snapshot: a log (its sets and its event)
+    or a compaction (the events it folds and the points it adds) is in all
+    of them or in none
+    """
+    def rows(queryset, kind, key, value):
+        return (queryset.filter(user_id__in=user_ids).values('user_id')
+                .annotate(kind=Value(kind, output_field=IntegerField()), key=key, value=value)
+                .values_list('user_id', 'kind', 'key', 'value').order_by())
+
+    zero = Value(0, output_field=IntegerField())
+    points, logged, events = {}, {}, {}
+    for user_id, kind, key, value in rows(Profile.objects, 0, zero, F('points')).union(
+            rows(Exercise.objects, 1, zero, Sum('reps')),
+            rows(ExerciseArchive.objects, 1, zero, Sum('total')),
+            rows(PointsEvent.objects, 2, F('id'), F('points')), all=True):
+        if kind == 0:
+            points[user_id] = value
+        elif kind == 1:
+            logged[user_id] = logged.get(user_id, 0) + value
+        else:
+            events[key] = (user_id, value)
+    return points, logged, events
+
+
+def compact_points(chunk_size=10000):
+    """
+    Folds the points ledger into Profile.points and the weekly/monthly
+    PeriodTotals, a chunk of events per transaction. Events are locked while
+    they're folded and exactly those are deleted, so an event is never
+    counted twice or lost, whatever is logged meanwhile. Returns the number
+    of events folded.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            events = list(PointsEvent.objects.select_for_update().order_by('id')
+                          .values_list('id', 'user_id', 'points', 'date')[:chunk_size])
+            if not events:
+                return folded
+            totals, periods = {}, {}
+            for _, user_id, points, day in events:
+                totals[user_id] = totals.get(user_id, 0) + points
+                for period in ('week', 'month'):
+                    key = (user_id, period, period_start(period, day))
+                    periods[key] = periods.get(key, 0) + points
+            Profile.objects.filter(user_id__in=totals).update(points=F('points') + Case(
+                *[When(user_id=user_id, then=Value(total)) for user_id, total in totals.items()],
+                default=Value(0), output_field=PositiveIntegerField(),
+            ))
+            add_period_totals(periods)
+            PointsEvent.objects.filter(id__in=[id_ for id_, _, _, _ in events]).delete()
+            invalidate('leaderboard')
+        folded += len(events)
+
+
+def add_period_totals(periods):
+    """
+    Adds {(user id, period, start): points} into PeriodTotal, the same
+    insert-then-increment way as add_daily_totals
+    """
+    PeriodTotal.objects.bulk_create([
+        PeriodTotal(user_id=user_id, period=period, start=start) for user_id, period, start in periods
+    ], ignore_conflicts=True)
+    PeriodTotal.objects.filter(user_id__in={key[0] for key in periods}, start__in={key[2] for key in periods}).update(
+        points=F('points') + Case(
+            *[When(user_id=user_id, period=period, start=start, then=Value(points))
+              for (user_id, period, start), points in periods.items()],
+            default=Value(0), output_field=PositiveIntegerField(),
+        ),
+    )
+
+
+def rebuild_period_totals(user_ids):
+    """
+    Recomputes the PeriodTotal rows of the given users from their daily totals
+    """
+    PeriodTotal.objects.filter(user_id__in=user_ids).delete()
+    rows = []
+    for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+        totals = (DailyTotal.objects.filter(user_id__in=user_ids).annotate(start=trunc('date'))
+                  .values('user_id', 'start').annotate(total=Sum('reps')).order_by())
+        rows += [PeriodTotal(user_id=row['user_id'], period=period, start=row['start'], points=row['total'])
+                 for row in totals]
+    PeriodTotal.objects.bulk_create(rows, batch_size=1000)
+    invalidate('leaderboard')
+
+
+@transaction.atomic
+def snapshot_leaderboards(size=100, prune=False):
+    """
+    Freezes the top size of every closed week and month that has no snapshot
+    yet. With prune, the PeriodTotal rows of snapshotted periods are deleted,
+    so the table only ever holds the open periods. Returns the number of
+    periods snapshotted.
+    """
+    today, snapshotted = timezone.localdate(), 0
+    for period in ('week', 'month'):
+        current = period_start(period, today)
+        done = set(LeaderboardSnapshot.objects.filter(period=period).values_list('start', flat=True).distinct())
+        closed = set(PeriodTotal.objects.filter(period=period, start__lt=current)
+                     .values_list('start', flat=True).distinct().order_by())
+        for start in sorted(closed - done):
+            top = PeriodTotal.objects.filter(period=period, start=start).order_by('-points', 'id')[:size]
+            LeaderboardSnapshot.objects.bulk_create([
+                LeaderboardSnapshot(user_id=row.user_id, period=period, start=start, rank=rank, points=row.points)
+                for rank, row in enumerate(top, start=1)
+            ])
+            snapshotted += 1
+        if prune:
+            PeriodTotal.objects.filter(period=period, start__in=done | closed).delete()
+    invalidate('leaderboard')
+    return snapshotted
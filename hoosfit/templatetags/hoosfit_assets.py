@@ -0,0 +1,21 @@
+from django import template
+from django.utils.html import format_html
+from hoosfit.assets import VENDOR, vendor_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def vendor(name):
+    """
+    A <link> or <script> tag for a vendored third-party library, with its pinned integrity hash:
+
+        {% vendor 'jquery-3.5.1.slim.min.js' %}
+    """
+    if name not in VENDOR:
+        raise template.TemplateSyntaxError('unknown vendored asset {0!r}, see hoosfit/assets.py'.format(name))
+    url, sri = vendor_url(name)
+    if name.endswith('.css'):
+        return format_html('<link rel="stylesheet" href="{0}" integrity="{1}">', url, sri)
+    return format_html('<script src="{0}" integrity="{1}"></script>', url, sri)
@@ -0,0 +1,32 @@
+from django import template
+from hoosfit.cache import cached
+
+
+register = template.Library()
+
+
+class UserCacheNode(template.Node):
+    def __init__(self, nodelist, name):
+        self.nodelist = nodelist
+        self.name = name
+
+    def render(self, context):
+        user = context.get('user')
+        if user is None or not user.is_authenticated:
+            return self.nodelist.render(context)
+        return cached(user.id, 'fragment:' + self.name.resolve(context), lambda: self.nodelist.render(context))
+
+
+@register.tag('usercache')
+def do_usercache(parser, token):
+    """
+    Caches the enclosed fragment per user until their data changes:
+
+        {% usercache "awards" %} ... {% endusercache %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError("'usercache' takes a single fragment name")
+    nodelist = parser.parse(('endusercache',))
+    parser.delete_first_token()
+    return UserCacheNode(nodelist, parser.compile_filter(bits[1]))
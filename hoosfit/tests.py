@@ -1,11 +1,64 @@
-from django.test import TestCase, Client
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.template import Context, Template, TemplateSyntaxError
+from django.contrib.staticfiles import finders
+from unittest.mock import patch
+from django.core.cache import cache
+from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import HttpResponse
+from django.contrib.auth.models import User, AnonymousUser
+from django.contrib.sessions.models import Session
 from django.urls import reverse
-from .models import Exercise, Award, Workout
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction, IntegrityError
+from io import StringIO
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .models import CatalogExercise, Exercise, ExerciseArchive, Award, Workout, Profile, DailyTotal, PointsEvent, PeriodTotal, LeaderboardSnapshot, Job, delete_quietly
+from .views import LeaderboardView
+from . import assets, async_views, imports, jobs
+from .admin import EstimatedCountPaginator
+from .archive import archive_cutoff, archive_exercises
+from .cache import invalidate
+from .awards import evaluate_awards
+from .services import rebuild_daily_totals, record_workout, compact_points, recompute_user_stats, points_snapshot
+from .exports import export_rows
+from .middleware import PerformanceMiddleware
+from .routers import PIN_COOKIE, ReplicaMiddleware, ReplicaRouter
+from .ranking import standings
+from django.urls import URLPattern
+from exerciseapp import urls
+import asyncio
 import datetime
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
 
 
-class ExerciseTest(TestCase):
+def use_temporary_media(test):
+    # uploads the test saves go to a directory removed after it
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media)
+    media_root = override_settings(MEDIA_ROOT=media)
+    media_root.enable()
+    test.addCleanup(media_root.disable)
+
+
+class CacheClearingTestCase(TestCase):
+    # the per-user cache isn't rolled back with each test's data, and user ids get reused
+    def _pre_setup(self):
+        super()._pre_setup()
+        cache.clear()
+
+
+class ExerciseTest(CacheClearingTestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(username='testuser1', password='password')
         self.user2 = User.objects.create_user(username='testuser2', password='password')
@@ -36,7 +89,7 @@ class ExerciseTest(TestCase):
         client = Client()
         client.login(username='testuser2', password='password')
         response = client.post('/profiles/{0}/exercise/submit/'.format(self.user2.username), {'user': [self.user2], 'exercise_name': ['Push Up']}, follow=True)
-        qs = Exercise.objects.filter(user__exact = self.user2, date=datetime.date(2000,1,1))
+        qs = CatalogExercise.objects.filter(user__exact = self.user2)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(qs.count(), 1)
 
@@ -46,8 +99,8 @@ class ExerciseTest(TestCase):
         """
         client = Client()
         client.login(username='testuser3', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user3)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user3)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user3)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user3)
         response = client.get(reverse('exerciseview', kwargs={'user_id' : self.user3.username}))
         self.assertEqual(response.status_code, 200)
         self.assertQuerysetEqual(response.context['exercise_list'], [repr(exercise1), repr(exercise2)], ordered=False)
@@ -67,9 +120,62 @@ class ExerciseTest(TestCase):
         get_response = client.get(reverse('exerciseview', kwargs={'user_id' : self.user4.username}))
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(get_response.context['exercise_list'].count(), 2)
+
+    def test_logs_stay_out_of_catalog(self):
+        """
+        Tests if logged reps don't show up as catalog exercises
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        CatalogExercise.objects.create(exercise_name='Push Up', user=self.user1)
+        Exercise.objects.create(exercise_name='Push Up', user=self.user1, reps=10)
+        Exercise.objects.create(exercise_name='Lunge', user=self.user1, reps=10, date=datetime.date(2000,1,1))
+        response = client.get(reverse('exerciseview', kwargs={'user_id' : self.user1.username}))
+        self.assertEqual([e.exercise_name for e in response.context['exercise_list']], ['Push Up'])
     
 
-class WorkoutTest(TestCase):
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class ExerciseNameTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+
+    def test_duplicates_ignore_case_and_spacing(self):
+        """
+        Tests if names differing only in case or spacing are one catalog exercise
+        """
+        CatalogExercise.objects.create(exercise_name='Push Up', user=self.user1)
+        self.client.post(reverse('exercisesubmit', args=[self.user1.username]), {'exercise_name': ' push  UP'})
+        self.assertEqual(list(CatalogExercise.objects.values_list('exercise_name', 'normalized_name')), [('Push Up', 'push up')])
+        CatalogExercise.objects.create(exercise_name='PUSH UP', user=self.user2)  # per user
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CatalogExercise.objects.create(exercise_name='push up ', user=self.user1)
+
+    def test_autocomplete(self):
+        """
+        Tests if the search endpoint returns the user's exercises starting with the query, in name order
+        """
+        for name in ['Squat', 'Push Up', 'Pull Up', 'Plank']:
+            CatalogExercise.objects.create(exercise_name=name, user=self.user1)
+        CatalogExercise.objects.create(exercise_name='Pushdown', user=self.user2)
+        response = self.client.get(reverse('exercisesearch', args=[self.user1.username]), {'q': ' PU'})
+        self.assertEqual([e['exercise_name'] for e in response.json()['results']], ['Pull Up', 'Push Up'])
+        response = self.client.get(reverse('exercisesearch', args=[self.user1.username]))
+        self.assertEqual(len(response.json()['results']), 4)
+
+    def test_logs_use_catalog_spelling(self):
+        """
+        Tests if reps logged under another spelling of a catalog exercise are logged as that exercise
+        """
+        CatalogExercise.objects.create(exercise_name='Push Up', user=self.user1)
+        record_workout(self.user1, {'push up': 5, 'PUSH  UP': 5, 'Lunge  Walk': 3})
+        self.assertEqual(sorted(Exercise.objects.values_list('exercise_name', 'reps')), [('Lunge Walk', 3), ('Push Up', 10)])
+        self.assertEqual(Award.objects.get(kind='best', exercise_name='Push Up').best_reps, 10)
+
+
+class WorkoutTest(CacheClearingTestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(username='testuser1', password='password')
         self.user2 = User.objects.create_user(username='testuser2', password='password')
@@ -88,8 +194,8 @@ class WorkoutTest(TestCase):
         """
         client = Client()
         client.login(username='testuser1', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user1)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user1)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user1)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user1)
         response = client.post('/profiles/{0}/workout/submit/'.format(self.user1.username), {'workout_name': ['Test Workout'], 'exercises': [exercise1.id, exercise2.id]}, follow=True)
         workout = Workout.objects.get(user__exact = self.user1, date=datetime.date.today(), workout_name='Test Workout')
         exercise_qs = Exercise.objects.filter(user__exact = self.user1, date=datetime.date.today())
@@ -103,15 +209,15 @@ class WorkoutTest(TestCase):
         """
         client = Client()
         client.login(username='testuser2', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user2)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user2)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user2)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user2)
         response1 = client.post('/profiles/{0}/workout/submit/'.format(self.user2.username), {'workout_name': ['Test Workout'], 'exercises': [exercise1.id, exercise2.id]}, follow=True)
         workout = Workout.objects.get(user__exact = self.user2, date=datetime.date.today(), workout_name='Test Workout')
         response2 = client.post('/profiles/{0}/workout/{1}/submit/'.format(self.user2.username, workout.id), {'Push Up': 10, 'Squat': 10}, follow=True)
         self.assertEqual(response1.status_code, 200)
         self.assertEqual(response2.status_code, 200)
         exercise_qs = Exercise.objects.filter(user__exact=self.user2, date=datetime.date.today())
-        self.assertQuerysetEqual(exercise_qs, [repr(exercise1), repr(exercise2)], ordered=False)
+        self.assertQuerysetEqual(exercise_qs, [exercise1.exercise_name, exercise2.exercise_name], transform=str, ordered=False)
         pushup = Exercise.objects.get(user__exact=self.user2, date=datetime.date.today(), exercise_name='Push Up')
         squat = Exercise.objects.get(user__exact=self.user2, date=datetime.date.today(), exercise_name='Squat')
         self.assertEqual(pushup.reps, 10)
@@ -123,10 +229,10 @@ class WorkoutTest(TestCase):
         """
         client = Client()
         client.login(username='testuser3', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user3)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user3)
         workout1 = Workout.objects.create(user = self.user3, date=datetime.date.today(), workout_name='Test Workout 1')
         workout1.exercises.add(exercise1)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user2)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user2)
         workout2 = Workout.objects.create(user = self.user3, date=datetime.date.today(), workout_name='Test Workout 2')
         workout2.exercises.add(exercise1)
         workout2.exercises.add(exercise2)
@@ -151,7 +257,8 @@ class WorkoutTest(TestCase):
         self.assertQuerysetEqual(response.context['workout_list'], [])
 
 
-class AwardTest(TestCase):
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class AwardTest(CacheClearingTestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(username='testuser1', password='password')
         self.user2 = User.objects.create_user(username='testuser2', password='password')
@@ -168,8 +275,8 @@ class AwardTest(TestCase):
         """
         client = Client()
         client.login(username='testuser1', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user1)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user1)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user1)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user1)
         workout1 = Workout.objects.create(user = self.user1, date=datetime.date.today(), workout_name='Test Workout 1')
         workout1.exercises.add(exercise1)
         workout2 = Workout.objects.create(user = self.user1, date=datetime.date.today(), workout_name='Test Workout 2')
@@ -196,8 +303,8 @@ class AwardTest(TestCase):
         """
         client = Client()
         client.login(username='testuser2', password='password')
-        exercise1 = Exercise.objects.create(exercise_name='Push Up', user=self.user2)
-        exercise2 = Exercise.objects.create(exercise_name='Squat', user=self.user2)
+        exercise1 = CatalogExercise.objects.create(exercise_name='Push Up', user=self.user2)
+        exercise2 = CatalogExercise.objects.create(exercise_name='Squat', user=self.user2)
         workout1 = Workout.objects.create(user = self.user2, date=datetime.date.today(), workout_name='Test Workout 1')
         workout1.exercises.add(exercise1)
         workout2 = Workout.objects.create(user = self.user2, date=datetime.date.today(), workout_name='Test Workout 2')
@@ -211,6 +318,19 @@ class AwardTest(TestCase):
         self.assertEqual(get_response.status_code, 200)
         self.assertEqual(get_response.context['awards'].count(), 2)
 
+    def test_one_award_per_exercise(self):
+        """
+        Tests if repeated personal bests update a single award row
+        """
+        client = Client()
+        client.login(username='testuser3', password='password')
+        workout = Workout.objects.create(user = self.user3, date=datetime.date.today(), workout_name='Test Workout 1')
+        for reps in [5, 12, 8]:
+            client.post('/profiles/{0}/workout/{1}/submit/'.format(self.user3.username, workout.id), {'Push Up': reps})
+        self.assertEqual(Award.objects.get(user=self.user3, exercise_name='Push Up').best_reps, 12)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Award.objects.create(user=self.user3, exercise_name='Push Up', award_name='Personal Best: Push Up')
+
     def test_no_awards(self):
         """
         Tests if an error message is shown when a user has no awards
@@ -220,4 +340,1596 @@ class AwardTest(TestCase):
         response = client.get(reverse('awardview', kwargs={'user_id' : self.user3.username}))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "No awards earned yet :(")
-        self.assertQuerysetEqual(response.context['awards'], [])
\ No newline at end of file
+        self.assertQuerysetEqual(response.context['awards'], [])
+
+class LogWorkoutTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.workout = Workout.objects.create(user=self.user1, workout_name='Test Workout')
+
+    def tearDown(self):
+        self.user1.delete()
+
+    def log(self, client, data):
+        return client.post('/profiles/{0}/workout/{1}/submit/'.format(self.user1.username, self.workout.id), data)
+
+    @override_settings(HOOSFIT_JOBS_EAGER=True)
+    def test_points_and_streak(self):
+        """
+        Tests if a submission adds all of its reps to points and bumps the streak once
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        response = self.log(client, {'Push Up': 10, 'Squat': 15, 'Lunge': 5})
+        self.assertEqual(response.status_code, 302)
+        compact_points()
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual(profile.points, 30)
+        self.assertEqual(profile.streak_number, 1)
+        self.assertEqual(profile.previous_workout, datetime.date.today())
+        self.log(client, {'Push Up': 20})
+        compact_points()
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual(profile.points, 50)
+        self.assertEqual(profile.streak_number, 1)
+        self.assertEqual(Award.objects.get(user=self.user1, exercise_name='Push Up').best_reps, 20)
+
+    def test_query_count_is_flat(self):
+        """
+        Tests if logging a workout costs the same number of queries no matter how many exercises it has
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        self.log(client, {'Push Up': 1})
+        small = {'Push Up': 2}
+        large = {'Push Up': 3}
+        large.update({'Exercise {0}'.format(i): i for i in range(10)})
+        with CaptureQueriesContext(connection) as small_queries:
+            self.log(client, small)
+        with CaptureQueriesContext(connection) as large_queries:
+            self.log(client, large)
+        self.assertEqual(len(small_queries), len(large_queries))
+        self.assertEqual(Exercise.objects.filter(user=self.user1, date=datetime.date.today()).count(), 13)
+
+
+class LeaderboardTest(CacheClearingTestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username='testuser{0}'.format(i), password='password') for i in range(30)]
+        for i, user in enumerate(self.users):
+            Profile.objects.filter(user=user).update(points=i // 2)  # pairs of ties
+
+    def test_ranks_across_pages(self):
+        """
+        Tests if the leaderboard pages through every profile in order with server side ranks
+        """
+        client = Client()
+        client.login(username='testuser0', password='password')
+        response = client.get(reverse('leaderboard'))
+        self.assertEqual(response.status_code, 200)
+        first_page = response.context['profiles']
+        self.assertEqual(len(first_page), LeaderboardView.page_size)
+        self.assertEqual([p.rank for p in first_page], list(range(1, 26)))
+        self.assertEqual(first_page[0].points, 14)
+        self.assertContains(response, "1: " + first_page[0].user.username)
+        response = client.get(reverse('leaderboard'), {'after': response.context['next_cursor']})
+        second_page = response.context['profiles']
+        self.assertEqual([p.rank for p in second_page], list(range(26, 31)))
+        self.assertNotIn('next_cursor', response.context)
+        seen = [p.id for p in first_page] + [p.id for p in second_page]
+        self.assertEqual(sorted(seen), sorted(Profile.objects.values_list('id', flat=True)))
+
+    def test_page_query_count(self):
+        """
+        Tests if a leaderboard page doesn't run a query per profile
+        """
+        client = Client()
+        client.login(username='testuser0', password='password')
+        with CaptureQueriesContext(connection) as queries:
+            client.get(reverse('leaderboard'))
+        self.assertLessEqual(len(queries), 4)  # session, user, profile page
+
+    def test_my_rank(self):
+        """
+        Tests if the rank lookup agrees with the full leaderboard order and returns the right neighbours
+        """
+        client = Client()
+        client.login(username='testuser9', password='password')
+        ordered = list(Profile.objects.order_by('-points', 'id').values_list('user__username', flat=True))
+        response = client.get(reverse('leaderboardrank'), {'n': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        rank = ordered.index('testuser9') + 1
+        self.assertEqual(data['rank'], rank)
+        self.assertEqual([row['username'] for row in data['above']], ordered[rank - 3:rank - 1])
+        self.assertEqual([row['username'] for row in data['below']], ordered[rank:rank + 2])
+        self.assertEqual([row['rank'] for row in data['above'] + data['below']], [rank - 2, rank - 1, rank + 1, rank + 2])
+
+    def test_my_rank_at_the_top(self):
+        """
+        Tests if the leader gets no profiles above them
+        """
+        client = Client()
+        client.login(username='testuser28', password='password')  # ties with testuser29 but signed up first
+        data = client.get(reverse('leaderboardrank')).json()
+        self.assertEqual(data['rank'], 1)
+        self.assertEqual(data['above'], [])
+        self.assertEqual(len(data['below']), 3)
+
+
+class ActivityTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+        today = datetime.date.today()
+        for days_ago, reps in [(0, 10), (0, 5), (1, 7), (3, 4), (40, 100)]:
+            Exercise.objects.create(user=self.user1, exercise_name='Push Up', reps=reps, date=today - datetime.timedelta(days=days_ago))
+        Exercise.objects.create(user=self.user2, exercise_name='Push Up', reps=50, date=today)
+        rebuild_daily_totals([self.user1.id, self.user2.id])
+
+    def test_daily_totals(self):
+        """
+        Tests if the activity endpoint sums the user's reps per day over the requested range
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        response = client.get(reverse('activity', kwargs={'user_id': self.user1.username}), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        today = datetime.date.today()
+        data = response.json()
+        self.assertEqual(data['labels'], [(today - datetime.timedelta(days=d)).isoformat() for d in (3, 1, 0)])
+        self.assertEqual(data['reps'], [4, 7, 15])
+
+    def test_days_is_the_number_of_buckets(self):
+        """
+        Tests if asking for n days covers today and the n - 1 days before it
+        """
+        today = datetime.date.today()
+        for days_ago in range(10):
+            Exercise.objects.create(user=self.user2, exercise_name='Squat', reps=1, date=today - datetime.timedelta(days=days_ago))
+        rebuild_daily_totals([self.user2.id])
+        client = Client()
+        client.login(username='testuser2', password='password')
+        for days in (1, 7):
+            data = client.get(reverse('activity', kwargs={'user_id': self.user2.username}), {'days': days}).json()
+            self.assertEqual(len(data['labels']), days)
+            self.assertEqual(data['labels'][0], (today - datetime.timedelta(days=days - 1)).isoformat())
+
+    def test_monthly_totals(self):
+        """
+        Tests if coarser granularities fold the days together
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        response = client.get(reverse('activity', kwargs={'user_id': self.user1.username}), {'days': 90, 'granularity': 'month'})
+        self.assertEqual(sum(response.json()['reps']), 126)
+        response = client.get(reverse('activity', kwargs={'user_id': self.user1.username}), {'granularity': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class DailyTotalTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.workout = Workout.objects.create(user=self.user1, workout_name='Test Workout')
+
+    def test_logging_updates_totals(self):
+        """
+        Tests if logging a workout adds its reps into today's rollup rows
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        url = '/profiles/{0}/workout/{1}/submit/'.format(self.user1.username, self.workout.id)
+        client.post(url, {'Push Up': 10, 'Squat': 5})
+        client.post(url, {'Push Up': 3})
+        totals = dict(DailyTotal.objects.filter(user=self.user1, date=datetime.date.today()).values_list('exercise_name', 'reps'))
+        self.assertEqual(totals, {'Push Up': 13, 'Squat': 5})
+
+    def test_rebuild_matches_log(self):
+        """
+        Tests if the rebuild command recomputes the rollup from the exercise log
+        """
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        Exercise.objects.create(user=self.user1, exercise_name='Push Up', reps=4, date=yesterday)
+        Exercise.objects.create(user=self.user1, exercise_name='Push Up', reps=6, date=yesterday)
+        DailyTotal.objects.create(user=self.user1, exercise_name='Push Up', reps=999, date=yesterday)
+        call_command('rebuild_daily_totals', stdout=StringIO())
+        self.assertEqual(list(DailyTotal.objects.filter(user=self.user1).values_list('date', 'reps')), [(yesterday, 10)])
+
+
+class QueryBudgetTest(CacheClearingTestCase):
+    """
+    Every route in exerciseapp/urls.py gets a fixed query budget, and its query
+    count must not change when the user's data grows. Deferred jobs don't
+    count against the request that queued them.
+    """
+    # route name (or path for unnamed routes): (method, form data, max queries)
+    budgets = {
+        '': ('get', None, 2),
+        'profiles/home/': ('get', None, 2),
+        'homepage': ('get', None, 3),
+        'activity': ('get', None, 3),
+        'exercisecreate': ('get', None, 2),
+        'exercisesubmit': ('post', {'exercise_name': 'New Exercise'}, 4),
+        'exercisesearch': ('get', None, 3),
+        'exerciseview': ('get', None, 3),
+        'workoutcreate': ('get', None, 3),
+        'workoutview': ('get', None, 4),
+        'workoutsubmit': ('post', {'workout_name': 'Budget Workout', 'exercises': []}, 6),
+        'workoutstart': ('get', None, 4),
+        'workoutend': ('post', {'Push Up': 10, 'Squat': 10}, 10),
+        'workoutsummary': ('get', None, 3),
+        'awardview': ('get', None, 3),
+        'leaderboard': ('get', None, 3),
+        'leaderboardrank': ('get', None, 9),
+        'export': ('get', None, 4),
+        'import': ('post', None, 3),
+        'importstatus': ('get', None, 3),
+        'logsessions': ('post', None, 12),
+    }
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.catalog = [CatalogExercise.objects.create(user=self.user1, exercise_name=name) for name in ['Push Up', 'Squat', 'Lunge']]
+        self.workout = self.add_workout()
+        self.import_job = Job.objects.create(kind='import_history', payload={'user_id': self.user1.id}, status='done')
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+        use_temporary_media(self)
+
+    def add_workout(self):
+        workout = Workout.objects.create(user=self.user1, workout_name='Test Workout')
+        workout.exercises.add(*self.catalog)
+        return workout
+
+    def grow(self):
+        for i in range(20):
+            self.add_workout()
+            User.objects.create_user(username='other{0}'.format(i), password='password')
+        self.catalog.append(CatalogExercise.objects.create(user=self.user1, exercise_name='Plank'))
+        for days_ago in range(30):
+            record_workout(self.user1, {exercise.exercise_name: days_ago + 1 for exercise in self.catalog})
+        jobs.run_due(limit=100)
+        compact_points()
+
+    def routes(self):
+        for pattern in urls.urlpatterns:
+            if isinstance(pattern, URLPattern):
+                yield pattern.name or str(pattern.pattern), str(pattern.pattern)
+
+    def request(self, route):
+        method, data, budget = self.budgets[route[0]]
+        path = '/' + (route[1].replace('<str:user_id>', self.user1.username).replace('<int:pk>', str(self.workout.id))
+                      .replace('<slug:kind>', 'workouts').replace('<slug:fmt>', 'csv').replace('<int:job_id>', str(self.import_job.id)))
+        if route[0] == 'workoutsubmit':
+            data = dict(data, exercises=[exercise.id for exercise in self.catalog])
+        if route[0] == 'exercisesubmit':
+            data = {'exercise_name': '{0} {1}'.format(data['exercise_name'], len(self.catalog))}  # always a new one
+        if route[0] == 'import':
+            content = 'date,exercise_name,reps\n2020-01-01,Imported {0},5\n'.format(len(self.catalog))  # always a new best
+            data = {'file': SimpleUploadedFile('history.csv', content.encode())}
+        kwargs = {}
+        if route[0] == 'logsessions':
+            data = json.dumps({'sessions': [{'date': str(datetime.date.today() - datetime.timedelta(days=1)),
+                                             'reps': {'Push Up': 5}}, {'reps': {'Push Up': 5, 'Squat': 5}}]})
+            kwargs['content_type'] = 'application/json'
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, data or {}, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, path)
+        return len(queries)
+
+    def test_every_route_has_a_budget(self):
+        """
+        Tests if no route is left out of the budget table
+        """
+        self.assertEqual(set(name for name, _ in self.routes()), set(self.budgets))
+
+    def test_query_budgets(self):
+        """
+        Tests if every route stays within its query budget on a small and a large data set
+        """
+        small = {route[0]: self.request(route) for route in self.routes()}
+        self.grow()
+        large = {route[0]: self.request(route) for route in self.routes()}
+        for name, (_, _, budget) in self.budgets.items():
+            self.assertLessEqual(small[name], budget, name)
+            self.assertEqual(small[name], large[name], name)
+
+
+TIMED_TEMPLATES = [dict(settings.TEMPLATES[0], BACKEND='hoosfit.middleware.TimedDjangoTemplates')]
+
+
+@override_settings(MIDDLEWARE=['hoosfit.middleware.PerformanceMiddleware'] + settings.MIDDLEWARE, TEMPLATES=TIMED_TEMPLATES)
+class PerformanceMiddlewareTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+
+    def test_server_timing(self):
+        """
+        Tests if responses carry a Server-Timing header with the query count and template time
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('awardview', kwargs={'user_id': self.user1.username}))
+        timing = response['Server-Timing']
+        self.assertIn('desc="{0} queries"'.format(len(queries)), timing)
+        self.assertRegex(timing, r'tpl;dur=\d+\.\d, view;dur=\d+\.\d')
+        self.assertNotIn('tpl;dur=0.0,', timing)
+
+    @override_settings(HOOSFIT_SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        """
+        Tests if requests over the threshold log their timings and most repeated SQL
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        with self.assertLogs('hoosfit.performance', 'WARNING') as logs:
+            client.get(reverse('leaderboard'))
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], reverse('leaderboard'))
+        self.assertGreater(entry['queries'], 0)
+        self.assertTrue(entry['top_sql'][0]['sql'])
+
+    def test_async_views(self):
+        """
+        Tests if the middleware stays async around an async view and counts the queries it runs on worker threads
+        """
+        async def view(request):
+            # a worker thread opens its own connection
+            await sync_to_async(lambda: connections['default'].cursor().execute('SELECT 1'), thread_sensitive=False)()
+            await sync_to_async(lambda: list(Award.objects.all()))()
+            return HttpResponse()
+        middleware = PerformanceMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+
+class ExportTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+        self.pushup = CatalogExercise.objects.create(user=self.user1, exercise_name='Push Up')
+        workout = Workout.objects.create(user=self.user1, workout_name='Test Workout')
+        workout.exercises.add(self.pushup)
+        for reps in range(1, 6):
+            Exercise.objects.create(user=self.user1, exercise_name='Push Up', reps=reps)
+        Exercise.objects.create(user=self.user2, exercise_name='Squat', reps=50)
+
+    def export(self, kind, fmt):
+        client = Client()
+        client.login(username='testuser1', password='password')
+        response = client.get(reverse('export', kwargs={'user_id': self.user1.username, 'kind': kind, 'fmt': fmt}))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """
+        Tests if the CSV export streams only the user's own rows
+        """
+        lines = self.export('exercises', 'csv').splitlines()
+        self.assertEqual(lines[0], 'date,exercise_name,reps')
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['1', '2', '3', '4', '5'])
+
+    def test_jsonl_export(self):
+        """
+        Tests if the JSON lines export has one object per workout
+        """
+        rows = [json.loads(line) for line in self.export('workouts', 'jsonl').splitlines()]
+        self.assertEqual(rows, [{'date': datetime.date.today().isoformat(), 'workout_name': 'Test Workout', 'exercises': ['Push Up']}])
+
+    def test_export_chunks(self):
+        """
+        Tests if the chunked walk returns every row exactly once across chunk boundaries
+        """
+        columns, rows = export_rows('exercises', chunk_size=2)
+        self.assertEqual(columns[0], 'username')
+        self.assertEqual(sorted(row['reps'] for row in rows), [1, 2, 3, 4, 5, 50])
+
+    def test_export_command(self):
+        """
+        Tests if the management command exports every user in one pass
+        """
+        out = StringIO()
+        call_command('export_history', 'exercises', '--format', 'jsonl', stdout=out)
+        usernames = [json.loads(line)['username'] for line in out.getvalue().splitlines()]
+        self.assertEqual(sorted(set(usernames)), ['testuser1', 'testuser2'])
+        self.assertEqual(len(usernames), 6)
+
+
+class ImportTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+        self.today = datetime.date.today()
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+        use_temporary_media(self)
+
+    def day(self, days_ago):
+        return (self.today - datetime.timedelta(days=days_ago)).isoformat()
+
+    def post(self, name, content):
+        return self.client.post(reverse('import', kwargs={'user_id': self.user1.username}),
+                                {'file': SimpleUploadedFile(name, content.encode())})
+
+    def upload(self, name, content):
+        response = self.post(name, content)
+        self.assertEqual(response.status_code, 202)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.run_due(), (1, 0))
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        return status['result']
+
+    def test_upload_is_queued(self):
+        """
+        Tests if an upload is saved and left to the job queue, reports its progress and is removed once imported
+        """
+        response = self.post('history.csv', 'date,exercise_name,reps\n{0},Push Up,10\n'.format(self.day(1)))
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Exercise.objects.exists())
+        self.assertEqual(self.client.get(response.json()['status_url']).json(),
+                         {'job': response.json()['job'], 'status': 'queued', 'attempts': 0, 'result': None})
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'imports'))), 1)
+        with self.captureOnCommitCallbacks(execute=True), patch('hoosfit.imports.renew_lease', wraps=jobs.renew_lease) as renew_lease:
+            jobs.run_due()
+        self.assertTrue(renew_lease.called)
+        self.assertEqual(self.client.get(response.json()['status_url']).json()['result']['imported'], 1)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'imports')), [])
+        other = Client()
+        other.login(username='testuser2', password='password')
+        self.assertEqual(other.get(response.json()['status_url']).status_code, 404)
+
+    def test_failed_upload_resumes(self):
+        """
+        Tests if the batches before a failure stay imported and the retry carries on after them
+        """
+        lines = ['date,exercise_name,reps'] + ['{0},Push Up,{1}'.format(self.day(n), n + 1) for n in range(7)]
+        response = self.post('history.csv', '\n'.join(lines + ['{0},Push Up,-1'.format(self.day(1))]))
+        names = imports.canonical_names_by_user
+        calls = []
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('failing on purpose')
+            return names(*args)
+        with patch('hoosfit.imports.BATCH_SIZE', 3), patch('hoosfit.imports.canonical_names_by_user', fail_second_batch):
+            with self.assertLogs('hoosfit.jobs', 'WARNING'):
+                self.assertEqual(jobs.run_due(), (0, 1))
+            queued = Job.objects.get(id=response.json()['job'])
+            self.assertEqual((queued.status, queued.payload['progress']['rows']), ('queued', 3))
+            self.assertEqual(Exercise.objects.filter(user=self.user1).count(), 3)
+            self.assertFalse(DailyTotal.objects.exists())  # left to the end of the import
+            Job.objects.update(run_after=timezone.now())
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(jobs.run_due(), (1, 0))
+        result = self.client.get(response.json()['status_url']).json()['result']
+        self.assertEqual((result['rows'], result['imported'], result['error_count']), (8, 7, 1))
+        self.assertEqual(result['errors'], [{'line': 9, 'error': 'reps must be between 0 and 100000'}])
+        self.assertEqual(sorted(Exercise.objects.filter(user=self.user1).values_list('reps', flat=True)), list(range(1, 8)))
+        self.assertEqual(Profile.objects.get(user=self.user1).points, sum(range(1, 8)))
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'imports')), [])
+
+    @override_settings(HOOSFIT_IMPORT_MAX_BYTES=64)
+    def test_size_cap(self):
+        """
+        Tests if an upload over the size cap is refused before anything is saved or queued
+        """
+        lines = ['date,exercise_name,reps'] + ['{0},Push Up,10'.format(self.day(1))] * 5
+        response = self.post('history.csv', '\n'.join(lines))
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Job.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'imports')))
+
+    def test_csv_import(self):
+        """
+        Tests if an uploaded CSV lands in the user's log and daily totals
+        """
+        result = self.upload('history.csv', 'date,exercise_name,reps\n{0},Push Up,10\n{0},Push Up,5\n{1},Squat,20\n'.format(
+            self.day(3), self.day(10)))
+        self.assertEqual((result['rows'], result['imported'], result['error_count']), (3, 3, 0))
+        self.assertEqual(Exercise.objects.filter(user=self.user1).count(), 3)
+        self.assertEqual(DailyTotal.objects.get(user=self.user1, exercise_name='Push Up').reps, 15)
+
+    def test_names_follow_the_catalog(self):
+        """
+        Tests if imported exercise names are logged the way the user's catalog spells them
+        """
+        CatalogExercise.objects.create(user=self.user1, exercise_name='Push Up')
+        result = self.upload('history.csv', 'date,exercise_name,reps\n{0},push  up,10\n{0},PUSH UP,5\n{0},jumping  jacks,20\n'.format(
+            self.day(3)))
+        self.assertEqual(result['imported'], 3)
+        self.assertEqual(dict(DailyTotal.objects.filter(user=self.user1).values_list('exercise_name', 'reps')),
+                         {'Push Up': 15, 'jumping jacks': 20})
+
+    def test_invalid_rows(self):
+        """
+        Tests if bad rows are skipped and reported by line while the good ones are imported
+        """
+        rows = ['{"date": "%s", "exercise_name": "Push Up", "reps": 10}' % self.day(1),
+                '{"date": "%s", "exercise_name": "Push Up", "reps": 10}' % self.day(-1),
+                '{"date": "yesterday", "exercise_name": "Push Up", "reps": 10}',
+                '{"date": "%s", "exercise_name": "", "reps": 10}' % self.day(1),
+                '{"date": "%s", "exercise_name": "Push Up", "reps": -3}' % self.day(1),
+                'not json']
+        result = self.upload('history.jsonl', '\n'.join(rows))
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 3, 4, 5, 6])
+
+    def test_stats_recomputed(self):
+        """
+        Tests if points, streak and personal bests are recomputed from the imported history
+        """
+        Award.objects.create(user=self.user1, exercise_name='Push Up', award_name='Personal Best: Push Up', best_reps=12)
+        lines = ['date,exercise_name,reps'] + ['{0},Push Up,{1}'.format(self.day(n), 10 + n) for n in range(4)]
+        lines.append('{0},Push Up,50'.format(self.day(30)))
+        self.upload('history.csv', '\n'.join(lines))
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual(profile.points, 10 + 11 + 12 + 13 + 50)
+        self.assertEqual(profile.streak_number, 4)
+        award = Award.objects.get(user=self.user1, kind='best', exercise_name='Push Up')
+        self.assertEqual((award.best_reps, award.date.isoformat()), (50, self.day(30)))
+
+    def test_import_command(self):
+        """
+        Tests if the management command imports rows for several users in small batches
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('username,date,exercise_name,reps\n')
+            for n in range(7):
+                f.write('testuser{0},{1},Squat,{2}\n'.format(n % 2 + 1, self.day(n), n + 1))
+            f.write('nobody,{0},Squat,1\n'.format(self.day(0)))
+        out, err = StringIO(), StringIO()
+        try:
+            call_command('import_history', f.name, '--batch-size', '3', stdout=out, stderr=err)
+        finally:
+            os.unlink(f.name)
+        self.assertIn('Imported 7 of 8 rows', out.getvalue())
+        self.assertIn("line 9: unknown username 'nobody'", err.getvalue())
+        self.assertEqual(Profile.objects.get(user=self.user2).points, 2 + 4 + 6)
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class LogSessionsTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+        self.today = datetime.date.today()
+
+    def post(self, body):
+        return self.client.post(reverse('logsessions'), json.dumps(body), content_type='application/json')
+
+    def day(self, days_ago):
+        return (self.today - datetime.timedelta(days=days_ago)).isoformat()
+
+    def test_anonymous(self):
+        """
+        Tests if an anonymous request gets a JSON 401 rather than a redirect to the login page, and logs nothing
+        """
+        response = Client().post(reverse('logsessions'), json.dumps({'sessions': [{'reps': {'Push Up': 10}}]}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'log in first'})
+        self.assertFalse(Exercise.objects.exists())
+
+    def test_log_sessions(self):
+        """
+        Tests if several sessions are logged in one request and the response has points, streak and bests
+        """
+        Profile.objects.filter(user=self.user1).update(previous_workout=self.today - datetime.timedelta(days=10))
+        response = self.post({'sessions': [
+            {'reps': {'Push Up': 20}},
+            {'date': self.day(2), 'reps': {'Push Up': 10, 'Squat': 5}},
+            {'date': self.day(1), 'reps': {'Push Up': 5}},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['sessions'], result['points'], result['streak']), (3, 40, 3))
+        self.assertEqual(sorted((b['exercise_name'], b['best_reps'], b['date']) for b in result['personal_bests']),
+                         [('Push Up', 20, self.day(0)), ('Squat', 5, self.day(2))])
+        self.assertEqual(Exercise.objects.filter(user=self.user1).count(), 4)
+        self.assertEqual(DailyTotal.objects.get(user=self.user1, exercise_name='Squat').date.isoformat(), self.day(2))
+
+    def test_streak_continues_through_upload(self):
+        """
+        Tests if an upload overlapping the current streak extends it instead of restarting it
+        """
+        Profile.objects.filter(user=self.user1).update(streak_number=5, previous_workout=self.today - datetime.timedelta(days=1))
+        result = self.post({'sessions': [{'date': self.day(1), 'reps': {'Squat': 1}}, {'reps': {'Squat': 1}}]}).json()
+        self.assertEqual(result['streak'], 6)
+
+    def test_only_new_bests_reported(self):
+        """
+        Tests if a session that beats nothing reports no personal bests
+        """
+        record_workout(self.user1, {'Push Up': 50})
+        result = self.post({'sessions': [{'reps': {'Push Up': 10}}]}).json()
+        self.assertEqual(result['personal_bests'], [])
+        self.assertEqual(result['points'], 60)
+
+    def test_invalid_sessions(self):
+        """
+        Tests if bad uploads are rejected whole without logging anything
+        """
+        for body in [{}, {'sessions': []}, {'sessions': [{'reps': {}}]},
+                     {'sessions': [{'reps': {'Push Up': 5}}, {'date': self.day(-1), 'reps': {'Push Up': 5}}]},
+                     {'sessions': [{'reps': {'Push Up': -5}}]}, {'sessions': [{'reps': {'Push Up': '5'}}]}]:
+            self.assertEqual(self.post(body).status_code, 400, body)
+        response = self.client.post(reverse('logsessions'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Exercise.objects.exists())
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class AsyncViewsTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        for i in range(30):
+            Profile.objects.filter(user=User.objects.create_user(username='other{0}'.format(i))).update(points=i % 7)
+        pushup = CatalogExercise.objects.create(user=self.user1, exercise_name='Push Up')
+        squat = CatalogExercise.objects.create(user=self.user1, exercise_name='Squat')
+        for name, exercises in [('Arms', [pushup]), ('Legs', [squat]), ('Both', [pushup, squat]), ('Empty', [])]:
+            Workout.objects.create(user=self.user1, workout_name=name).exercises.add(*exercises)
+        record_workout(self.user1, {'Push Up': 10, 'Squat': 20})
+        compact_points()
+
+    def get(self, view, path='/', **kwargs):
+        request = RequestFactory().get(path)
+        request.user = self.user1
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(view)(request, **kwargs)
+        return response, len(queries)
+
+    def test_workouts(self):
+        """
+        Tests if the async workout list shows each workout's exercises in two queries, then from the cache
+        """
+        response, queries = self.get(async_views.workouts, user_id='testuser1')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        for name in ['Arms', 'Legs', 'Both', 'Empty', 'Push Up', 'Squat']:
+            self.assertIn(name, content)
+        self.assertEqual(queries, 2)
+        response, queries = self.get(async_views.workouts, user_id='testuser1')
+        self.assertContains(response, 'Push Up')
+        self.assertEqual(queries, 0)
+
+    def test_awards(self):
+        """
+        Tests if the async awards page lists the user's personal bests from the cache the sync view uses
+        """
+        client = Client()
+        client.force_login(self.user1)
+        client.get(reverse('awardview', args=['testuser1']))  # the sync view fills the same entry
+        response, queries = self.get(async_views.awards, user_id='testuser1')
+        self.assertContains(response, 'Personal Best: Squat')
+        self.assertEqual(queries, 0)
+        Award.objects.filter(user=self.user1, exercise_name='Squat').update(best_reps=21)
+        invalidate(self.user1.id)
+        response, queries = self.get(async_views.awards, user_id='testuser1')
+        self.assertContains(response, '21')
+        self.assertEqual(queries, 1)
+
+    def test_leaderboard_pages(self):
+        """
+        Tests if the async leaderboard pages through the same profiles as the sync one
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        sync_first = client.get(reverse('leaderboard')).context['profiles']
+        first, _ = self.get(async_views.leaderboard)
+        self.assertContains(first, '1: testuser1')
+        cursor = '{0}.{1}.{2}'.format(sync_first[-1].points, sync_first[-1].id, sync_first[-1].rank)
+        sync_second = client.get(reverse('leaderboard'), {'after': cursor}).context['profiles']
+        second, queries = self.get(async_views.leaderboard, '/leaderboard?after=' + cursor)
+        for profile in sync_second:
+            self.assertContains(second, '{0}: {1}<'.format(profile.rank, profile.user.username))
+        self.assertEqual(queries, 2)
+
+    def test_profile(self):
+        """
+        Tests if the async profile page renders the streak without extra queries
+        """
+        response, queries = self.get(async_views.profile, user_id='testuser1')
+        self.assertContains(response, 'Welcome, testuser1!')
+        self.assertEqual(queries, 1)
+
+    def test_login_required(self):
+        """
+        Tests if anonymous visitors are sent to the login page, except from the public leaderboard
+        """
+        request = RequestFactory().get('/leaderboard')
+        request.user = AnonymousUser()
+        response = async_to_sync(async_views.leaderboard)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Client().get(reverse('leaderboard')).status_code, 200)  # as the sync view serves it
+        request = RequestFactory().get('/profiles/testuser1/')
+        request.user = AnonymousUser()
+        response = async_to_sync(async_views.profile)(request, user_id='testuser1')
+        self.assertEqual(response.status_code, 302)
+
+
+class ParallelAsyncViewsTest(TransactionTestCase):
+    # committed data, so the worker threads' own connections can see it
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        Profile.objects.filter(user=self.user1).update(points=10)
+        for i in range(30):
+            Profile.objects.filter(user=User.objects.create_user(username='other{0}'.format(i))).update(points=i % 7)
+
+    def test_leaderboard_page(self):
+        """
+        Tests if the async leaderboard reads a cursor page on worker threads and matches the sync view's page
+        """
+        client = Client()
+        client.login(username='testuser1', password='password')
+        first = client.get(reverse('leaderboard')).context['profiles']
+        cursor = '{0}.{1}.{2}'.format(first[-1].points, first[-1].id, first[-1].rank)
+        expected = client.get(reverse('leaderboard'), {'after': cursor}).context
+        request = RequestFactory().get('/leaderboard', {'after': cursor})
+        request.user = self.user1
+        with patch('hoosfit.async_views.parallel', return_value=True), \
+                patch('hoosfit.async_views.render', side_effect=lambda request, template, context: context):
+            with CaptureQueriesContext(connection) as queries:
+                context = async_to_sync(async_views.leaderboard)(request)
+        self.assertEqual(len(queries), 0)  # none on the request thread's connection
+        self.assertEqual([(profile.rank, profile.user.username) for profile in context['profiles']],
+                         [(profile.rank, profile.user.username) for profile in expected['profiles']])
+        self.assertEqual(context.get('next_cursor'), expected.get('next_cursor'))
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class UserCacheTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.pushup = CatalogExercise.objects.create(user=self.user1, exercise_name='Push Up')
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name, kwargs={'user_id': self.user1.username}))
+        return response, len(queries)
+
+    def test_second_view_is_cached(self):
+        """
+        Tests if a repeat view of the awards page doesn't query awards again and is counted as a hit
+        """
+        record_workout(self.user1, {'Push Up': 10})
+        call_command('cache_stats', '--reset', stdout=StringIO())
+        first, cold = self.get('awardview')
+        second, warm = self.get('awardview')
+        self.assertContains(second, 'Reps: 10')
+        self.assertEqual(cold - warm, 1)
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertRegex(out.getvalue(), r'awards\s+1 hits\s+1 misses')
+        self.assertRegex(out.getvalue(), r'fragment:awards\s+1 hits\s+1 misses')
+
+    def test_save_invalidates(self):
+        """
+        Tests if saving or deleting a catalog exercise shows up on the next view
+        """
+        self.get('exerciseview')
+        CatalogExercise.objects.create(user=self.user1, exercise_name='Squat')
+        response, _ = self.get('exerciseview')
+        self.assertContains(response, 'Squat')
+        CatalogExercise.objects.filter(exercise_name='Squat').get().delete()
+        response, _ = self.get('exerciseview')
+        self.assertNotContains(response, 'Squat')
+
+    def test_logging_invalidates(self):
+        """
+        Tests if logging a workout, which sends no signals, refreshes awards and the activity chart
+        """
+        self.get('awardview')
+        self.client.get(reverse('activity', kwargs={'user_id': self.user1.username}))
+        record_workout(self.user1, {'Push Up': 25})
+        response, _ = self.get('awardview')
+        self.assertContains(response, 'Reps: 25')
+        chart = self.client.get(reverse('activity', kwargs={'user_id': self.user1.username})).json()
+        self.assertEqual(chart['reps'], [25])
+
+    def test_workout_exercises_invalidate(self):
+        """
+        Tests if adding exercises to an existing workout refreshes the workout list
+        """
+        workout = Workout.objects.create(user=self.user1, workout_name='Test Workout')
+        self.get('workoutview')
+        workout.exercises.add(self.pushup)
+        response, _ = self.get('workoutview')
+        self.assertEqual([e.exercise_name for e in response.context['workout_list'][0].exercises.all()], ['Push Up'])
+        self.assertContains(response, 'Push Up')
+
+    def test_users_dont_share(self):
+        """
+        Tests if one user's cached pages are never served to another
+        """
+        record_workout(self.user1, {'Push Up': 10})
+        self.get('awardview')
+        User.objects.create_user(username='testuser2', password='password')
+        self.client.login(username='testuser2', password='password')
+        response = self.client.get(reverse('awardview', kwargs={'user_id': 'testuser2'}))
+        self.assertEqual(response.context['awards'].count(), 0)
+
+
+class StreakTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.client = Client()
+        self.client.login(username='testuser1', password='password')
+
+    def set_streak(self, streak, days_ago):
+        Profile.objects.filter(user=self.user1).update(
+            streak_number=streak, previous_workout=timezone.localdate() - datetime.timedelta(days=days_ago))
+
+    def test_profile_get_never_writes(self):
+        """
+        Tests if viewing the profile with a lapsed streak shows 0 without writing it
+        """
+        self.set_streak(5, 3)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('homepage', kwargs={'user_id': self.user1.username}))
+        self.assertContains(response, ' 0 days!')
+        self.assertFalse([q for q in queries if not q['sql'].startswith('SELECT')])
+        self.assertEqual(Profile.objects.get(user=self.user1).streak_number, 5)
+
+    def test_current_streak(self):
+        """
+        Tests if a streak counts while its last workout was today or yesterday
+        """
+        for days_ago, expected in [(0, 4), (1, 4), (2, 0)]:
+            self.set_streak(4, days_ago)
+            self.assertEqual(Profile.objects.get(user=self.user1).current_streak, expected, days_ago)
+
+    def test_lapsed_streak_restarts(self):
+        """
+        Tests if logging after a lapse starts the stored streak over at 1
+        """
+        self.set_streak(9, 4)
+        record_workout(self.user1, {'Push Up': 1})
+        profile = Profile.objects.get(user=self.user1)
+        self.assertEqual((profile.streak_number, profile.current_streak), (1, 1))
+
+    @override_settings(TIME_ZONE='Pacific/Kiritimati')
+    def test_local_dates(self):
+        """
+        Tests if workouts are logged on the local date of the configured time zone
+        """
+        record_workout(self.user1, {'Push Up': 1})
+        self.assertEqual(Exercise.objects.get(user=self.user1).date, timezone.localdate())
+        self.assertEqual(Profile.objects.get(user=self.user1).previous_workout, timezone.localdate())
+
+
+class PointsLedgerTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+
+    def points(self, user):
+        return Profile.objects.get(user=user).points
+
+    def test_logging_appends(self):
+        """
+        Tests if logging appends to the ledger instead of writing the profile's points
+        """
+        with CaptureQueriesContext(connection) as queries:
+            record_workout(self.user1, {'Push Up': 10, 'Squat': 5})
+        self.assertFalse([q for q in queries if '"points"' in q['sql'] and q['sql'].startswith('UPDATE')])
+        self.assertEqual(list(PointsEvent.objects.values_list('user_id', 'points')), [(self.user1.id, 15)])
+        self.assertEqual(self.points(self.user1), 0)
+
+    def test_one_profile_write_per_day(self):
+        """
+        Tests if only the first log of the day touches the profile row
+        """
+        record_workout(self.user1, {'Push Up': 10})
+        with CaptureQueriesContext(connection) as queries:
+            record_workout(self.user1, {'Push Up': 10})
+        profile_updates = [q for q in queries if q['sql'].startswith('UPDATE "hoosfit_profile"')]
+        self.assertEqual(len(profile_updates), 1)
+        self.assertIn('"previous_workout" <', profile_updates[0]['sql'])
+        self.assertEqual(Profile.objects.get(user=self.user1).streak_number, 1)
+
+    def test_compaction(self):
+        """
+        Tests if compaction folds every event into the right profile exactly once, across chunks
+        """
+        for reps in range(1, 8):
+            record_workout(self.user1, {'Push Up': reps})
+            record_workout(self.user2, {'Squat': reps * 10})
+        self.assertEqual(compact_points(chunk_size=3), 14)
+        self.assertEqual((self.points(self.user1), self.points(self.user2)), (28, 280))
+        self.assertFalse(PointsEvent.objects.exists())
+        self.assertEqual(compact_points(), 0)
+        self.assertEqual(self.points(self.user1), 28)
+
+    def test_reconcile(self):
+        """
+        Tests if reconciliation counts pending events and fixes profiles that drifted from their logs
+        """
+        record_workout(self.user1, {'Push Up': 10})
+        record_workout(self.user2, {'Push Up': 7})
+        compact_points()
+        record_workout(self.user1, {'Push Up': 5})
+        call_command('reconcile_points', stdout=StringIO())
+        Profile.objects.filter(user=self.user2).update(points=100)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_points', stdout=StringIO())
+        call_command('reconcile_points', '--fix', stdout=StringIO())
+        self.assertEqual(self.points(self.user2), 7)
+        compact_points()
+        self.assertEqual(self.points(self.user1), 15)
+
+    def test_writes_after_the_snapshot(self):
+        """
+        Tests if recompute and reconcile count once what is logged and compacted after they read the points
+        """
+        record_workout(self.user1, {'Push Up': 10})
+        record_workout(self.user1, {'Push Up': 5})
+
+        def then_log_and_compact(user_ids):
+            read = points_snapshot(user_ids)
+            record_workout(self.user1, {'Push Up': 3})
+            compact_points()
+            return read
+
+        with patch('hoosfit.services.points_snapshot', side_effect=then_log_and_compact):
+            recompute_user_stats([self.user1.id])
+        compact_points()
+        self.assertEqual(self.points(self.user1), 18)
+
+        Profile.objects.filter(user=self.user1).update(points=100)
+        record_workout(self.user1, {'Push Up': 2})
+        with patch('hoosfit.management.commands.reconcile_points.points_snapshot', side_effect=then_log_and_compact):
+            call_command('reconcile_points', '--fix', stdout=StringIO())
+        compact_points()
+        self.assertEqual(self.points(self.user1), 23)
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class WindowedLeaderboardTest(CacheClearingTestCase):
+    def setUp(self):
+        self.veteran = User.objects.create_user(username='veteran', password='password')
+        self.rookie = User.objects.create_user(username='rookie', password='password')
+        self.today = timezone.localdate()
+        self.last_month = (self.today.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)  # never this week
+        record_workout(self.veteran, {'Push Up': 500}, day=self.last_month)
+        record_workout(self.veteran, {'Push Up': 5})
+        record_workout(self.rookie, {'Push Up': 50})
+        compact_points()
+        self.client = Client()
+        self.client.login(username='rookie', password='password')
+
+    def board(self, **params):
+        response = self.client.get(reverse('leaderboard'), params)
+        return [(p.user.username, p.points) for p in response.context['profiles']]
+
+    def test_windows(self):
+        """
+        Tests if this month's board only counts this month while all time counts everything
+        """
+        self.assertEqual(self.board(), [('veteran', 505), ('rookie', 50)])
+        self.assertEqual(self.board(window='month'), [('rookie', 50), ('veteran', 5)])
+        self.assertEqual(self.board(window='bogus'), self.board())
+
+    def test_compaction_updates_cached_board(self):
+        """
+        Tests if the cached first page is served without queries until the next compaction
+        """
+        self.board(window='week')
+        with CaptureQueriesContext(connection) as queries:
+            self.board(window='week')
+        self.assertFalse([q for q in queries if 'hoosfit_periodtotal' in q['sql']])
+        record_workout(self.veteran, {'Push Up': 100})
+        self.assertEqual(self.board(window='week')[0], ('rookie', 50))
+        compact_points()
+        self.assertEqual(self.board(window='week')[0], ('veteran', 105))
+
+    def test_snapshot(self):
+        """
+        Tests if a closed month is served from its snapshot, also after its totals are pruned
+        """
+        call_command('snapshot_leaderboards', '--prune', stdout=StringIO())
+        self.assertFalse(PeriodTotal.objects.filter(start__lt=self.today.replace(day=1)).exists())
+        self.assertEqual(self.board(window='month', start=self.last_month.isoformat()), [('veteran', 500)])
+        record_workout(self.rookie, {'Push Up': 900}, day=self.last_month)  # too late for the snapshot
+        compact_points()
+        call_command('snapshot_leaderboards', stdout=StringIO())
+        self.assertEqual(self.board(window='month', start=self.last_month.isoformat()), [('veteran', 500)])
+
+    def test_closed_period_before_snapshot(self):
+        """
+        Tests if a closed month without a snapshot is ranked from its totals, and the worker snapshots it
+        """
+        self.assertEqual(self.board(window='month', start=self.last_month.isoformat()), [('veteran', 500)])
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertTrue(LeaderboardSnapshot.objects.filter(period='month', start=self.last_month).exists())
+        self.assertEqual(self.board(window='month', start=self.last_month.isoformat()), [('veteran', 500)])
+
+    def test_async_closed_period(self):
+        """
+        Tests if the async leaderboard serves a closed month, and a cursor page of it, with and without a snapshot
+        """
+        def board(**params):
+            request = RequestFactory().get('/leaderboard', dict(params, window='month', start=self.last_month.isoformat()))
+            request.user = self.rookie
+            with patch('hoosfit.async_views.render', side_effect=lambda request, template, context: context):
+                context = async_to_sync(async_views.leaderboard)(request)
+            return [(p.user.username, p.points) for p in context['profiles']]
+
+        for snapshot in [False, True]:
+            if snapshot:
+                call_command('snapshot_leaderboards', stdout=StringIO())
+            self.assertEqual(board(), [('veteran', 500)])
+            veteran = standings('month', self.last_month).get(user=self.veteran)
+            self.assertEqual(board(after='{0}.{1}.1'.format(veteran.points, veteran.id)), [])
+
+    def test_empty_window_keeps_tabs(self):
+        """
+        Tests if the window tabs are shown on a window nobody has scored in
+        """
+        start = (self.last_month - datetime.timedelta(days=1)).replace(day=1)
+        response = self.client.get(reverse('leaderboard'), {'window': 'month', 'start': start.isoformat()})
+        self.assertEqual(list(response.context['profiles']), [])
+        self.assertContains(response, 'window=week')
+        self.assertContains(response, 'No points scored here yet')
+
+    def test_rebuild(self):
+        """
+        Tests if recomputing a user's stats rebuilds their period totals from the log
+        """
+        PeriodTotal.objects.all().delete()
+        recompute_user_stats([self.veteran.id, self.rookie.id])
+        self.assertEqual(self.board(window='month'), [('rookie', 50), ('veteran', 5)])
+        self.assertEqual(PeriodTotal.objects.get(user=self.veteran, period='month', start=self.last_month).points, 500)
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class AwardEngineTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.monday = timezone.localdate() - datetime.timedelta(days=timezone.localdate().weekday() + 14)
+
+    def awards(self):
+        return {(a.kind, a.exercise_name, a.level): (a.best_reps, a.date)
+                for a in Award.objects.filter(user=self.user)}
+
+    def test_rules(self):
+        """
+        Tests if volume milestones, streak milestones and weekly records are earned on the right day
+        """
+        for n in range(8):
+            record_workout(self.user, {'Push Up': 20 if n < 7 else 60}, day=self.monday + datetime.timedelta(days=n))
+        awards = self.awards()
+        self.assertEqual(awards['best', 'Push Up', 0], (60, self.monday + datetime.timedelta(days=7)))
+        self.assertEqual(awards['volume', 'Push Up', 100], (100, self.monday + datetime.timedelta(days=4)))
+        self.assertNotIn(('volume', 'Push Up', 500), awards)
+        self.assertEqual(awards['streak', '', 7], (7, self.monday + datetime.timedelta(days=6)))
+        self.assertEqual(awards['week', 'Push Up', 0], (140, self.monday))
+        self.assertEqual(Award.objects.get(user=self.user, kind='streak').award_name, '7 Day Streak')
+
+    def test_no_weekly_record_in_first_week(self):
+        """
+        Tests if a weekly record needs an earlier week to beat
+        """
+        record_workout(self.user, {'Push Up': 10}, day=self.monday)
+        record_workout(self.user, {'Push Up': 10}, day=self.monday + datetime.timedelta(days=1))
+        self.assertEqual(set(self.awards()), {('best', 'Push Up', 0)})
+
+    def test_evaluation_is_set_based(self):
+        """
+        Tests if evaluating a user's awards takes the same statements however long their history is
+        """
+        record_workout(self.user, {'Push Up': 10}, day=self.monday)
+        with CaptureQueriesContext(connection) as short:
+            evaluate_awards([self.user.id])
+        for n in range(1, 60):
+            record_workout(self.user, {'Push Up': 10, 'Squat': n}, day=self.monday - datetime.timedelta(days=n))
+        Award.objects.filter(kind='best').update(best_reps=0)
+        with CaptureQueriesContext(connection) as long:
+            self.assertEqual(evaluate_awards([self.user.id])[1], 2)
+        self.assertEqual(len(long), len(short) + 1)  # + the update
+
+    def test_sessions_evaluated_incrementally(self):
+        """
+        Tests if evaluating new sessions earns what a full evaluation would, without walking the history of every exercise
+        """
+        for n in range(40):
+            record_workout(self.user, {'Push Up': 10 + n % 7, 'Squat': 5}, day=self.monday - datetime.timedelta(days=39 - n))
+        record_workout(self.user, {'Squat': 30}, day=self.monday - datetime.timedelta(days=60))  # backdated
+        self.assertEqual(evaluate_awards([self.user.id]), (0, 0, 0))
+        self.assertIn(('streak', '', 30), self.awards())
+
+        with CaptureQueriesContext(connection) as queries:
+            record_workout(self.user, {'Squat': 12}, day=self.monday - datetime.timedelta(days=3))
+        walks = [query for query in queries if 'ORDER BY "hoosfit_dailytotal"."exercise_name" ASC' in query['sql']]
+        self.assertEqual(walks, [])  # no milestone reached, and Squat has a weekly record
+        self.assertEqual(self.awards()['week', 'Squat', 0][0], 47)
+        self.assertEqual(evaluate_awards([self.user.id]), (0, 0, 0))
+
+    def test_recompute_after_rule_change(self):
+        """
+        Tests if recompute_awards adds awards a new level grants and removes ones that are no longer earned
+        """
+        for n in range(3):
+            record_workout(self.user, {'Push Up': 50}, day=self.monday + datetime.timedelta(days=n))
+        self.assertIn(('volume', 'Push Up', 100), self.awards())
+        Award.objects.filter(kind='best').update(best_reps=500)  # wrong, only exact recomputes lower it
+        with patch('hoosfit.awards.VOLUME_LEVELS', [50, 150]):
+            out = StringIO()
+            call_command('recompute_awards', stdout=out)
+        awards = self.awards()
+        self.assertNotIn(('volume', 'Push Up', 100), awards)
+        self.assertEqual(awards['volume', 'Push Up', 50], (50, self.monday))
+        self.assertEqual(awards['volume', 'Push Up', 150], (150, self.monday + datetime.timedelta(days=2)))
+        self.assertEqual(awards['best', 'Push Up', 0][0], 50)
+        self.assertIn('2 added, 1 updated, 1 removed', out.getvalue())
+
+
+@override_settings(HOOSFIT_JOBS_EAGER=True)
+class ArchiveTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.today = timezone.localdate()
+        self.before = archive_cutoff(days=60)
+        self.old = [self.before - datetime.timedelta(days=n) for n in (1, 2, 40)]
+        for n, day in enumerate(self.old + [self.today]):
+            record_workout(self.user, {'Push Up': 10 + n, 'Squat': 5}, day=day)
+        record_workout(self.user, {'Push Up': 40}, day=self.old[2])
+
+    def stats(self):
+        profile = Profile.objects.get(user=self.user)
+        return (profile.points, profile.streak_number,
+                sorted(Award.objects.filter(user=self.user).values_list('kind', 'exercise_name', 'level', 'best_reps', 'date')),
+                sorted(DailyTotal.objects.filter(user=self.user).values_list('date', 'exercise_name', 'reps')))
+
+    def test_archive_packs_months(self):
+        """
+        Tests if sets before the cutoff are moved into one archive row per exercise and month
+        """
+        self.assertEqual(archive_exercises([self.user.id], self.before), (7, 4))
+        self.assertEqual(list(Exercise.objects.values_list('date', flat=True).distinct()), [self.today])
+        push_ups = ExerciseArchive.objects.get(exercise_name='Push Up', month=self.old[0].replace(day=1))
+        self.assertEqual(push_ups.total, 21)
+        self.assertEqual((push_ups.best, push_ups.best_date), (11, self.old[1]))
+        self.assertEqual(archive_exercises([self.user.id], self.before), (0, 0))
+
+    def test_recompute_and_export_read_the_archive(self):
+        """
+        Tests if recomputing stats and exporting give the same results before and after archiving
+        """
+        recompute_user_stats([self.user.id])
+        rebuild_daily_totals([self.user.id])
+        before = self.stats()
+        exported = sorted(map(tuple, (row.values() for row in export_rows('exercises', user=self.user)[1])))
+        archive_exercises([self.user.id], self.before)
+        recompute_user_stats([self.user.id])
+        rebuild_daily_totals([self.user.id])
+        self.assertEqual(self.stats(), before)
+        self.assertEqual(sorted(map(tuple, (row.values() for row in export_rows('exercises', user=self.user)[1]))), exported)
+        self.assertEqual(len(list(export_rows('exercises', chunk_size=1)[1])), 9)
+        call_command('reconcile_points', stdout=StringIO())  # raises if points disagree with the logs
+
+    def test_merges_later_backfill(self):
+        """
+        Tests if old history logged after a month was archived is merged into that month's row
+        """
+        archive_exercises([self.user.id], self.before)
+        record_workout(self.user, {'Push Up': 99}, day=self.old[0])
+        archive_exercises([self.user.id], self.before)
+        push_ups = ExerciseArchive.objects.get(exercise_name='Push Up', month=self.old[0].replace(day=1))
+        self.assertEqual([reps for day, reps in push_ups.sets if day == self.old[0].day], [10, 99])
+        self.assertEqual((push_ups.total, push_ups.best, push_ups.best_date), (120, 99, self.old[0]))
+        self.assertEqual(Award.objects.get(kind='best', exercise_name='Push Up').best_reps, 99)
+
+    def test_command(self):
+        """
+        Tests if the command archives in chunks and reports its throughput
+        """
+        other = User.objects.create_user(username='other', password='password')
+        record_workout(other, {'Lunge': 3}, day=self.old[0])
+        out = StringIO()
+        call_command('archive_exercises', '--days', '60', '--chunk-size', '1', stdout=out)
+        self.assertFalse(Exercise.objects.filter(date__lt=self.before).exists())
+        self.assertIn('2/2 users (up to id {0})'.format(other.id), out.getvalue())
+        self.assertIn('Archived 8 sets', out.getvalue())
+        self.assertIn('sets/s', out.getvalue())
+
+
+class AdminTest(CacheClearingTestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='password')
+        self.user1 = User.objects.create_user(username='testuser1', password='password')
+        self.user2 = User.objects.create_user(username='testuser2', password='password')
+        self.client = Client()
+        self.client.login(username='admin', password='password')
+        self.today = timezone.localdate()
+        for user in (self.user1, self.user2):
+            record_workout(user, {'Push Up': 10, 'Squat': 5}, day=self.today - datetime.timedelta(days=1))
+            record_workout(user, {'Push Up': 20}, day=self.today)
+        compact_points()
+
+    def changelist(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:hoosfit_{0}_changelist'.format(model)), params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_changelists_are_flat(self):
+        """
+        Tests if the large table changelists take the same queries however many rows and users they show
+        """
+        small = {model: len(self.changelist(model)[1]) for model in ('exercise', 'award', 'profile', 'dailytotal')}
+        for n in range(10):
+            user = User.objects.create_user(username='other{0}'.format(n), password='password')
+            record_workout(user, {'Push Up': n + 1, 'Lunge': 2})
+        large = {model: len(self.changelist(model)[1]) for model in small}
+        self.assertEqual(small, large)
+        response, queries = self.changelist('exercise', q='testuser1', date__year=self.today.year)
+        self.assertEqual(len(response.context['cl'].result_list), 3)
+        self.assertFalse([q for q in queries if 'COUNT(*)' in q['sql'] and 'LIMIT' not in q['sql'].upper()])
+
+    def test_paginator_stops_counting(self):
+        """
+        Tests if the paginator counts no further than its limit
+        """
+        with patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 3):
+            self.assertEqual(EstimatedCountPaginator(Exercise.objects.order_by('id'), 2).count, 3)
+        self.assertEqual(EstimatedCountPaginator(Exercise.objects.order_by('id'), 2).count, 6)
+
+    def test_recompute_action(self):
+        """
+        Tests if the recompute action recomputes the points of the selected rows' users only
+        """
+        Profile.objects.update(points=999)
+        rows = Exercise.objects.filter(user=self.user1).values_list('id', flat=True)
+        self.client.post(reverse('admin:hoosfit_exercise_changelist'), {'action': 'recompute_stats', '_selected_action': list(rows)})
+        self.assertEqual(dict(Profile.objects.filter(user__in=[self.user1, self.user2]).values_list('user__username', 'points')),
+                         {'testuser1': 35, 'testuser2': 999})
+
+    def test_delete_history_action(self):
+        """
+        Tests if deleting a user's history removes their log, archive, rollups and awards but not their catalog
+        """
+        CatalogExercise.objects.create(user=self.user1, exercise_name='Push Up')
+        archive_exercises([self.user1.id], self.today)
+        profile = Profile.objects.get(user=self.user1)
+        actions = [name for name, _ in self.changelist('profile')[0].context['action_form'].fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)  # the row by row one
+        self.client.post(reverse('admin:hoosfit_profile_changelist'), {'action': 'delete_user_history', '_selected_action': [profile.id]})
+        for model in (Exercise, ExerciseArchive, DailyTotal, PointsEvent, PeriodTotal, Award):
+            self.assertFalse(model.objects.filter(user=self.user1).exists(), model.__name__)
+        self.assertEqual(Exercise.objects.filter(user=self.user2).count(), 3)
+        self.assertEqual(Profile.objects.get(user=self.user1).points, 0)
+        self.assertTrue(CatalogExercise.objects.filter(user=self.user1).exists())
+
+    def test_delete_quietly(self):
+        """
+        Tests if a quiet delete runs one DELETE per batch of values and sends no post_delete signals
+        """
+        ids = list(Exercise.objects.filter(user=self.user1).values_list('id', flat=True))
+        with patch('hoosfit.models.DELETE_BATCH', 2), patch('hoosfit.models.invalidate') as invalidated, \
+                CaptureQueriesContext(connection) as queries:
+            self.assertEqual(delete_quietly(Exercise, 'id', ids), len(ids))
+        self.assertEqual(len(queries), -(-len(ids) // 2))
+        invalidated.assert_not_called()
+        self.assertFalse(Exercise.objects.filter(user=self.user1).exists())
+        self.assertEqual(Exercise.objects.filter(user=self.user2).count(), 3)
+        with patch('hoosfit.models.invalidate') as invalidated, CaptureQueriesContext(connection) as queries:
+            self.assertEqual(delete_quietly(Exercise, 'user', [self.user1.id, self.user2.id]), 3)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"user_id" IN', queries[0]['sql'])
+        invalidated.assert_not_called()
+        self.assertFalse(Exercise.objects.exists())
+
+
+class StaticAssetsTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+
+    def test_templates_use_vendored_assets(self):
+        """
+        Tests if no template loads CSS/JS from a CDN directly
+        """
+        for path in glob.glob(os.path.join(settings.BASE_DIR, 'hoosfit', 'templates', 'hoosfit', '*.html')):
+            with open(path) as f:
+                self.assertNotRegex(f.read(), r'(src|href)=["\']https?://', path)
+
+    def test_vendor_tag(self):
+        """
+        Tests if the vendor tag serves our copy with its pinned integrity hash
+        """
+        render = lambda name: Template("{% load hoosfit_assets %}{% vendor '" + name + "' %}").render(Context())
+        self.assertHTMLEqual(render('jquery-3.5.1.slim.min.js'),
+                             '<script src="/static/hoosfit/vendor/jquery-3.5.1.slim.min.js" integrity="{0}"></script>'.format(
+                                 assets.VENDOR['jquery-3.5.1.slim.min.js'][1]))
+        self.assertHTMLEqual(render('bootstrap-4.5.0.min.css'),
+                             '<link rel="stylesheet" href="/static/hoosfit/vendor/bootstrap-4.5.0.min.css" integrity="{0}">'.format(
+                                 assets.VENDOR['bootstrap-4.5.0.min.css'][1]))
+        with self.assertRaises(TemplateSyntaxError):
+            render('left-pad.js')
+
+    def test_vendored_files(self):
+        """
+        Tests if every vendored file is committed and matches its pinned integrity hash
+        """
+        for name, (url, sri) in assets.VENDOR.items():
+            path = finders.find(assets.VENDOR_DIR + name)
+            self.assertIsNotNone(path, name)
+            with open(path, 'rb') as f:
+                self.assertEqual(assets.integrity(f.read()), sri, name)
+
+    def test_summary_chart_data(self):
+        """
+        Tests if the workout summary hands today's totals to the shared chart script as JSON
+        """
+        record_workout(self.user, {'Push Up': 10})
+        record_workout(self.user, {'Push Up': 5, 'Squat': 3})
+        response = self.client.get(reverse('workoutsummary', args=[self.user.username, 1]))
+        self.assertContains(response, '<script id="totals" type="application/json">{"Push Up": 15, "Squat": 3}</script>', html=True)
+        self.assertContains(response, 'hoosfit/charts.js')
+
+
+@jobs.job('test_add_exercise')
+def add_exercise_job(user_id, name, fail=False):
+    CatalogExercise.objects.create(user_id=user_id, exercise_name=name)
+    if fail:
+        raise RuntimeError('failing on purpose')
+
+
+@jobs.job('test_renew_lease')
+def renew_lease_job(user_id, name, fail=False):
+    CatalogExercise.objects.create(user_id=user_id, exercise_name=name)
+    jobs.renew_lease()
+    if fail:
+        raise RuntimeError('failing on purpose')
+
+
+class JobQueueTest(CacheClearingTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+
+    def make_due(self):
+        Job.objects.update(run_after=timezone.now())
+
+    def test_handlers_registered_at_startup(self):
+        """
+        Tests if a process that only sets Django up already knows every job kind
+        """
+        code = 'import django; django.setup(); from hoosfit.jobs import HANDLERS; print(" ".join(sorted(HANDLERS)))'
+        kinds = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, check=True, capture_output=True,
+                               text=True, env=dict(os.environ, DJANGO_SETTINGS_MODULE='exerciseapp.settings')).stdout.split()
+        self.assertEqual(kinds, ['apply_sessions', 'import_history'])
+
+    def test_post_workout_work_is_deferred(self):
+        """
+        Tests if logging a workout leaves the rollup and personal bests to the queue
+        """
+        bests = record_workout(self.user, {'Push Up': 10})
+        self.assertEqual(set(bests), {'Push Up'})
+        self.assertFalse(Award.objects.exists())
+        self.assertFalse(DailyTotal.objects.exists())
+        self.assertEqual(jobs.run_due(), (1, 0))
+        self.assertEqual(Award.objects.get(user=self.user).best_reps, 10)
+        self.assertEqual(DailyTotal.objects.get(user=self.user).reps, 10)
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_logged_workout_is_deferred(self):
+        """
+        Tests if a workout logged through the view has no daily total or award until the queue runs
+        """
+        workout = Workout.objects.create(user=self.user, workout_name='Test Workout')
+        client = Client()
+        client.login(username='testuser', password='password')
+        client.post('/profiles/testuser/workout/{0}/submit/'.format(workout.id), {'Push Up': 10})
+        self.assertEqual(Exercise.objects.get(user=self.user).reps, 10)
+        self.assertFalse(DailyTotal.objects.exists())
+        self.assertFalse(Award.objects.exists())
+        self.assertEqual(Job.objects.get().status, 'queued')
+        self.assertEqual(jobs.run_due(), (1, 0))
+        self.assertEqual(DailyTotal.objects.get(user=self.user).reps, 10)
+        self.assertEqual(Award.objects.get(user=self.user).best_reps, 10)
+
+    def test_failed_workout_job(self):
+        """
+        Tests if post-workout work that keeps failing is retried and marked failed without touching the logged exercise
+        """
+        record_workout(self.user, {'Push Up': 10})
+        with patch('hoosfit.services.add_daily_totals', side_effect=RuntimeError('rollup is down')):
+            for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+                self.make_due()
+                with self.assertLogs('hoosfit.jobs', 'WARNING'):
+                    self.assertEqual(jobs.run_due(), (0, 1))
+                self.assertEqual(Job.objects.get().attempts, attempt)
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('rollup is down', job.last_error)
+        self.make_due()
+        self.assertEqual(jobs.run_due(), (0, 0))
+        self.assertFalse(DailyTotal.objects.exists())
+        self.assertEqual(Exercise.objects.get(user=self.user).reps, 10)
+
+    def test_retries(self):
+        """
+        Tests if a failing job rolls back, is retried after a backoff and marked failed after its last attempt
+        """
+        jobs.enqueue('test_add_exercise', user_id=self.user.id, name='Push Up', fail=True)
+        for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+            self.make_due()
+            with self.assertLogs('hoosfit.jobs', 'WARNING'):
+                self.assertEqual(jobs.run_due(), (0, 1))
+            job = Job.objects.get()
+            self.assertEqual(job.attempts, attempt)
+            self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('failing on purpose', job.last_error)
+        self.assertFalse(CatalogExercise.objects.exists())
+
+    def test_key_enqueues_once(self):
+        """
+        Tests if a job with a key that was already used is not queued again
+        """
+        self.assertIsNotNone(jobs.enqueue('test_add_exercise', key='once', user_id=self.user.id, name='Push Up'))
+        self.assertIsNone(jobs.enqueue('test_add_exercise', key='once', user_id=self.user.id, name='Push Up'))
+        jobs.run_due()
+        self.assertEqual(CatalogExercise.objects.count(), 1)
+        with self.assertRaises(ValueError):
+            jobs.enqueue('no_such_job')
+
+    def test_lease(self):
+        """
+        Tests if a job whose lease ran out is taken over and only the new worker's run is kept
+        """
+        jobs.enqueue('test_add_exercise', user_id=self.user.id, name='Push Up')
+        slow, = jobs.claim(10)
+        self.assertEqual(jobs.claim(10), [])
+        taken_over, = jobs.claim(10, now=timezone.now() + jobs.LEASE + datetime.timedelta(seconds=1))
+        with self.assertLogs('hoosfit.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(slow))
+        self.assertTrue(jobs.run(taken_over))
+        self.assertEqual(CatalogExercise.objects.count(), 1)
+
+    def test_renew_lease(self):
+        """
+        Tests if a job can extend its lease while it runs, unless it was already taken over
+        """
+        jobs.enqueue('test_renew_lease', user_id=self.user.id, name='Push Up')
+        slow, = jobs.claim(10)
+        taken_over, = jobs.claim(10, now=timezone.now() + jobs.LEASE + datetime.timedelta(seconds=1))
+        with self.assertLogs('hoosfit.jobs', 'WARNING'):
+            self.assertFalse(jobs.run(slow))
+        self.assertFalse(CatalogExercise.objects.exists())
+        lease = taken_over.run_after
+        self.assertTrue(jobs.run(taken_over))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+        self.assertGreater(job.run_after, timezone.now() + jobs.LEASE - datetime.timedelta(minutes=1))
+        self.assertNotEqual(job.run_after, lease)
+        self.assertEqual(CatalogExercise.objects.count(), 1)
+        jobs.renew_lease()  # outside a job it does nothing
+        jobs.enqueue('test_renew_lease', user_id=self.user.id, name='Squat', fail=True)
+        with self.assertLogs('hoosfit.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_due(), (0, 1))
+        self.assertEqual(Job.objects.get(payload__name='Squat').attempts, 1)  # recorded under the claimed lease
+
+    def test_lease_lost_counts_as_attempt(self):
+        """
+        Tests if a job that keeps outliving its lease is marked failed after its last attempt
+        """
+        jobs.enqueue('test_add_exercise', user_id=self.user.id, name='Push Up')
+        for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+            self.make_due()
+            slow, = jobs.claim(10)
+            jobs.claim(10, now=timezone.now() + jobs.LEASE + datetime.timedelta(seconds=1))
+            with self.assertLogs('hoosfit.jobs', 'WARNING'):
+                self.assertFalse(jobs.run(slow))
+            self.assertEqual(Job.objects.get().attempts, attempt)
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('lease', job.last_error)
+        self.make_due()
+        self.assertEqual(jobs.run_due(), (0, 0))
+        self.assertFalse(CatalogExercise.objects.exists())
+
+    def test_run_jobs(self):
+        """
+        Tests if the worker command runs what is due, folds the points ledger and exits with --once
+        """
+        record_workout(self.user, {'Push Up': 10})
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(Award.objects.get(user=self.user).best_reps, 10)
+        self.assertEqual(Profile.objects.get(user=self.user).points, 10)
+
+    def test_run_jobs_survives_housekeeping_errors(self):
+        """
+        Tests if the worker logs a failing housekeeping step, once per pass, and still runs the queued jobs
+        """
+        record_workout(self.user, {'Push Up': 10})
+        with patch('hoosfit.management.commands.run_jobs.compact_points', side_effect=RuntimeError('ledger is down')) as compact:
+            with self.assertLogs('hoosfit.jobs', 'WARNING') as logs:
+                call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(compact.call_count, 1)  # not again for the snapshot due on the same pass
+        self.assertIn('ledger is down', '\n'.join(logs.output))
+        self.assertEqual(Award.objects.get(user=self.user).best_reps, 10)
+
+
+@override_settings(HOOSFIT_READ_REPLICAS=['replica1'])
+class ReplicaTest(CacheClearingTestCase):
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+        self.replicate()
+
+    def replicate(self):
+        # stands in for replication: copies what the tests read over to the replica
+        for model in (User, Session, Profile, CatalogExercise, Award):
+            model.objects.using('replica1').all().delete()
+            model.objects.using('replica1').bulk_create(model.objects.using('default').all())
+
+    def queries(self, method, path, data=None):
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica1']) as replica:
+            response = getattr(self.client, method)(path, data)
+        return response, len(primary), len(replica)
+
+    def test_reads_go_to_replica(self):
+        """
+        Tests if a page that only reads is served entirely from the replica
+        """
+        response, primary, replica = self.queries('get', reverse('homepage', args=[self.user.id]))
+        self.assertContains(response, 'testuser')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_read_their_own_writes(self):
+        """
+        Tests if a write goes to the primary and the client reads from the primary until the lag has passed
+        """
+        response, primary, replica = self.queries('post', reverse('exercisesubmit', args=[self.user.id]), {'exercise_name': 'Push Up'})
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # the replica hasn't caught up, but this client reads from the primary
+        response, primary, replica = self.queries('get', reverse('homepage', args=[self.user.id]))
+        self.assertEqual(replica, 0)
+        self.client.cookies[PIN_COOKIE] = '{0:.0f}'.format(time.time() - 1)
+        response, primary, replica = self.queries('get', reverse('homepage', args=[self.user.id]))
+        self.assertEqual(primary, 0)
+        self.assertFalse(CatalogExercise.objects.using('replica1').exists())
+
+    def test_cache_fills_from_primary(self):
+        """
+        Tests if a cached list is computed on the primary even in a request reading from the replica
+        """
+        CatalogExercise.objects.create(user=self.user, exercise_name='Push Up')
+        response, primary, replica = self.queries('get', reverse('exerciseview', args=[self.user.id]))
+        self.assertContains(response, 'Push Up')
+        self.assertGreater(replica, 0)
+
+    def test_async_requests(self):
+        """
+        Tests if the middleware stays async around an async view and routes its off-loop queries
+        """
+        async def view(request):
+            return HttpResponse(await sync_to_async(ReplicaRouter().db_for_read)(Profile))
+        middleware = ReplicaMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(middleware)(RequestFactory().get('/')).content, b'replica1')
+        self.assertEqual(async_to_sync(middleware)(RequestFactory().post('/')).content, b'default')
+
+    def test_outside_requests(self):
+        """
+        Tests if commands and other code outside a request read from the primary
+        """
+        self.assertEqual(Profile.objects.all().db, 'default')
+        self.assertEqual(ReplicaRouter().db_for_read(Profile), 'default')
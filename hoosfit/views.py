@@ -1,14 +1,27 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse, Http404
 from django.http import HttpResponse
 from django.http import JsonResponse
 from django.urls import reverse
+from django.utils.http import urlencode
 from django.views import generic
 import datetime
+import json
+import uuid
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
 from django.contrib.auth.decorators import login_required
+from django.utils import timezone
 from django.views.generic.edit import CreateView
 from .forms import CreateNewExercise, CreateNewWorkout
-from .models import Exercise, Workout, Award, Profile
+from .models import CatalogExercise, Exercise, Workout, Award, Profile, DailyTotal, LeaderboardSnapshot, Job, normalize_name
+from .services import parse_reps, parse_sessions, record_workout, record_sessions, pending_points
+from .ranking import rank_of, neighbours, page_after, standings, period_start, WINDOWS
+from .cache import cached, cached_queryset
+from .exports import EXPORTS, FORMATS, export_rows, render_lines
+from .jobs import enqueue
 import random
 
 
@@ -41,24 +54,48 @@ motivations=[
 def home(request):
     if request.user.username != "":
         return HttpResponseRedirect(
-                    reverse(profile,
+                    reverse('homepage',
                     args=[request.user.username]))
     else:
         return render(request, 'hoosfit/index.html')
 
 
 def profile(request, user_id):
-    if request.user.profile.previous_workout < (datetime.date.today() - datetime.timedelta(days=1)):
-        request.user.profile.streak_number = 0
-        request.user.profile.save()
     context={}
     context['quote']=random.choice(motivations)
-    weekExercises = Exercise.objects.filter(user__exact = request.user, date__lte=datetime.datetime.today(), date__gte=datetime.datetime.today()-datetime.timedelta(days=7))
-    context['weekExercises']=weekExercises
     return render(request, 'hoosfit/profile.html', context)
 
+
+ACTIVITY_PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+@login_required
+def activity(request, user_id):
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in ACTIVITY_PERIODS:
+        return JsonResponse({'error': 'granularity must be one of day, week, month'}, status=400)
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 730)
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+    today = timezone.localdate()
+
+    def chart():
+        totals = (DailyTotal.objects
+                  .filter(user=request.user, date__gte=today - datetime.timedelta(days=days - 1), date__lte=today)
+                  .annotate(period=ACTIVITY_PERIODS[granularity]('date'))
+                  .values('period')
+                  .annotate(total=Sum('reps'))
+                  .order_by('period'))
+        return {
+            'granularity': granularity,
+            'labels': [row['period'].isoformat() for row in totals],
+            'reps': [row['total'] for row in totals],
+        }
+    return JsonResponse(cached(request.user.id, 'activity', chart, variant='{0}:{1}:{2}'.format(today, granularity, days)))
+
 class ExerciseCreate(generic.ListView):
-    model = Exercise
+    model = CatalogExercise
     template_name = 'hoosfit/exercise.html'
 
 class WorkoutCreate(generic.ListView):
@@ -67,14 +104,14 @@ class WorkoutCreate(generic.ListView):
     context_object_name = 'exercise_list'
 
     def get_queryset(self):
-        return Exercise.objects.filter(user__exact = self.request.user, date=datetime.date(2000,1,1))
+        return cached_queryset(self.request.user.id, 'catalog', CatalogExercise.objects.filter(user__exact = self.request.user))
 
 class ExerciseView(generic.ListView):
     template_name = 'hoosfit/view_exercise.html'
     context_object_name = 'exercise_list'
 
     def get_queryset(self):
-        return Exercise.objects.filter(user__exact = self.request.user, date=datetime.date(2000,1,1))
+        return cached_queryset(self.request.user.id, 'catalog', CatalogExercise.objects.filter(user__exact = self.request.user))
 
 
 class WorkoutListView(generic.ListView):
@@ -82,7 +119,8 @@ class WorkoutListView(generic.ListView):
     context_object_name = 'workout_list'
 
     def get_queryset(self):
-        return Workout.objects.filter(user__exact = self.request.user)
+        return cached_queryset(self.request.user.id, 'workouts',
+                               Workout.objects.filter(user__exact = self.request.user).prefetch_related('exercises'))
 
 
 class WorkoutView(generic.DetailView):
@@ -90,13 +128,23 @@ class WorkoutView(generic.DetailView):
     template_name = 'hoosfit/workout_form.html'
     context_object_name = 'workout'
 
+    def get_queryset(self):
+        return Workout.objects.select_related('user').prefetch_related('exercises')
+
     
 class WorkoutSummary(generic.ListView):
     template_name = 'hoosfit/workout_summary.html'
     context_object_name = 'workout'
 
     def get_queryset(self):
-        return Exercise.objects.filter(user__exact = self.request.user, date=datetime.date.today())
+        # today's log rather than the daily rollup, which the job queue may not have caught up on yet
+        return (Exercise.objects.filter(user__exact = self.request.user, date=timezone.localdate())
+                .values('exercise_name').annotate(reps=Sum('reps')).order_by('exercise_name'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['totals'] = {row['exercise_name']: row['reps'] for row in context['workout']}
+        return context
 
 
 class AwardView(generic.ListView):
@@ -105,15 +153,154 @@ class AwardView(generic.ListView):
     context_object_name = 'awards'
 
     def get_queryset(self):
-        return Award.objects.filter(user__exact = self.request.user)
+        return cached_queryset(self.request.user.id, 'awards', Award.objects.filter(user__exact = self.request.user).order_by('kind', 'exercise_name', 'level'))
+
+
+def leaderboard_cursor(request):
+    # cursor is "points.id.rank" of the last profile on the previous page
+    try:
+        points, id_, rank = (int(part) for part in request.GET['after'].split('.'))
+    except (KeyError, ValueError):
+        return None
+    return points, id_, rank
+
+
+def leaderboard_window(request):
+    # ?window=all|week|month, and for past weeks/months ?start=YYYY-MM-DD
+    window = request.GET.get('window', 'all')
+    if window not in WINDOWS:
+        window = 'all'
+    try:
+        start = period_start(window, datetime.date.fromisoformat(request.GET['start']))
+    except (KeyError, ValueError):
+        start = None
+    if window == 'all' or start == period_start(window, timezone.localdate()):
+        start = None
+    return window, start
+
+
+def leaderboard_page(window, start, cursor, n):
+    """
+    The n rows after cursor (or the top n) of a leaderboard window, ranked.
+    Every window is a walk down an index from the cursor, however much
+    history there is, and first pages are cached until the next compaction.
+    """
+    rows = standings(window, start)
+    if rows.model is LeaderboardSnapshot:
+        after = cursor[2] if cursor else 0
+        return list(rows.filter(rank__gt=after).order_by('rank')[:n])
+    if cursor:
+        points, id_, rank = cursor
+        page = page_after(points, id_, n, rows)
+    else:
+        rank = 0
+        if window != 'all':
+            start = start or period_start(window, timezone.localdate())
+        page = cached('leaderboard', 'leaderboard', lambda: list(rows.order_by('-points', 'id')[:n]),
+                      variant='{0}:{1}:{2}'.format(window, start, n))
+    for row in page:
+        rank += 1
+        row.rank = rank
+    return page
 
 
 class LeaderboardView(generic.ListView):
     template_name = 'hoosfit/leaderboard.html'
     context_object_name = 'profiles'
+    page_size = 25
 
     def get_queryset(self):
-        return Profile.objects.order_by('-points')
+        self.cursor = leaderboard_cursor(self.request)
+        self.window, self.start = leaderboard_window(self.request)
+        page = leaderboard_page(self.window, self.start, self.cursor, self.page_size + 1)
+        self.has_next = len(page) > self.page_size
+        return page[:self.page_size]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(leaderboard_links(self.window, self.start, self.cursor, self.object_list, self.has_next))
+        return context
+
+
+def leaderboard_links(window, start, cursor, page, has_next):
+    """
+    Template context for the window tabs and the Top/Next links
+    """
+    today = timezone.localdate()
+    window_query = {'window': window} if window != 'all' else {}
+    if start:
+        window_query['start'] = start.isoformat()
+    context = {
+        'cursor': cursor,
+        'window': window,
+        'start': start,
+        'window_query': urlencode(window_query),
+        'windows': [
+            ('All time', ''),
+            ('This week', urlencode({'window': 'week'})),
+            ('Last week', urlencode({'window': 'week', 'start': period_start('week', today) - datetime.timedelta(days=7)})),
+            ('This month', urlencode({'window': 'month'})),
+            ('Last month', urlencode({'window': 'month', 'start': period_start('month', today) - datetime.timedelta(days=1)})),
+        ],
+    }
+    if has_next:
+        last = page[-1]
+        context['next_cursor'] = '{0}.{1}.{2}'.format(last.points, last.id, last.rank)
+        context['next_query'] = urlencode(dict(window_query, after=context['next_cursor']))
+    return context
+
+
+@login_required
+def my_rank(request):
+    try:
+        n = min(max(int(request.GET.get('n', 3)), 0), 25)
+    except ValueError:
+        n = 3
+    profile = request.user.profile
+    rank = rank_of(profile)
+    above, below = neighbours(profile, n)
+
+    def entry(p, r):
+        return {'rank': r, 'username': p.user.username, 'points': p.points}
+
+    return JsonResponse({
+        'rank': rank,
+        'points': profile.points,
+        'above': [entry(p, rank - len(above) + i) for i, p in enumerate(above)],
+        'below': [entry(p, rank + 1 + i) for i, p in enumerate(below)],
+    })
+
+
+@login_required
+def export_history(request, user_id, kind, fmt):
+    if kind not in EXPORTS or fmt not in FORMATS:
+        raise Http404
+    columns, rows = export_rows(kind, user=request.user)
+    response = StreamingHttpResponse(render_lines(fmt, columns, rows), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = 'attachment; filename="{0}-{1}.{2}"'.format(request.user.username, kind, fmt)
+    return response
+
+
+@login_required
+def import_upload(request, user_id):
+    if request.method != "POST" or 'file' not in request.FILES:
+        return JsonResponse({'error': 'POST a CSV or JSONL file as "file"'}, status=400)
+    upload = request.FILES['file']
+    if upload.size > settings.HOOSFIT_IMPORT_MAX_BYTES:
+        return JsonResponse({'error': 'files over {0} bytes are not accepted'.format(settings.HOOSFIT_IMPORT_MAX_BYTES)},
+                            status=413)
+    fmt = 'jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else 'csv'
+    # imported by the run_jobs worker; poll the status url for the result
+    path = default_storage.save('imports/{0}.{1}'.format(uuid.uuid4().hex, fmt), upload)
+    queued = enqueue('import_history', path=path, fmt=fmt, user_id=request.user.id)
+    return JsonResponse({'job': queued.id, 'status_url': reverse('importstatus', kwargs={'user_id': user_id, 'job_id': queued.id})},
+                        status=202)
+
+
+@login_required
+def import_status(request, user_id, job_id):
+    queued = get_object_or_404(Job, id=job_id, kind='import_history', payload__user_id=request.user.id)
+    return JsonResponse({'job': queued.id, 'status': queued.status, 'attempts': queued.attempts, 'result': queued.result})
 
 
 def create_exercise(request, user_id):
@@ -121,8 +308,9 @@ def create_exercise(request, user_id):
     if request.method == "POST":
         form = CreateNewExercise(request.POST)
         if form.is_valid():
-            ex = Exercise.objects.filter(user__exact = request.user, exercise_name__iexact = request.POST['exercise_name'])
-            if ex.count() == 0:
+            ex = CatalogExercise.objects.filter(user__exact = request.user,  # one probe of catalog_user_name_unique
+                                                normalized_name = normalize_name(form.cleaned_data['exercise_name']))
+            if not ex.exists():
                 exercise = form.save(commit=False)
                 exercise.user = request.user
                 exercise.save()
@@ -131,6 +319,22 @@ def create_exercise(request, user_id):
     return HttpResponseRedirect(reverse('exerciseview', kwargs={'user_id' : user_id}))
 
 
+AUTOCOMPLETE_LIMIT = 10
+
+
+@login_required
+def exercise_search(request, user_id):
+    """
+    Autocomplete over the user's exercise catalog: the first few names that
+    start with ?q=, ignoring case and spacing, read off one range of
+    catalog_user_name_unique
+    """
+    prefix = normalize_name(request.GET.get('q', ''))
+    exercises = (CatalogExercise.objects.filter(user=request.user, normalized_name__startswith=prefix)
+                 .order_by('normalized_name').values_list('id', 'exercise_name')[:AUTOCOMPLETE_LIMIT])
+    return JsonResponse({'results': [{'id': id_, 'exercise_name': name} for id_, name in exercises]})
+
+
 def create_workout(request, user_id):
     if request.method == "POST":
         form = CreateNewWorkout(request.POST)
@@ -138,43 +342,37 @@ def create_workout(request, user_id):
             workout = form.save(commit=False)
             workout.user = request.user
             workout.save()
-            for id_ in request.POST.getlist('exercises'):
-                exercise = Exercise.objects.get(user=request.user, id=id_, date=datetime.date(2000,1,1))
-                workout.exercises.add(exercise)
+            exercises = CatalogExercise.objects.filter(user=request.user, id__in=request.POST.getlist('exercises'))
+            workout.exercises.add(*exercises)
         else:
             pass
     return HttpResponseRedirect(reverse('workoutstart', kwargs={'user_id' : user_id, 'pk' : workout.id}))
 
 
 def log_workout(request, user_id, pk):
-    for data in request.POST:
-        try:  # saves exercise and streak data
-            name = data
-            reps = request.POST[data]
-            profile = Profile.objects.get(user=request.user)
-            profile.points += int(reps)
-            if profile.previous_workout < datetime.date.today():
-                profile.streak_number += 1
-            profile.previous_workout = datetime.date.today()
-            profile.save()
-            exercise = Exercise()
-            exercise.exercise_name = name
-            exercise.reps = reps
-            exercise.user = request.user
-            exercise.date = datetime.date.today()
-            exercise.save()
-        except: # error occurs due to weird packet information (REST thing)
-            continue  # don't care scenario
-        try: # award already exists
-            award = Award.objects.get(user=request.user, exercise_name=data)
-            if award.best_reps < int(request.POST[data]):
-                award.best_reps = request.POST[data]
-                award.save()
-        except Award.DoesNotExist:
-            award = Award()
-            award.user = request.user
-            award.award_name = "Personal Best: "+ data
-            award.exercise_name = data
-            award.best_reps = request.POST[data]
-            award.save()
-    return HttpResponseRedirect(reverse('workoutsummary', kwargs={'user_id' : user_id, 'pk' : pk}))
\ No newline at end of file
+    record_workout(request.user, parse_reps(request.POST))
+    return HttpResponseRedirect(reverse('workoutsummary', kwargs={'user_id' : user_id, 'pk' : pk}))
+
+
+def log_sessions(request):
+    """
+    Logs one or more finished sessions from a JSON body in a single request
+    and answers with the new points, streak and personal bests
+    """
+    if not request.user.is_authenticated:  # an API client can't follow a redirect to the login page
+        return JsonResponse({'error': 'log in first'}, status=401)
+    if request.method != "POST":
+        return JsonResponse({'error': 'POST {"sessions": [{"date": "YYYY-MM-DD", "reps": {"Push Up": 10}}]}'}, status=405)
+    try:
+        sessions = parse_sessions(json.loads(request.body))
+    except ValueError as exc:  # includes malformed JSON
+        return JsonResponse({'error': str(exc)}, status=400)
+    bests = record_sessions(request.user, sessions)
+    profile = Profile.objects.only('points', 'streak_number', 'previous_workout').get(user=request.user)
+    return JsonResponse({
+        'sessions': len(sessions),
+        'points': profile.points + pending_points([request.user.id]).get(request.user.id, 0),
+        'streak': profile.current_streak,
+        'personal_bests': [{'exercise_name': name, 'best_reps': count, 'date': day.isoformat()}
+                           for name, (count, day) in bests.items()],
+    })
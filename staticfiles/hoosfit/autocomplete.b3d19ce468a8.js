@@ -0,0 +1,19 @@
+// Fills a <datalist> with the user's exercise names matching what's typed into input
+function exerciseAutocomplete(input, list, url) {
+  var pending = null;
+  input.addEventListener('input', function () {
+    clearTimeout(pending);
+    pending = setTimeout(function () {
+      fetch(url + '?q=' + encodeURIComponent(input.value), {credentials: 'same-origin'})
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+          list.innerHTML = '';
+          data.results.forEach(function (exercise) {
+            var option = document.createElement('option');
+            option.value = exercise.exercise_name;
+            list.appendChild(option);
+          });
+        });
+    }, 150);
+  });
+}